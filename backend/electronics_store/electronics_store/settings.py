@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,10 +51,14 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware', # Moved CorsMiddleware to be very early
+    'shop.middleware.LoadSheddingMiddleware', # Sheds browsing before checkout when saturated; after CORS so 503s are readable
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.middleware.ReplicaPinningMiddleware', # Sticky-primary reads after writes (see Read replicas below)
+    'shop.middleware.ProfilingMiddleware', # On-demand profiles (PROFILING_ENABLED); needs request.user
+    'shop.middleware.SlowQueryMiddleware', # Stores statements over SLOW_QUERY_MS
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,6 +86,14 @@ WSGI_APPLICATION = 'electronics_store.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection pooling (psycopg 3 pool). Each worker process gets its own pool, under WSGI and ASGI alike.
+# Set DB_POOL_MAX_SIZE=0 to disable pooling and fall back to persistent per-thread connections.
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10)) # Seconds a request waits for a free connection
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 300)) # Idle connections above min_size are closed after this
+DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)) # Connections are recycled after this
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -87,9 +102,142 @@ DATABASES = {
         'PASSWORD': 'postgres', # Your PostgreSQL password
         'HOST': 'localhost', # PostgreSQL server IP/hostname
         'PORT': '5432', # Default PostgreSQL port is 5432
+        'CONN_HEALTH_CHECKS': True, # Pooled/persistent connections are checked before reuse
     }
 }
 
+if DB_POOL_MAX_SIZE > 0:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+            'max_idle': DB_POOL_MAX_IDLE,
+            'max_lifetime': DB_POOL_MAX_LIFETIME,
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+# Read replicas
+# Comma-separated replica hosts, e.g. DB_REPLICA_HOSTS=replica1.internal,replica2.internal
+# Each becomes an alias 'replica_<n>' with the same credentials as 'default'.
+# To try routing locally, add any extra aliases (two SQLite files work too) and list them in DATABASE_REPLICAS.
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica_')]
+DATABASE_ROUTERS = ['shop.db_routers.PrimaryReplicaRouter']
+
+# Models whose reads may be served by a replica (catalogue, best-sellers, receipts/invoices, dashboards).
+# Carts, orders, payments, sessions and users always read from the primary.
+REPLICA_READ_MODELS = [
+    'shop.item',
+    'shop.itemcategory',
+    'shop.itemcopurchase',
+    'shop.paymentmethod',
+    'shop.receipt',
+    'shop.invoice',
+    'shop.performancemetric',
+]
+# After any write, the client's reads stay on the primary for this many seconds
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE_NAME = 'db_pin'
+
+# Caches. Throttle buckets and cached reports are per-process with the local-memory default;
+# point REDIS_URL at a Redis server to share them across workers.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Item read-through cache (shop/item_cache.py): shared entries, plus a small LRU per worker process
+ITEM_CACHE_TIMEOUT = 10 * 60 # Seconds in the shared cache; saves invalidate immediately
+ITEM_CACHE_LOCAL_TTL = float(os.environ.get('ITEM_CACHE_LOCAL_TTL', 5)) # Max staleness of another worker's local copy
+ITEM_CACHE_LOCAL_MAX_ENTRIES = 2000
+ITEM_CACHE_LOCAL_MAX_BYTES = 8 * 1024 * 1024
+
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': ['shop.throttling.TokenBucketThrottle'],
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES']) if os.environ.get('NUM_PROXIES') else None, # Trusted X-Forwarded-For hops
+}
+
+# Token-bucket budgets per throttle scope and identity ('ip', 'session', 'user'); see shop/throttling.py.
+# A rate of 'N/period' allows bursts of N, refilled evenly over the period.
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_BUDGETS = {
+    'catalogue': {'ip': '300/min', 'session': '120/min', 'user': '120/min'},
+    'login': {'ip': '20/min', 'session': '10/min'},
+    'account': {'ip': '120/min', 'session': '60/min', 'user': '60/min'},
+    'cart': {'ip': '240/min', 'session': '120/min', 'user': '120/min'},
+    'orders': {'ip': '240/min', 'session': '120/min', 'user': '120/min'},
+    'checkout': {'ip': '60/min', 'session': '20/min', 'user': '20/min'},
+}
+
+# Request profiling. Off by default: the middleware then removes itself at startup.
+# Staff trigger a profile with the X-Profile header or ?_profile=1; PROFILING_SAMPLE_RATE
+# profiles that fraction of all API requests. Results: /api/instrumentation/profiles/.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_HEADER = 'X-Profile'
+PROFILING_QUERY_PARAM = '_profile'
+PROFILING_PATH_PREFIX = '/api/'
+PROFILING_DIR = os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles')
+PROFILING_MAX_FILES = 200 # Profiles kept; the oldest are deleted first
+
+# Slow-query capture: statements over SLOW_QUERY_MS are stored in SlowQuery (0 disables).
+# Report with `python manage.py slow_query_report` or /api/instrumentation/slow_queries/.
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+SLOW_QUERY_EXPLAIN_RATE = 0.1 # Share of repeat captures that refresh the stored plan
+SLOW_QUERY_LARGE_TABLE_ROWS = 10000 # Sequential scans are flagged on shop tables at least this big
+
+# Order archival (`python manage.py archive_orders`): delivered and cancelled orders placed
+# more than ARCHIVE_ORDERS_AFTER_DAYS ago move to ArchivedOrder, ARCHIVE_BATCH_SIZE per transaction.
+ARCHIVE_ORDERS_AFTER_DAYS = int(os.environ.get('ARCHIVE_ORDERS_AFTER_DAYS', 365))
+ARCHIVE_BATCH_SIZE = 500
+
+# Server-sent events (/api/events/). InProcessBroker fans out within one ASGI process;
+# set EVENTS_BROKER=shop.events.PostgresNotifyBroker to share events across processes.
+EVENTS_BROKER = os.environ.get('EVENTS_BROKER', 'shop.events.InProcessBroker')
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', 10000)) # Open streams per process
+EVENTS_MAX_WATCHED_ITEMS = 100
+EVENTS_QUEUE_SIZE = 100 # Undelivered events kept per stream; older ones are dropped
+EVENTS_HEARTBEAT_SECONDS = 20
+EVENTS_RETRY_MS = 5000 # Client reconnect delay
+
+# Load shedding (per worker process). Requests in flight beyond a priority's share of the maximum get 503.
+LOAD_SHEDDING_MAX_IN_FLIGHT = int(os.environ.get('LOAD_SHEDDING_MAX_IN_FLIGHT', 64)) # 0 disables
+LOAD_SHEDDING_PRIORITIES = [ # First match wins; unmatched paths are 'browse'
+    (r'^/api/orders/place_order_from_cart/$', 'checkout'),
+    (r'^/api/payments/[^/]+/initiate_payment/$', 'checkout'),
+    (r'^/api/(carts|cart-items|orders|payments|users)/', 'shopping'),
+    (r'^/api-auth/', 'shopping'),
+]
+LOAD_SHEDDING_THRESHOLDS = {'checkout': 1.0, 'shopping': 0.8, 'browse': 0.5}
+LOAD_SHEDDING_RETRY_AFTER = 2 # Seconds
+
+# Password hashing. The PBKDF2 work factor is tunable per environment (lower it for dev/test,
+# raise it as hardware gets faster); stored hashes are upgraded to it on the next login.
+PASSWORD_HASHERS = [
+    'shop.hashing.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 0)) # 0 keeps Django's default
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', os.cpu_count() or 2)) # Concurrent hashes per process
+PASSWORD_HASHING_MAX_PENDING = int(os.environ.get('PASSWORD_HASHING_MAX_PENDING', 16)) # Queued beyond that, then 503
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -126,6 +274,16 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded/ingested media. Product image variants are content-addressed, so they can be cached forever.
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Product image variants (python manage.py ingest_item_images); widths in pixels
+ITEM_IMAGE_DIR = 'items'
+ITEM_IMAGE_WIDTHS = {'thumb': 160, 'card': 400, 'large': 1200}
+ITEM_IMAGE_QUALITY = 80
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -140,6 +298,12 @@ CORS_ALLOWED_ORIGINS = [
     # Add any other origins where your frontend might be hosted
 ]
 CORS_ALLOW_CREDENTIALS = True # VERY IMPORTANT: Allows cookies (including session and CSRF) to be sent cross-origin
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
+
+# Responses to requests sent with an Idempotency-Key header are replayed for this long
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)) # Seconds
+IDEMPOTENCY_KEY_LEASE = 120 # Seconds before a reservation without a response can be retried
 
 # CSRF SETTINGS
 # Ensure these are set to allow your frontend to interact
@@ -164,4 +328,7 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 # Remember to set this back to True in production for enhanced security.
 CSRF_COOKIE_HTTPONLY = False
 CSRF_COOKIE_NAME = "csrftoken"
-SESSION_COOKIE_NAME = "sessionid"
\ No newline at end of file
+SESSION_COOKIE_NAME = "sessionid"
+# Sessions are read from the cache and written through to the database, so polling endpoints
+# such as /api/users/me/summary/ need no query once warm
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
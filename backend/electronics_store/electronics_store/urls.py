@@ -14,8 +14,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from django.urls import path, include, re_path
+
+from shop.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -23,3 +27,9 @@ urlpatterns = [
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
 ]
 
+if settings.DEBUG:
+    # In production the web server serves MEDIA_ROOT with the same long-lived Cache-Control header
+    urlpatterns += [
+        re_path(r'^media/(?P<path>.*)$', serve_media),
+    ]
+    urlpatterns += staticfiles_urlpatterns() # runserver does this itself; uvicorn does not
@@ -0,0 +1,162 @@
+"""
+Vectorised analytics reports over exported order lines.
+
+Order lines are pulled from the database as plain column tuples in chunks and
+turned into NumPy arrays, so the reports are array operations rather than
+Python loops over model instances.
+"""
+import numpy as np
+from django.core.cache import cache
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ItemCategory, OrderItem
+
+CHUNK_SIZE = 20000
+CACHE_TIMEOUT = 60 * 60 # Late cancellations show up in a cached range after at most this long
+BASKET_SIZE_CAP = 20 # Baskets with more units than this are reported together as "20+"
+
+
+def load_order_lines(start, end, chunk_size=CHUNK_SIZE):
+    """
+    Returns the OrderItem rows of non-cancelled orders placed in [start, end) as a dict of arrays:
+    order_id, customer_id (-1 for anonymous), category_id (-1 for uncategorised),
+    day (datetime64[D]), quantity and revenue.
+    """
+    rows = (
+        OrderItem.objects
+        .filter(order__order_date__gte=start, order__order_date__lt=end)
+        .exclude(order__status='cancelled')
+        .annotate(day=TruncDate('order__order_date'))
+        .order_by()
+        .values_list('order_id', 'order__customer_id', 'item__item_type_id', 'day', 'quantity', 'unit_price_at_time_of_order')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    chunks = []
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == chunk_size:
+            chunks.append(_columns(batch))
+            batch = []
+    if batch or not chunks:
+        chunks.append(_columns(batch))
+
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+
+def _columns(batch):
+    order_ids, customer_ids, category_ids, days, quantities, prices = zip(*batch) if batch else ((),) * 6
+    quantity = np.array(quantities, dtype=np.int64)
+    return {
+        'order_id': np.array(order_ids, dtype=np.int64),
+        'customer_id': np.array([-1 if value is None else value for value in customer_ids], dtype=np.int64),
+        'category_id': np.array([-1 if value is None else value for value in category_ids], dtype=np.int64),
+        'day': np.array(days, dtype='datetime64[D]'),
+        'quantity': quantity,
+        'revenue': quantity * np.array(prices, dtype=np.float64),
+    }
+
+
+def revenue_by_category_by_day(lines):
+    if not len(lines['order_id']):
+        return []
+    keys = np.stack([lines['day'].astype(np.int64), lines['category_id']], axis=1)
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    revenue = np.bincount(inverse, weights=lines['revenue'])
+    units = np.bincount(inverse, weights=lines['quantity'])
+
+    names = dict(ItemCategory.objects.values_list('id', 'name'))
+    return [
+        {
+            'day': str(np.datetime64(int(day), 'D')),
+            'category': names.get(int(category_id), 'Uncategorised'),
+            'revenue': round(float(total), 2),
+            'units': int(unit_count),
+        }
+        for (day, category_id), total, unit_count in zip(groups, revenue, units)
+    ]
+
+
+def basket_size_distribution(lines):
+    if not len(lines['order_id']):
+        return {'orders': 0, 'histogram': {}, 'units': {}, 'value': {}}
+    _, inverse = np.unique(lines['order_id'], return_inverse=True)
+    units_per_order = np.bincount(inverse, weights=lines['quantity']).astype(np.int64)
+    value_per_order = np.bincount(inverse, weights=lines['revenue'])
+
+    histogram = np.bincount(np.minimum(units_per_order, BASKET_SIZE_CAP), minlength=BASKET_SIZE_CAP + 1)
+    labels = [str(size) for size in range(BASKET_SIZE_CAP)] + [f'{BASKET_SIZE_CAP}+']
+    return {
+        'orders': int(units_per_order.size),
+        'histogram': {label: int(count) for label, count in zip(labels, histogram) if count},
+        'units': _summary(units_per_order),
+        'value': _summary(value_per_order),
+    }
+
+
+def _summary(values):
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'mean': round(float(values.mean()), 2), 'p50': round(float(p50), 2), 'p90': round(float(p90), 2), 'p99': round(float(p99), 2)}
+
+
+def cohort_retention(lines):
+    """
+    Monthly retention for registered customers, with cohorts taken from their first
+    order inside the requested range.
+    """
+    registered = lines['customer_id'] >= 0
+    if not registered.any():
+        return []
+    customers = lines['customer_id'][registered]
+    months = lines['day'][registered].astype('datetime64[M]').astype(np.int64)
+
+    # np.unique sorts pairs by customer then month, so each customer's first row is their cohort month
+    active = np.unique(np.stack([customers, months], axis=1), axis=0)
+    _, first_index, customer_index = np.unique(active[:, 0], return_index=True, return_inverse=True)
+    cohort_month = active[first_index, 1][customer_index.ravel()]
+    period = active[:, 1] - cohort_month
+
+    cohorts, cohort_index = np.unique(cohort_month, return_inverse=True)
+    matrix = np.zeros((cohorts.size, int(period.max()) + 1), dtype=np.int64)
+    np.add.at(matrix, (cohort_index.ravel(), period), 1)
+    retention = matrix / matrix[:, :1]
+
+    return [
+        {
+            'cohort': str(np.datetime64(int(month), 'M')),
+            'customers': int(counts[0]),
+            'retention': [round(float(rate), 4) for rate in rates],
+        }
+        for month, counts, rates in zip(cohorts, matrix, retention)
+    ]
+
+
+REPORTS = {
+    'revenue_by_category': revenue_by_category_by_day,
+    'basket_size': basket_size_distribution,
+    'cohort_retention': cohort_retention,
+}
+
+
+def build_report(name, start, end, use_cache=True):
+    """
+    Computes (or returns the cached copy of) one report for [start, end).
+    """
+    cache_key = f'analytics:{name}:{start.isoformat()}:{end.isoformat()}'
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    report = {
+        'report': name,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'generated_at': timezone.now().isoformat(),
+        'data': REPORTS[name](load_order_lines(start, end)),
+    }
+    cache.set(cache_key, report, CACHE_TIMEOUT)
+    return report
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shop'
+
+    def ready(self):
+        from . import signals # noqa: F401 -- connects the receivers
+        from .db_pool import register_fork_handler
+        register_fork_handler()
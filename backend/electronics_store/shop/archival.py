@@ -0,0 +1,103 @@
+"""
+Cold storage for completed orders.
+
+archive_orders() moves delivered and cancelled orders placed before a cutoff out of Order,
+OrderItem, Payment, PaymentHistory, Invoice, Receipt and OrderStatusTransition into one
+ArchivedOrder row each. The row's document holds the order exactly as the API returned it,
+plus the raw rows of every child table. Each batch of at most ARCHIVE_BATCH_SIZE orders
+is copied and deleted in its own transaction, so the hot tables and their indexes stay
+small without one long lock. Orders locked by another transaction are skipped and picked
+up by the next run.
+
+OrderViewSet.retrieve falls back to the archive, so archived orders can still be fetched
+by id. Archived orders are left out of listings and of order-based metrics.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, Invoice, Order, OrderItem, OrderStatusTransition, Payment, PaymentHistory, Receipt,
+)
+from .serializers import OrderSerializer
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+# document key -> (model, one row per order?)
+CHILD_TABLES = {
+    'items': (OrderItem, False),
+    'payment': (Payment, True),
+    'payment_history': (PaymentHistory, False),
+    'invoice': (Invoice, True),
+    'receipt': (Receipt, True),
+    'status_transitions': (OrderStatusTransition, False),
+}
+
+
+def cutoff_for(days=None):
+    return timezone.now() - timedelta(days=settings.ARCHIVE_ORDERS_AFTER_DAYS if days is None else days)
+
+
+def archivable(cutoff):
+    return Order.objects.filter(status__in=ARCHIVABLE_STATUSES, order_date__lt=cutoff)
+
+
+def archive_orders(cutoff, batch_size=None, limit=None, progress=None):
+    """
+    Archives every order archivable(cutoff) returns, batch by batch. Returns the number archived.
+    progress, if given, is called with the running total after each batch.
+    """
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    archived = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        moved = archive_batch(cutoff, size)
+        if not moved:
+            break
+        archived += moved
+        if progress:
+            progress(archived)
+    return archived
+
+
+@transaction.atomic
+def archive_batch(cutoff, batch_size):
+    """Copies up to batch_size of the oldest archivable orders into ArchivedOrder and deletes them."""
+    order_ids = list(
+        archivable(cutoff).select_for_update(skip_locked=True).order_by('order_id')
+        .values_list('order_id', flat=True)[:batch_size]
+    )
+    if not order_ids:
+        return 0
+    orders = Order.objects.filter(pk__in=order_ids).select_related('customer').prefetch_related('items__item')
+    children = child_rows(order_ids)
+    ArchivedOrder.objects.bulk_create([
+        ArchivedOrder(
+            order_id=order.order_id, customer_id=order.customer_id, customer_email=order.customer_email,
+            session_key=order.session_key, order_date=order.order_date, status=order.status,
+            total_amount=order.total_amount,
+            document={'order': OrderSerializer(order).data, **children[order.order_id]},
+        )
+        for order in orders
+    ])
+    Order.objects.filter(pk__in=order_ids).delete() # Cascades to every child table
+    return len(order_ids)
+
+
+def child_rows(order_ids):
+    """{order_id: {document key: row dict, list of row dicts or None}} with one query per child table."""
+    children = defaultdict(lambda: {key: None if single else [] for key, (_, single) in CHILD_TABLES.items()})
+    for key, (model, single) in CHILD_TABLES.items():
+        for row in model.objects.filter(order_id__in=order_ids).order_by('pk').values():
+            if single:
+                children[row['order_id']][key] = row
+            else:
+                children[row['order_id']][key].append(row)
+    return children
+
+
+def archived_order_data(archived):
+    """The archived order in OrderSerializer's shape, flagged so clients know it is read-only."""
+    return {**archived.document['order'], 'archived': True, 'archived_at': archived.archived_at}
@@ -0,0 +1,65 @@
+"""
+Per-category facet counts for the category browsing API.
+
+All categories' facets come from one GROUP BY over Item, cached until an Item or
+ItemCategory changes (see signals.py), so category pages normally read them from the cache.
+An invalidation only reaches the workers sharing the cache, so with the per-process LocMem
+cache the facets are kept for FACETS_LOCAL_TIMEOUT only (as in profile_cache, `check` warns).
+"""
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Max, Min, Q
+
+from .db_routers import use_primary
+from .models import Item
+
+FACETS_CACHE_KEY = 'category-facets'
+FACETS_TIMEOUT = 60 * 60
+FACETS_LOCAL_TIMEOUT = 30 # How stale another worker's counts can be
+
+EMPTY_FACETS = {'item_count': 0, 'available_count': 0, 'in_stock_count': 0, 'min_price': None, 'max_price': None}
+
+
+def compute_facets():
+    """
+    {category_id: facets}. Prices span available items only, as that is what a category page lists.
+    """
+    available = Q(is_available=True)
+    rows = (
+        Item.objects.filter(item_type__isnull=False)
+        .order_by()
+        .values('item_type_id')
+        .annotate(
+            item_count=Count('item_id'),
+            available_count=Count('item_id', filter=available),
+            in_stock_count=Count('item_id', filter=available & Q(quantity_available__gt=0)),
+            min_price=Min('unit_price', filter=available),
+            max_price=Max('unit_price', filter=available),
+        )
+    )
+    return {
+        row.pop('item_type_id'): {
+            **row,
+            'min_price': None if row['min_price'] is None else f"{row['min_price']:.2f}",
+            'max_price': None if row['max_price'] is None else f"{row['max_price']:.2f}",
+        }
+        for row in rows
+    }
+
+
+def facets_timeout():
+    return FACETS_LOCAL_TIMEOUT if isinstance(caches['default'], LocMemCache) else FACETS_TIMEOUT
+
+
+def category_facets():
+    facets = cache.get(FACETS_CACHE_KEY)
+    if facets is None:
+        # From the primary, so a lagging replica cannot refill the cache with pre-invalidation counts
+        with use_primary():
+            facets = compute_facets()
+        cache.set(FACETS_CACHE_KEY, facets, facets_timeout())
+    return facets
+
+
+def invalidate_facets():
+    cache.delete(FACETS_CACHE_KEY)
@@ -0,0 +1,66 @@
+"""
+Helpers around Django's psycopg connection pools.
+
+Pools live in the worker process that opened them. Preforking servers (gunicorn --preload)
+must not share a pool created in the parent, so children forget inherited pools and
+lazily open their own.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+
+def forget_inherited_pools():
+    """
+    Runs in a freshly forked child. The parent's pool sockets must not be used or closed here,
+    so the pool objects are simply dropped and re-created on first use.
+    """
+    try:
+        from django.db.backends.postgresql.base import DatabaseWrapper
+    except (ImportError, ImproperlyConfigured): # psycopg not installed
+        return
+    DatabaseWrapper._connection_pools.clear()
+
+
+def register_fork_handler():
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=forget_inherited_pools)
+
+
+def pool_stats():
+    """
+    Returns {alias: stats} for every pooled connection alias in this worker.
+    Wait time is averaged over requests that had to queue for a connection.
+    """
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is None:
+            stats[alias] = {'pooled': False}
+            continue
+        if pool.closed:
+            # Opened lazily by the first query in this worker
+            stats[alias] = {'pooled': True, 'pid': os.getpid(), 'open': False}
+            continue
+        raw = pool.get_stats()
+        queued = raw.get('requests_queued', 0)
+        stats[alias] = {
+            'pooled': True,
+            'pid': os.getpid(),
+            'open': True,
+            'min_size': raw.get('pool_min'),
+            'max_size': raw.get('pool_max'),
+            'size': raw.get('pool_size'),
+            'available': raw.get('pool_available'),
+            'in_use': raw.get('pool_size', 0) - raw.get('pool_available', 0),
+            'requests_waiting': raw.get('requests_waiting', 0),
+            'requests_total': raw.get('requests_num', 0),
+            'requests_queued': queued,
+            'requests_errors': raw.get('requests_errors', 0),
+            'avg_wait_ms': round(raw.get('requests_wait_ms', 0) / queued, 2) if queued else 0.0,
+            'connections_opened': raw.get('connections_num', 0),
+            'connections_lost': raw.get('connections_lost', 0),
+            'returns_bad': raw.get('returns_bad', 0),
+        }
+    return stats
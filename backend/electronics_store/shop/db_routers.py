@@ -0,0 +1,58 @@
+"""
+Primary/replica database routing.
+
+Reads of the models listed in settings.REPLICA_READ_MODELS go to a random alias from
+settings.DATABASE_REPLICAS. Everything else, every write, every read inside a transaction
+and every read while the request is pinned (see ReplicaPinningMiddleware) uses 'default'.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+def pin_to_primary(pinned=True):
+    """Pins reads in the current context to the primary. Returns a token for reset_pin()."""
+    return _pinned_to_primary.set(pinned)
+
+
+def reset_pin(token):
+    _pinned_to_primary.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Forces reads inside the block to the primary (read-your-writes in background jobs, etc.)."""
+    token = pin_to_primary()
+    try:
+        yield
+    finally:
+        reset_pin(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or _pinned_to_primary.get():
+            return DEFAULT_DB_ALIAS
+        if model._meta.label_lower not in settings.REPLICA_READ_MODELS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction must see that transaction's writes
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary, so cross-alias relations are fine
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive schema changes through replication
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,238 @@
+"""
+Live stock and cart events for the /api/events/ server-sent events stream.
+
+Publishers (signal receivers, after commit) call publish(channel, event); each SSE connection
+subscribes to a few channels and waits on an asyncio queue, so an idle subscriber costs one
+suspended coroutine. Channels:
+
+    item:<item_id>            {'type': 'stock', 'item_id', 'quantity_available', 'is_available'}
+    cart:user:<user_id>       {'type': 'cart', 'cart_id', 'item_count', 'subtotal', 'version'}
+    cart:session:<key>        (same, for anonymous carts)
+
+settings.EVENTS_BROKER picks the fan-out. InProcessBroker only reaches subscribers in the
+publishing process (a single ASGI worker, or development). PostgresNotifyBroker sends every
+event through NOTIFY, so each ASGI process's listener delivers it to its own subscribers.
+"""
+import asyncio
+import json
+import logging
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .models import Item, ShoppingCart
+
+logger = logging.getLogger(__name__)
+
+
+def item_channel(item_id):
+    return f'item:{item_id}'
+
+
+def cart_channel(customer_id=None, session_key=None):
+    return f'cart:user:{customer_id}' if customer_id else f'cart:session:{session_key}'
+
+
+class Subscription:
+    """One SSE connection's inbox. Slow consumers lose the oldest events rather than growing without bound."""
+
+    def __init__(self, broker, channels, loop):
+        self.broker = broker
+        self.channels = frozenset(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self.subscribers = {} # channel -> set of Subscriptions
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def subscribe(self, channels):
+        """Called from the subscriber's event loop. Returns None when the process is at EVENTS_MAX_SUBSCRIBERS."""
+        subscription = Subscription(self, channels, asyncio.get_running_loop())
+        with self.lock:
+            if self.count >= settings.EVENTS_MAX_SUBSCRIBERS:
+                return None
+            self.count += 1
+            for channel in subscription.channels:
+                self.subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.count -= 1
+            for channel in subscription.channels:
+                listeners = self.subscribers.get(channel)
+                if listeners is not None:
+                    listeners.discard(subscription)
+                    if not listeners:
+                        del self.subscribers[channel]
+
+    def has_subscribers(self, channel):
+        """Lets publishers skip building events nobody here is listening to."""
+        return channel in self.subscribers
+
+    def is_idle(self):
+        return not self.count
+
+    def publish(self, channel, event):
+        self.deliver_local(channel, event)
+
+    def deliver_local(self, channel, event):
+        """Thread-safe: publishers run in request threads, subscribers on event loops."""
+        with self.lock:
+            listeners = list(self.subscribers.get(channel, ()))
+        for subscription in listeners:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError: # Loop already closed; the subscription is being torn down
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {'subscribers': self.count, 'channels': len(self.subscribers)}
+
+
+class PostgresNotifyBroker(InProcessBroker):
+    """
+    Shares events between processes with PostgreSQL LISTEN/NOTIFY (payloads must stay under
+    8000 bytes, which these small events do). Each process runs one listener connection,
+    started by its first subscriber.
+    """
+    pg_channel = 'shop_events'
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+
+    def has_subscribers(self, channel):
+        return True # Subscribers may be in any process
+
+    def is_idle(self):
+        return False
+
+    def publish(self, channel, event):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.pg_channel, json.dumps({'channel': channel, 'event': event})])
+
+    def subscribe(self, channels):
+        subscription = super().subscribe(channels)
+        if subscription is not None and (self.listener is None or self.listener.done()):
+            self.listener = asyncio.get_running_loop().create_task(self.listen())
+        return subscription
+
+    async def listen(self):
+        import psycopg
+        from psycopg.conninfo import make_conninfo
+
+        db = settings.DATABASES['default']
+        conninfo = make_conninfo(dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'],
+                                 host=db['HOST'], port=db['PORT'])
+        while self.count:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+                    await conn.execute(f'LISTEN {self.pg_channel}')
+                    async for notify in conn.notifies():
+                        message = json.loads(notify.payload)
+                        self.deliver_local(message['channel'], message['event'])
+                        if not self.count:
+                            return
+            except (psycopg.Error, OSError):
+                logger.exception('Event listener lost its connection, reconnecting')
+                await asyncio.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.EVENTS_BROKER)()
+        return _broker
+
+
+def publish(channel, event):
+    broker = get_broker()
+    if broker.has_subscribers(channel):
+        broker.publish(channel, event)
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def stock_event(item_id, quantity_available, is_available):
+    return {'type': 'stock', 'item_id': item_id, 'quantity_available': quantity_available, 'is_available': is_available}
+
+
+def cart_event(cart):
+    return {
+        'type': 'cart',
+        'cart_id': cart['id'],
+        'item_count': cart['item_count'],
+        'subtotal': f"{cart['subtotal']:.2f}",
+        'version': cart['version'],
+    }
+
+
+CART_EVENT_FIELDS = ('id', 'customer_id', 'session_key', 'item_count', 'subtotal', 'version')
+
+
+def publish_stock_changes(item_ids):
+    """After a bulk stock update: one query for the items somebody is watching."""
+    watched = [item_id for item_id in item_ids if get_broker().has_subscribers(item_channel(item_id))]
+    if not watched:
+        return
+    for row in Item.objects.filter(pk__in=watched).values('item_id', 'quantity_available', 'is_available'):
+        publish(item_channel(row['item_id']), stock_event(**row))
+
+
+def publish_cart_change(cart_id):
+    if get_broker().is_idle():
+        return
+    cart = ShoppingCart.objects.filter(pk=cart_id).values(*CART_EVENT_FIELDS).first()
+    if cart is not None:
+        publish(cart_channel(cart['customer_id'], cart['session_key']), cart_event(cart))
+
+
+def publish_cart_removed(cart_id, customer_id, session_key):
+    """The cart row is gone (checkout deletes it), so its owner hears about an empty cart."""
+    if get_broker().is_idle():
+        return
+    publish(cart_channel(customer_id, session_key), cart_event({
+        'id': cart_id, 'item_count': 0, 'subtotal': Decimal('0.00'), 'version': 0,
+    }))
+
+
+async def snapshot(item_ids, customer_id=None, session_key=None):
+    """Current state sent when a stream opens, so clients need no separate fetch."""
+    initial = [
+        stock_event(**row)
+        async for row in Item.objects.filter(pk__in=item_ids).values('item_id', 'quantity_available', 'is_available')
+    ]
+    carts = ShoppingCart.objects.filter(customer_id=customer_id) if customer_id else \
+        ShoppingCart.objects.filter(session_key=session_key, customer__isnull=True)
+    cart = await carts.values(*CART_EVENT_FIELDS).afirst()
+    if cart is not None:
+        initial.append(cart_event(cart))
+    return initial
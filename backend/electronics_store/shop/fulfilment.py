@@ -0,0 +1,152 @@
+"""
+Order fulfilment state machine.
+
+Every Order.status change goes through transition() or bulk_transition(). Both check the
+move against TRANSITIONS, apply it with a conditional UPDATE (so a concurrent change is
+never overwritten), record an OrderStatusTransition, keep Invoice.status in step and, on
+cancellation, put the ordered quantities back in stock. Bulk moves run per batch of
+BATCH_SIZE orders: a handful of set-based statements instead of several per order.
+"""
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Invoice, Item, Order, OrderItem, OrderStatusTransition
+from .signals import items_bulk_updated
+
+TRANSITIONS = {
+    'pending': {'paid', 'cancelled'},
+    'paid': {'processing', 'cancelled'},
+    'processing': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+# Customers may only cancel, and only before the warehouse has started on the order
+CUSTOMER_TRANSITIONS = {'pending': {'cancelled'}, 'paid': {'cancelled'}}
+BATCH_SIZE = 2000
+
+
+class InvalidTransition(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This order cannot move to the requested status.'
+    default_code = 'invalid_transition'
+
+
+def allowed_sources(to_status):
+    return [from_status for from_status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def can_transition(from_status, to_status, staff=True):
+    return to_status in (TRANSITIONS if staff else CUSTOMER_TRANSITIONS).get(from_status, ())
+
+
+def record_placed(order, user=None):
+    """History row for a newly placed order, so fulfilment time can be measured from it."""
+    OrderStatusTransition.objects.create(
+        order=order, to_status=order.status, changed_at=order.order_date,
+        changed_by=user if user and user.is_authenticated else None,
+    )
+
+
+@transaction.atomic
+def transition(order, to_status, user=None, staff=True):
+    """
+    Moves one order to to_status, or raises InvalidTransition. Updates order.status in place.
+    """
+    if not can_transition(order.status, to_status, staff):
+        raise InvalidTransition(f"Order {order.pk} cannot go from '{order.status}' to '{to_status}'.")
+    if not _apply(Order.objects.filter(pk=order.pk, status=order.status), [(order.pk, order.status)], to_status, user):
+        raise InvalidTransition(f"Order {order.pk} was changed by someone else; reload it and try again.")
+    order.status = to_status
+
+
+def bulk_transition(order_ids, to_status, user=None):
+    """
+    Moves every listed order that is in a valid source state to to_status.
+    Each batch commits on its own, so thousands of orders never hold one long lock.
+    Returns (moved_ids, skipped_ids); skipped orders were missing or in the wrong state.
+    """
+    sources = allowed_sources(to_status)
+    moved = []
+    for start in range(0, len(order_ids), BATCH_SIZE):
+        batch = order_ids[start:start + BATCH_SIZE]
+        with transaction.atomic():
+            rows = list(
+                Order.objects.select_for_update().filter(pk__in=batch, status__in=sources)
+                .values_list('order_id', 'status')
+            )
+            if rows:
+                locked = Order.objects.filter(pk__in=[order_id for order_id, _ in rows])
+                _apply(locked, rows, to_status, user)
+                moved.extend(order_id for order_id, _ in rows)
+    moved_set = set(moved)
+    return moved, [order_id for order_id in order_ids if order_id not in moved_set]
+
+
+def _apply(orders, rows, to_status, user):
+    """
+    rows: [(order_id, from_status)] matching the orders queryset. Must run inside a transaction.
+    Returns the number of orders updated.
+    """
+    updated = orders.update(status=to_status)
+    if not updated:
+        return 0
+    order_ids = [order_id for order_id, _ in rows]
+    changed_by = user if user and user.is_authenticated else None
+    OrderStatusTransition.objects.bulk_create([
+        OrderStatusTransition(order_id=order_id, from_status=from_status, to_status=to_status, changed_by=changed_by)
+        for order_id, from_status in rows
+    ], batch_size=BATCH_SIZE)
+    Invoice.objects.filter(order_id__in=order_ids).update(status=to_status) # Invoices mirror their order
+    if to_status == 'cancelled':
+        restock(order_ids)
+    return updated
+
+
+def restock(order_ids):
+    """
+    Returns the ordered quantities of cancelled orders to stock in one UPDATE. Only orders
+    placed through reserve_stock (those with a record_placed row) took stock; older orders
+    never did, so cancelling them leaves stock alone.
+    """
+    reserved = OrderStatusTransition.objects.filter(order_id__in=order_ids, from_status__isnull=True).values('order_id')
+    quantities = (
+        OrderItem.objects.filter(order_id__in=reserved).order_by()
+        .values('item_id').annotate(quantity=Sum('quantity'))
+    )
+    quantities = {row['item_id']: row['quantity'] for row in quantities}
+    if not quantities:
+        return
+    whens = [When(item_id=item_id, then=F('quantity_available') + Value(quantity)) for item_id, quantity in quantities.items()]
+    item_ids = list(quantities)
+    Item.objects.filter(item_id__in=item_ids).update(
+        quantity_available=Case(*whens, default=F('quantity_available')),
+        version=F('version') + 1,
+    )
+    transaction.on_commit(lambda: items_bulk_updated.send(sender=Item, item_ids=item_ids, price_changed_ids=[]))
+
+
+def reserve_stock(lines):
+    """
+    Takes {item_id: quantity} out of stock with one conditional UPDATE. Returns False, leaving
+    stock untouched, when any item has less than requested.
+    """
+    item_ids = list(lines)
+    guarded = Item.objects.filter(item_id__in=item_ids).filter(
+        quantity_available__gte=Case(*[When(item_id=item_id, then=Value(quantity)) for item_id, quantity in lines.items()])
+    )
+    with transaction.atomic(): # Savepoint, so a short batch can be undone without failing the caller
+        updated = guarded.update(
+            quantity_available=Case(
+                *[When(item_id=item_id, then=F('quantity_available') - Value(quantity)) for item_id, quantity in lines.items()],
+                default=F('quantity_available'),
+            ),
+            version=F('version') + 1,
+        )
+        if updated != len(item_ids):
+            transaction.set_rollback(True)
+            return False
+    transaction.on_commit(lambda: items_bulk_updated.send(sender=Item, item_ids=item_ids, price_changed_ids=[]))
+    return True
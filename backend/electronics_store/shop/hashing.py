@@ -0,0 +1,93 @@
+"""
+Password hashing off the request thread.
+
+Hashing and checking passwords is deliberately slow. Both run in a small per-process thread
+pool (hashlib releases the GIL while hashing), capped at PASSWORD_HASHING_WORKERS concurrent
+hashes with at most PASSWORD_HASHING_MAX_PENDING waiting. Beyond that, requests fail fast
+with 503 instead of tying up every worker during a signup spike. Sync views wait for their
+hash, so what the pool bounds is the CPU spent hashing per process, not the request thread;
+async callers await the same pool without blocking the event loop.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.db import close_old_connections
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins in progress, please retry shortly.'
+    default_code = 'password_hashing_busy'
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with the work factor taken from settings.PASSWORD_HASH_ITERATIONS.
+    Keeps the 'pbkdf2_sha256' algorithm name, so existing hashes verify and are upgraded
+    (or downgraded) to the configured cost on the user's next login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+def _pool():
+    """Created lazily so preforked workers each start their own threads."""
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = settings.PASSWORD_HASHING_WORKERS
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            _slots = threading.BoundedSemaphore(workers + settings.PASSWORD_HASHING_MAX_PENDING)
+        return _executor, _slots
+
+
+def _run_in_thread(slots, fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections() # Pool threads must not hold on to expired or pooled connections
+        slots.release() # Before the result is delivered, so the caller's next submit finds the slot free
+
+
+def submit(fn, *args, **kwargs):
+    """Queues fn on the hashing pool and returns its Future. Raises PasswordHashingBusy when full."""
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        raise PasswordHashingBusy()
+    try:
+        return executor.submit(_run_in_thread, slots, fn, *args, **kwargs)
+    except BaseException:
+        slots.release()
+        raise
+
+
+def hash_password(raw_password):
+    return submit(make_password, raw_password).result()
+
+
+def authenticate(request, **credentials):
+    """
+    django.contrib.auth.authenticate on the hashing pool. A stored hash with an outdated
+    work factor is rehashed and saved there as well.
+    """
+    return submit(auth.authenticate, request, **credentials).result()
+
+
+async def ahash_password(raw_password):
+    return await asyncio.wrap_future(submit(make_password, raw_password))
+
+
+async def aauthenticate(request, **credentials):
+    return await asyncio.wrap_future(submit(auth.authenticate, request, **credentials))
@@ -0,0 +1,122 @@
+"""
+Idempotency-Key support for write endpoints that must not run twice (checkout, payments).
+
+The first request with a given key reserves a row before the view runs. Retries with the
+same key and payload get the stored response back without touching orders or payments;
+a retry that arrives while the first attempt is still running gets 409, and reusing a key
+for a different payload gets 422. Only successful responses are kept: failed attempts
+release the key so the client can retry it.
+
+The response is stored in the same transaction as the workflow, so a committed order
+always has its stored response. A reservation still empty after IDEMPOTENCY_KEY_LEASE
+seconds belongs to an attempt that died before committing, and the next retry takes it over.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def request_owner(request):
+    """Keys are scoped to the user, or to the session for anonymous checkouts."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    if not request.session.session_key:
+        request.session.save()
+    return f'session:{request.session.session_key}'
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    payload = f'{request.method}\n{request.path}\n{body}'
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def reserve(key, owner, fingerprint):
+    """
+    Returns (record, created). An expired record left behind for the same key is replaced,
+    as is a reservation whose lease ran out without a stored response.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                key=key, owner=owner, fingerprint=fingerprint, expires_at=expires_at
+            ), True
+    except IntegrityError:
+        record = IdempotencyKey.objects.get(key=key, owner=owner)
+    abandoned = record.response_status is None and record.created_at <= now - timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE)
+    if record.expires_at > now and not abandoned:
+        return record, False
+    # If an abandoned attempt is in fact still running, its final save() matches no row and it rolls back
+    IdempotencyKey.objects.filter(pk=record.pk).delete()
+    return reserve(key, owner, fingerprint)
+
+
+def idempotent(view_method):
+    """
+    Decorates a viewset action. Requests without the header behave exactly as before.
+    Place it above @transaction.atomic so the reservation commits before the workflow starts;
+    the workflow and its stored response then commit together.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"detail": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        record, created = reserve(key, request_owner(request), fingerprint)
+        if not created:
+            if record.fingerprint != fingerprint:
+                return Response({"detail": f"This {IDEMPOTENCY_HEADER} was already used for a different request."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.response_status is None:
+                return Response({"detail": "A request with this Idempotency-Key is still being processed."},
+                                status=status.HTTP_409_CONFLICT)
+            return Response(record.response_body, status=record.response_status,
+                            headers={REPLAYED_HEADER: 'true'})
+
+        try:
+            with transaction.atomic():
+                response = view_method(self, request, *args, **kwargs)
+                if status.is_success(response.status_code):
+                    record.response_status = response.status_code
+                    record.response_body = response.data
+                    record.save(update_fields=['response_status', 'response_body'])
+        except Exception:
+            IdempotencyKey.objects.filter(pk=record.pk, response_status__isnull=True).delete()
+            raise
+        if not status.is_success(response.status_code):
+            record.delete()
+        return response
+
+    return wrapper
+
+
+def purge_expired(batch_size=1000):
+    """Deletes expired keys in batches. Returns the number removed."""
+    purged = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return purged
+        purged += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
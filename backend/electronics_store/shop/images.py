@@ -0,0 +1,108 @@
+"""
+Product image ingestion.
+
+Item.image_url is the source. The ingest_item_images command downloads each source,
+renders resized WebP and JPEG variants in a process pool and stores every file in
+MEDIA_ROOT under the SHA-256 of its bytes. Unchanged images therefore reuse the same
+files, and the URLs can be cached forever. Item.image_variants records the result; the
+serializer turns it into URLs.
+
+Pillow is only needed to ingest. Serving and serializing work without it.
+"""
+import hashlib
+import io
+import urllib.request
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+FORMATS = {'webp': ('WEBP', 'webp'), 'jpeg': ('JPEG', 'jpg')}
+DOWNLOAD_TIMEOUT = 15 # Seconds
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+
+
+class ImageIngestError(Exception):
+    pass
+
+
+def download(url):
+    """Reads a source image from http(s) or file:// URLs."""
+    try:
+        with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+    except (OSError, ValueError) as exc:
+        raise ImageIngestError(f'Could not download {url}: {exc}') from exc
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ImageIngestError(f'{url} is larger than {MAX_SOURCE_BYTES} bytes.')
+    return data
+
+
+def render_variants(source, widths, quality):
+    """
+    Runs in a worker process. Returns {variant: {'width', 'height', 'webp': bytes, 'jpeg': bytes}},
+    never upscaling past the source width.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(source))
+        image.load()
+    except (UnidentifiedImageError, OSError) as exc:
+        raise ImageIngestError(f'Not a supported image: {exc}') from exc
+    except Image.DecompressionBombError as exc: # Pixel count far above Image.MAX_IMAGE_PIXELS
+        raise ImageIngestError(f'Image too large to decode: {exc}') from exc
+    image = ImageOps.exif_transpose(image).convert('RGB') # JPEG has no alpha; WebP output stays consistent with it
+
+    rendered = {}
+    for name, width in widths.items():
+        width = min(width, image.width)
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        rendered[name] = {'width': width, 'height': height}
+        for fmt, (pil_format, _) in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, quality=quality, optimize=True)
+            rendered[name][fmt] = buffer.getvalue()
+    return rendered
+
+
+def store_content_addressed(data, extension):
+    """Saves bytes under their SHA-256 (e.g. items/3f/3fa9...e1.webp) unless already stored."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = f'{settings.ITEM_IMAGE_DIR}/{digest[:2]}/{digest}.{extension}'
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(data))
+    return path
+
+
+def store_variants(source_url, source, rendered):
+    """Writes rendered variants and returns the Item.image_variants document."""
+    variants = {}
+    for name, variant in rendered.items():
+        variants[name] = {'width': variant['width'], 'height': variant['height']}
+        for fmt, (_, extension) in FORMATS.items():
+            variants[name][fmt] = store_content_addressed(variant[fmt], extension)
+    return {
+        'source': source_url,
+        'source_sha256': hashlib.sha256(source).hexdigest(),
+        'variants': variants,
+    }
+
+
+def variant_urls(item):
+    """
+    {'thumb': {'width', 'height', 'webp': url, 'jpeg': url}, ...} for the item's current
+    image_url, or None when it has not been ingested (or the source changed since).
+    """
+    document = item.image_variants
+    if not document or document.get('source') != item.image_url:
+        return None
+    return {
+        name: {
+            'width': variant['width'],
+            'height': variant['height'],
+            **{fmt: default_storage.url(variant[fmt]) for fmt in FORMATS},
+        }
+        for name, variant in document['variants'].items()
+    }
@@ -0,0 +1,124 @@
+"""
+Read-through Item cache: a small per-worker LRU in front of the shared Django cache.
+
+Shared entries are keyed by (item_id, generation); saving an Item (or a bulk stockroom
+batch) bumps its generation after commit, so no process reads the old entry again.
+The local tier keeps pickled items for at most ITEM_CACHE_LOCAL_TTL seconds, bounded by
+ITEM_CACHE_LOCAL_MAX_ENTRIES and ITEM_CACHE_LOCAL_MAX_BYTES, which is how stale another
+worker's copy can be after a change. Anything that must see current stock (checkout,
+stock adjustments) reads the database instead: get_item(..., use_cache=False).
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .db_routers import use_primary
+from .models import Item
+
+
+class LocalLRU:
+    """Thread-safe LRU of pickled values with a TTL, an entry cap and a byte cap."""
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict() # key -> (expires_at, payload)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, payload)
+            self.size += len(payload)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        self.size -= len(self.entries.pop(key)[1])
+
+
+local_items = LocalLRU(
+    max_entries=settings.ITEM_CACHE_LOCAL_MAX_ENTRIES,
+    max_bytes=settings.ITEM_CACHE_LOCAL_MAX_BYTES,
+    ttl=settings.ITEM_CACHE_LOCAL_TTL,
+)
+
+
+def _generation_key(item_id):
+    return f'item-generation:{item_id}'
+
+
+def item_generation(item_id):
+    generation = cache.get(_generation_key(item_id))
+    if generation is None:
+        # Evicted (or never set): a fresh generation orphans whatever was cached before
+        cache.add(_generation_key(item_id), time.time_ns(), None)
+        generation = cache.get(_generation_key(item_id))
+    return generation
+
+
+def invalidate_items(item_ids):
+    """Call after commit. Other workers' local copies expire within ITEM_CACHE_LOCAL_TTL."""
+    generation = time.time_ns()
+    cache.set_many({_generation_key(item_id): generation for item_id in item_ids}, None)
+    for item_id in item_ids:
+        local_items.delete(item_id)
+
+
+def get_item(item_id, use_cache=True):
+    """
+    Returns a private copy of the Item, or None if it does not exist.
+    use_cache=False always reads the primary database (stock-sensitive paths).
+    """
+    try:
+        item_id = int(item_id)
+    except (TypeError, ValueError):
+        return None
+    if not use_cache:
+        with use_primary():
+            return Item.objects.filter(pk=item_id).first()
+
+    payload = local_items.get(item_id)
+    if payload is None:
+        key = f'item:{item_id}:{item_generation(item_id)}'
+        payload = cache.get(key)
+        if payload is None:
+            # Fill from the primary: a lagging replica could otherwise pin an old row to the new generation
+            with use_primary():
+                item = Item.objects.filter(pk=item_id).first()
+            if item is None:
+                return None
+            payload = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+            cache.set(key, payload, settings.ITEM_CACHE_TIMEOUT)
+        local_items.set(item_id, payload)
+    return pickle.loads(payload)
@@ -0,0 +1,38 @@
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from shop.analytics import REPORTS, build_report
+
+
+class Command(BaseCommand):
+    help = 'Builds a vectorised analytics report (revenue by category, basket sizes, cohort retention) and prints it as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('report', choices=sorted(REPORTS))
+        parser.add_argument('--start', help='First day (YYYY-MM-DD). Defaults to 30 days before --end.')
+        parser.add_argument('--end', help='Day after the last day (YYYY-MM-DD). Defaults to tomorrow.')
+        parser.add_argument('--no-cache', action='store_true', help='Recompute even if a cached copy exists.')
+
+    def handle(self, *args, **options):
+        end = self._day(options['end']) if options['end'] else timezone.localdate() + timedelta(days=1)
+        start = self._day(options['start']) if options['start'] else end - timedelta(days=30)
+        if start >= end:
+            raise CommandError('--start must be before --end.')
+
+        report = build_report(
+            options['report'], self._midnight(start), self._midnight(end), use_cache=not options['no_cache']
+        )
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def _day(self, value):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid date: {value}')
+        return day
+
+    def _midnight(self, day):
+        return timezone.make_aware(datetime.combine(day, time.min))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.archival import ARCHIVABLE_STATUSES, archivable, archive_orders, cutoff_for
+
+
+class Command(BaseCommand):
+    help = ('Moves delivered and cancelled orders older than the cutoff, with their items, payments, '
+            'invoices and receipts, into ArchivedOrder in bounded batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help='Archive orders placed more than this many days ago (default ARCHIVE_ORDERS_AFTER_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Orders per transaction (default ARCHIVE_BATCH_SIZE).')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many orders.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would move.')
+
+    def handle(self, *args, **options):
+        for option in ('older_than_days', 'batch_size', 'limit'):
+            if options[option] is not None and options[option] <= 0:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive.")
+        cutoff = cutoff_for(options['older_than_days'])
+        if options['dry_run']:
+            count = archivable(cutoff).count()
+            self.stdout.write(f"{count} {'/'.join(ARCHIVABLE_STATUSES)} orders placed before {cutoff:%Y-%m-%d} would be archived.")
+            return
+
+        archived = archive_orders(
+            cutoff, batch_size=options['batch_size'], limit=options['limit'],
+            progress=lambda total: self.stdout.write(f'  {total} archived...'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} orders placed before {cutoff:%Y-%m-%d}.'))
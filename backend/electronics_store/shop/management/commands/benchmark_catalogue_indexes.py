@@ -0,0 +1,129 @@
+import random
+import re
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from shop.models import Item, ItemCategory
+
+PLAN_LINE = re.compile(r'Scan|SCAN|SEARCH|B-TREE|Sort', re.IGNORECASE)
+PAGE = 24
+
+
+class Rollback(Exception):
+    pass
+
+
+def catalogue_queries(category):
+    """(label, queryset) pairs mirroring the catalogue endpoints."""
+    items = Item.objects.defer('item_long_description')
+    available = items.filter(is_available=True)
+    return [
+        ('catalogue by name', items.order_by('item_name', 'item_id')[:PAGE]),
+        ('available by name', available.order_by('item_name', 'item_id')[:PAGE]),
+        ('available card columns', Item.objects.filter(is_available=True).order_by('item_name', 'item_id')
+            .values('item_id', 'item_name', 'unit_price', 'quantity_available', 'image_url')[:PAGE]),
+        ('featured', available.filter(is_featured=True).order_by('item_name', 'item_id')),
+        ('available by price', available.order_by('unit_price', 'item_id')[:PAGE]),
+        ('available by price desc', available.order_by('-unit_price', '-item_id')[:PAGE]),
+        ('category page', available.filter(item_type=category).order_by('item_name', 'item_id')[:PAGE]),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Seeds a large catalogue inside a transaction, then compares query plans and latency of the '
+            'catalogue queries with and without the Item indexes. Everything is rolled back. '
+            'Dropping indexes locks shop_item until the end, so run it against a development database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000, help='Items to seed.')
+        parser.add_argument('--repeat', type=int, default=7, help='Runs per query (median is reported).')
+        parser.add_argument('--plans', action='store_true', help='Print the full query plans.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                category = self.seed(options['rows'])
+                with_indexes = self.measure(category, options['repeat'], 'indexed')
+                try:
+                    with transaction.atomic(): # Savepoint: the indexes come back on rollback
+                        self.drop_indexes()
+                        without_indexes = self.measure(category, options['repeat'], 'no index')
+                        raise Rollback
+                except Rollback:
+                    pass
+                raise Rollback
+        except Rollback:
+            pass
+        self.report(with_indexes, without_indexes, options['plans'])
+
+    def seed(self, rows):
+        if rows <= 0:
+            raise CommandError('--rows must be positive.')
+        self.stdout.write(f'Seeding {rows} items...')
+        categories = [ItemCategory.objects.create(name=f'Benchmark category {n}') for n in range(20)]
+        rng = random.Random(42)
+        batch = []
+        for n in range(rows):
+            batch.append(Item(
+                item_name=f'Benchmark {rng.getrandbits(64):016x}',
+                item_short_description='Short description',
+                item_long_description='Long description. ' * 20,
+                item_type=categories[n % len(categories)],
+                unit_price=Decimal(rng.randint(500, 200_000)) / 100,
+                quantity_available=rng.randint(0, 50),
+                is_available=rng.random() < 0.8,
+                is_featured=rng.random() < 0.01,
+                image_url=f'https://example.com/images/{n}.jpg',
+            ))
+            if len(batch) == 5000:
+                Item.objects.bulk_create(batch)
+                batch = []
+        Item.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(Item._meta.db_table)}')
+        return categories[0]
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for index in Item._meta.indexes:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+
+    def measure(self, category, repeat, phase):
+        results = {}
+        for label, queryset in catalogue_queries(category):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - started)
+            results[label] = (statistics.median(timings), self.explain(queryset, phase))
+        return results
+
+    def explain(self, queryset, phase):
+        """
+        Like QuerySet.explain(), but the statement text is tagged with the phase: drivers that
+        cache prepared statements (sqlite3) would otherwise return the plan from before DROP INDEX.
+        """
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql} /* {phase} */', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def report(self, with_indexes, without_indexes, full_plans):
+        self.stdout.write(f'{"query":<26}{"indexed ms":>12}{"no index ms":>13}{"speed-up":>10}')
+        for label, (indexed_time, indexed_plan) in with_indexes.items():
+            plain_time, plain_plan = without_indexes[label]
+            self.stdout.write(
+                f'{label:<26}{indexed_time * 1000:>12.2f}{plain_time * 1000:>13.2f}'
+                f'{plain_time / indexed_time if indexed_time else 0:>9.1f}x'
+            )
+            for heading, plan in (('  indexed:', indexed_plan), ('  no index:', plain_plan)):
+                lines = plan.splitlines() if full_plans else [
+                    re.sub(r'\s*\(cost=.*', '', line).strip() for line in plan.splitlines() if PLAN_LINE.search(line)
+                ]
+                self.stdout.write(f'{heading} ' + ' | '.join(line.strip() for line in lines))
+        self.stdout.write(self.style.SUCCESS('Benchmark data and index changes were rolled back.'))
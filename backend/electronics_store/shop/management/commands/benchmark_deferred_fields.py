@@ -0,0 +1,64 @@
+import pickle
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum, TextField
+from django.db.models.functions import Cast, Length
+
+from shop.models import CartItem, Item, OrderItem, Payment, PaymentHistory
+
+# (label, queryset as the list endpoints build it, columns those endpoints now defer)
+CASES = [
+    ('Item list', lambda: Item.objects.all(), ['item_long_description']),
+    ('Cart lines', lambda: CartItem.objects.select_related('item'), ['item__item_long_description']),
+    ('Order lines', lambda: OrderItem.objects.select_related('item'), ['item__item_long_description']),
+    ('Payment list', lambda: Payment.objects.all(), ['payment_details']),
+    ('Payment history list', lambda: PaymentHistory.objects.all(), ['payment_details']),
+]
+
+
+class Command(BaseCommand):
+    help = ('Compares list querysets with and without the large columns deferred: '
+            'characters no longer read from the database, pickled row size and fetch time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000, help='Rows fetched per case.')
+        parser.add_argument('--repeat', type=int, default=5, help='Fetches per variant (best time is reported).')
+
+    def handle(self, *args, **options):
+        limit, repeat = options['limit'], options['repeat']
+        for label, build, deferred in CASES:
+            base = build().order_by('pk')[:limit]
+            row_ids = list(base.values_list('pk', flat=True))
+            if not row_ids:
+                self.stdout.write(f'{label}: no rows, skipped')
+                continue
+            # Summed over the same rows the fetch reads (aggregates cannot run on a sliced queryset)
+            rows = build().filter(pk__in=row_ids)
+            skipped_chars = sum(
+                rows.aggregate(chars=Sum(Length(Cast(column, output_field=TextField()))))['chars'] or 0
+                for column in deferred
+            )
+            full_time, full_rows = self.fetch(base, repeat)
+            lean_time, lean_rows = self.fetch(base.defer(*deferred), repeat)
+            full_size = len(pickle.dumps(full_rows))
+            lean_size = len(pickle.dumps(lean_rows))
+            self.stdout.write(
+                f'{label} ({len(row_ids)} rows, deferring {", ".join(deferred)}): '
+                f'{skipped_chars} chars not read; pickled {full_size} -> {lean_size} bytes '
+                f'({self.percent(full_size - lean_size, full_size)} smaller); '
+                f'fetch {full_time * 1000:.1f} -> {lean_time * 1000:.1f} ms'
+            )
+        self.stdout.write(self.style.SUCCESS('Done.'))
+
+    def fetch(self, queryset, repeat):
+        best, rows = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = list(queryset.all())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, rows
+
+    def percent(self, part, whole):
+        return f'{part / whole * 100:.0f}%' if whole else 'n/a'
@@ -0,0 +1,67 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from shop import hashing
+
+BENCHMARK_USERNAME = '_benchmark_login'
+BENCHMARK_PASSWORD = 'benchmark-login-password'
+
+
+class Command(BaseCommand):
+    help = ('Measures login throughput: concurrent clients authenticating through the password '
+            'hashing pool at the configured (or given) PBKDF2 work factor.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50, help='Total logins to perform.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Simultaneous clients.')
+        parser.add_argument('--iterations', type=int, default=None,
+                            help='PBKDF2 iterations to test instead of PASSWORD_HASH_ITERATIONS.')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['iterations']:
+            overrides['PASSWORD_HASH_ITERATIONS'] = options['iterations']
+        with override_settings(**overrides):
+            self.run(options['logins'], options['concurrency'])
+
+    def run(self, logins, concurrency):
+        User = get_user_model()
+        user, _ = User.objects.update_or_create(
+            username=BENCHMARK_USERNAME,
+            defaults={'password': make_password(BENCHMARK_PASSWORD), 'email': '', 'is_active': True},
+        )
+        iterations = hashing.TunablePBKDF2PasswordHasher().iterations
+
+        def login_once(_):
+            started = time.perf_counter()
+            try:
+                ok = hashing.authenticate(None, username=BENCHMARK_USERNAME, password=BENCHMARK_PASSWORD) is not None
+            except hashing.PasswordHashingBusy:
+                return None
+            return time.perf_counter() - started if ok else None
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as clients:
+                results = list(clients.map(login_once, range(logins)))
+            elapsed = time.perf_counter() - started
+        finally:
+            user.delete()
+
+        latencies = sorted(r for r in results if r is not None)
+        rejected = len(results) - len(latencies)
+        self.stdout.write(f'PBKDF2 iterations: {iterations}, clients: {concurrency}, logins: {logins}')
+        if not latencies:
+            self.stdout.write(self.style.ERROR('Every login was rejected or failed.'))
+            return
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(f'Rejected (pool saturated): {rejected}')
+        self.stdout.write(f'Latency ms: p50 {statistics.median(latencies) * 1000:.1f}, '
+                          f'p95 {p95 * 1000:.1f}, max {latencies[-1] * 1000:.1f}')
+        self.stdout.write(self.style.SUCCESS(f'Throughput: {len(latencies) / elapsed:.1f} logins/s'))
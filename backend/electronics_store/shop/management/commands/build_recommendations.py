@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from shop.recommendations import prune_co_purchases, refresh_co_purchases
+
+
+class Command(BaseCommand):
+    help = 'Updates the frequently-bought-together index from orders placed since the last run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Discard the index and rebuild it from the full order history.')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Orders per transaction.')
+
+    def handle(self, *args, **options):
+        processed = refresh_co_purchases(batch_size=options['batch_size'], rebuild=options['rebuild'])
+        pruned = prune_co_purchases()
+        self.stdout.write(self.style.SUCCESS(f'Co-purchase index updated from {processed} orders; {pruned} weak pairs pruned.'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.metrics import BUCKET_FUNCTIONS, compute_metrics
+
+
+class Command(BaseCommand):
+    help = 'Incrementally rolls Order/Receipt/Item data up into PerformanceMetric buckets. Schedule it with cron or run it with --interval.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--granularity', action='append', choices=sorted(BUCKET_FUNCTIONS),
+                            help='Bucket size to compute (repeatable). Defaults to day.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Source rows per transaction.')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Seconds between runs. 0 runs once and exits.')
+
+    def handle(self, *args, **options):
+        granularities = options['granularity'] or ['day']
+        while True:
+            processed = compute_metrics(granularities, batch_size=options['batch_size'])
+            summary = ', '.join(f'{metric}={count}' for metric, count in processed.items())
+            self.stdout.write(self.style.SUCCESS(f'Metrics updated ({summary}).'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
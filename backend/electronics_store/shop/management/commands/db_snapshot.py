@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.snapshots import SnapshotError, create_snapshot, delete_snapshot, list_snapshots, restore_snapshot
+
+
+class Command(BaseCommand):
+    help = ('Saves, restores, lists or deletes whole-database snapshots (a template database on PostgreSQL, '
+            'a file copy on SQLite). Restoring replaces every row in the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['create', 'restore', 'list', 'delete'])
+        parser.add_argument('name', nargs='?', default='seed', help='Snapshot name (default: seed).')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--force', action='store_true',
+                            help='PostgreSQL: disconnect other sessions instead of failing when restoring.')
+
+    def handle(self, *args, **options):
+        action, name, using = options['action'], options['name'], options['database']
+        if action == 'list':
+            for snapshot in list_snapshots(using):
+                self.stdout.write(snapshot)
+            return
+
+        started = time.perf_counter()
+        try:
+            if action == 'create':
+                create_snapshot(name, using)
+            elif action == 'restore':
+                restore_snapshot(name, using, force=options['force'])
+            else:
+                delete_snapshot(name, using)
+        except SnapshotError as exc:
+            raise CommandError(str(exc))
+        elapsed = (time.perf_counter() - started) * 1000
+        past = {'create': 'Created', 'restore': 'Restored', 'delete': 'Deleted'}[action]
+        self.stdout.write(self.style.SUCCESS(f"{past} snapshot '{name}' in {elapsed:.0f} ms."))
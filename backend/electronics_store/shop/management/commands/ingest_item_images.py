@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from shop.images import ImageIngestError, download, render_variants, store_variants
+from shop.models import Item
+from shop.signals import items_bulk_updated
+
+DOWNLOAD_THREADS = 8
+
+
+class Command(BaseCommand):
+    help = ('Downloads Item.image_url sources and stores resized WebP/JPEG variants in MEDIA_ROOT. '
+            'Items whose image_url has not changed since the last ingest are skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--item', type=int, action='append', dest='item_ids',
+                            help='Only ingest this item id (repeatable).')
+        parser.add_argument('--force', action='store_true', help='Re-ingest items that are already up to date.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                            help='Processes resizing images.')
+
+    def handle(self, *args, **options):
+        try:
+            import PIL # noqa: F401
+        except ImportError:
+            raise CommandError('Pillow is required to ingest images: pip install Pillow')
+
+        items = Item.objects.exclude(image_url__isnull=True).exclude(image_url='').order_by('item_id')
+        if options['item_ids']:
+            items = items.filter(item_id__in=options['item_ids'])
+        pending = [
+            item for item in items
+            if options['force'] or (item.image_variants or {}).get('source') != item.image_url
+        ]
+        if not pending:
+            self.stdout.write(self.style.SUCCESS('All item images are up to date.'))
+            return
+
+        # Downloads are I/O bound (threads); resizing is CPU bound (processes)
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_THREADS) as downloads, \
+                ProcessPoolExecutor(max_workers=options['workers']) as renders:
+            fetches = {downloads.submit(download, item.image_url): item for item in pending}
+            jobs = {}
+            failed = 0
+            for fetch in as_completed(fetches):
+                item = fetches[fetch]
+                try:
+                    source = fetch.result()
+                except ImageIngestError as exc:
+                    failed += 1
+                    self.stderr.write(f'Item {item.item_id}: {exc}')
+                    continue
+                job = renders.submit(render_variants, source, settings.ITEM_IMAGE_WIDTHS, settings.ITEM_IMAGE_QUALITY)
+                jobs[job] = (item, source)
+
+            ingested = 0
+            for job in as_completed(jobs):
+                item, source = jobs[job]
+                try:
+                    rendered = job.result()
+                except ImageIngestError as exc:
+                    failed += 1
+                    self.stderr.write(f'Item {item.item_id}: {exc}')
+                    continue
+                if self.save_variants(item, store_variants(item.image_url, source, rendered)):
+                    ingested += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'Item {item.item_id}: image_url changed during ingest; run again.')
+
+        self.stdout.write(self.style.SUCCESS(f'Ingested images for {ingested} items ({failed} failed).'))
+
+    def save_variants(self, item, variants):
+        """
+        Stores the variants with a compare-and-set on version, so a concurrent price or stock
+        change is never overwritten. Retries on a newer version as long as image_url is unchanged.
+        """
+        version = item.version
+        while not Item.objects.filter(pk=item.pk, version=version).update(
+            image_variants=variants, version=F('version') + 1,
+        ):
+            current = Item.objects.filter(pk=item.pk).values('image_url', 'version').first()
+            if current is None or current['image_url'] != item.image_url:
+                return False
+            version = current['version']
+        items_bulk_updated.send(sender=Item, item_ids=[item.pk], price_changed_ids=[]) # update() sends no post_save
+        return True
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import aiohttp
+except ImportError: # Only needed to run a load test
+    aiohttp = None
+
+# name -> (weight, steps). Each virtual user keeps picking a journey by weight until the run ends.
+JOURNEYS = {
+    'browse': (50, ['featured', 'list_items', 'item_detail']),
+    'shop': (30, ['featured', 'list_items', 'item_detail', 'add_to_cart', 'view_cart']),
+    'buy': (20, ['list_items', 'add_to_cart', 'view_cart', 'checkout', 'create_payment', 'initiate_payment']),
+}
+PERCENTILES = (50, 90, 95, 99)
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list) # step -> seconds
+        self.statuses = defaultdict(Counter) # step -> {status code or error name: count}
+        self.errors = Counter()
+        self.journeys = Counter()
+
+    def record(self, step, seconds, outcome, ok):
+        self.latencies[step].append(seconds)
+        self.statuses[step][outcome] += 1
+        if not ok:
+            self.errors[step] += 1
+
+    def report(self, elapsed):
+        rows = []
+        for step in sorted(self.latencies, key=lambda s: -len(self.latencies[s])):
+            timings = sorted(self.latencies[step])
+            cuts = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+            rows.append({
+                'step': step,
+                'requests': len(timings),
+                'errors': self.errors[step],
+                'error_rate': self.errors[step] / len(timings),
+                'rps': len(timings) / elapsed,
+                **{f'p{p}_ms': cuts[p - 1] * 1000 for p in PERCENTILES},
+                'max_ms': timings[-1] * 1000,
+                'statuses': {str(outcome): count for outcome, count in self.statuses[step].items()},
+            })
+        return rows
+
+
+class VirtualUser:
+    """
+    One browser: its own cookie jar (session + csrftoken), fetching the CSRF cookie from
+    /api-auth/login/ and sending it back as X-CSRFToken, as the React client does.
+    """
+
+    def __init__(self, base_url, session, stats, item_ids, payment_method, rng):
+        self.base_url = base_url.rstrip('/')
+        self.session = session
+        self.stats = stats
+        self.item_ids = item_ids
+        self.payment_method = payment_method
+        self.rng = rng
+        self.order = None
+        self.payment_id = None
+        self.email = f'loadtest-{rng.getrandbits(48):012x}@example.com'
+
+    def csrf_token(self):
+        cookie = self.session.cookie_jar.filter_cookies(self.base_url).get('csrftoken')
+        return cookie.value if cookie else ''
+
+    async def request(self, step, method, path, payload=None, expect=(200, 201)):
+        headers = {}
+        if method != 'GET':
+            headers = {'X-CSRFToken': self.csrf_token(), 'Referer': self.base_url + '/'}
+        started = time.perf_counter()
+        try:
+            async with self.session.request(method, self.base_url + path, json=payload, headers=headers) as response:
+                body = await response.read()
+                is_json = response.content_type == 'application/json'
+                elapsed = time.perf_counter() - started
+                ok = response.status in expect
+                self.stats.record(step, elapsed, response.status, ok)
+        except (asyncio.TimeoutError, aiohttp.ClientError) as exc:
+            self.stats.record(step, time.perf_counter() - started, type(exc).__name__, False)
+            raise StepFailed(step) from exc
+        if not ok:
+            raise StepFailed(step)
+        return json.loads(body) if body and is_json else None
+
+    async def start(self):
+        await self.request('csrf', 'GET', '/api-auth/login/')
+
+    async def run_journey(self, name, steps, think_time):
+        self.order = self.payment_id = None
+        try:
+            for step in steps:
+                await getattr(self, step)()
+                if think_time:
+                    await asyncio.sleep(self.rng.uniform(0, 2 * think_time))
+        except StepFailed:
+            return # The rest of the journey depends on the failed step
+        self.stats.journeys[name] += 1
+
+    async def featured(self):
+        await self.request('featured', 'GET', '/api/items/featured/')
+
+    async def list_items(self):
+        await self.request('list_items', 'GET', '/api/items/?available=true')
+
+    async def item_detail(self):
+        await self.request('item_detail', 'GET', f'/api/items/{self.rng.choice(self.item_ids)}/')
+
+    async def add_to_cart(self):
+        item_id = self.rng.choice(self.item_ids)
+        await self.request('add_to_cart', 'POST', '/api/cart-items/', {'item': item_id, 'quantity': 1})
+
+    async def view_cart(self):
+        await self.request('view_cart', 'GET', '/api/carts/')
+
+    async def checkout(self):
+        self.order = await self.request('checkout', 'POST', '/api/orders/place_order_from_cart/', {
+            'customer_email': self.email, 'delivery_address': '1 Load Test Street',
+        })
+
+    async def create_payment(self):
+        payment = await self.request('create_payment', 'POST', '/api/payments/', {
+            'order': self.order['order_id'], 'amount_paid': self.order['total_amount'],
+            'payment_method': self.payment_method,
+        })
+        self.payment_id = payment['id']
+
+    async def initiate_payment(self):
+        await self.request('initiate_payment', 'POST', f'/api/payments/{self.payment_id}/initiate_payment/',
+                           {'customer_email': self.email})
+
+
+class Command(BaseCommand):
+    help = ('Replays weighted user journeys (browse, shop, buy) against a running server with many concurrent '
+            'asyncio clients and reports throughput, error rates and latency percentiles per step. '
+            'Checkouts create real orders, so point it at a development or staging database. '
+            'Raise THROTTLE_BUDGETS on the target first, or the numbers measure the throttle.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--users', type=int, default=50, help='Concurrent virtual users.')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run.')
+        parser.add_argument('--ramp-up', type=float, default=5, help='Seconds over which users start.')
+        parser.add_argument('--think-time', type=float, default=0,
+                            help='Mean pause between steps in seconds (0 = back-to-back).')
+        parser.add_argument('--journey', action='append', choices=sorted(JOURNEYS), dest='journeys',
+                            help='Only run this journey (repeatable).')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds.')
+        parser.add_argument('--seed', type=int, default=None, help='Makes journey choices repeatable.')
+        parser.add_argument('--output', help='Also write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        if aiohttp is None:
+            raise CommandError('aiohttp is required for load tests: pip install aiohttp')
+        if options['users'] <= 0 or options['duration'] <= 0:
+            raise CommandError('--users and --duration must be positive.')
+
+        stats, elapsed = asyncio.run(self.run(options))
+        rows = stats.report(elapsed)
+        self.print_report(rows, stats, elapsed, options)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({
+                    'options': {key: options[key] for key in
+                                ('base_url', 'users', 'duration', 'ramp_up', 'think_time', 'journeys', 'seed')},
+                    'elapsed_seconds': elapsed,
+                    'journeys_completed': dict(stats.journeys),
+                    'steps': rows,
+                }, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    async def run(self, options):
+        names = options['journeys'] or sorted(JOURNEYS)
+        weights = [JOURNEYS[name][0] for name in names]
+        stats = Stats()
+        timeout = aiohttp.ClientTimeout(total=options['timeout'])
+        connector = aiohttp.TCPConnector(limit=options['users'])
+        base_url = options['base_url']
+
+        async with aiohttp.ClientSession(connector=connector, connector_owner=False, timeout=timeout) as probe:
+            item_ids, payment_method = await self.catalogue(probe, base_url)
+
+        started = time.perf_counter()
+        deadline = started + options['duration']
+        master = random.Random(options['seed'])
+
+        async def user(number, seed):
+            await asyncio.sleep(options['ramp_up'] * number / options['users'])
+            rng = random.Random(seed)
+            # unsafe=True keeps cookies for IP-address hosts such as 127.0.0.1
+            async with aiohttp.ClientSession(connector=connector, connector_owner=False, timeout=timeout,
+                                             cookie_jar=aiohttp.CookieJar(unsafe=True)) as session:
+                client = VirtualUser(base_url, session, stats, item_ids, payment_method, rng)
+                try:
+                    await client.start()
+                except StepFailed:
+                    return
+                while time.perf_counter() < deadline:
+                    name = rng.choices(names, weights)[0]
+                    await client.run_journey(name, JOURNEYS[name][1], options['think_time'])
+
+        self.stdout.write(f"Running {options['users']} users for {options['duration']:.0f}s against {base_url}...")
+        try:
+            await asyncio.gather(*(user(n, master.getrandbits(64)) for n in range(options['users'])))
+        finally:
+            await connector.close()
+        return stats, time.perf_counter() - started
+
+    async def catalogue(self, session, base_url):
+        """Item ids to browse and a payment method id, read once before the run."""
+        try:
+            async with session.get(f'{base_url}/api/items/?available=true') as response:
+                items = await response.json()
+            async with session.get(f'{base_url}/api/payment-methods/') as response:
+                methods = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc:
+            raise CommandError(f'Could not read the catalogue from {base_url}: {exc}')
+        items = items.get('results', items) if isinstance(items, dict) else items
+        methods = methods.get('results', methods) if isinstance(methods, dict) else methods
+        if not items:
+            raise CommandError('The target has no available items; run populate_data there first.')
+        return [item['item_id'] for item in items], (methods[0]['id'] if methods else None)
+
+    def print_report(self, rows, stats, elapsed, options):
+        total = sum(row['requests'] for row in rows)
+        errors = sum(row['errors'] for row in rows)
+        self.stdout.write(
+            f'\n{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s, '
+            f'{errors} errors ({errors / total:.1%})' if total else '\nNo requests completed.'
+        )
+        self.stdout.write('Journeys completed: ' + ', '.join(
+            f'{name} {stats.journeys[name]}' for name in (options['journeys'] or sorted(JOURNEYS))
+        ))
+        header = f'{"step":<18}{"reqs":>7}{"req/s":>8}{"err%":>7}' + ''.join(f'{"p" + str(p):>9}' for p in PERCENTILES) + f'{"max":>9}'
+        self.stdout.write('\n' + header + '   (latencies in ms)')
+        for row in rows:
+            line = (f"{row['step']:<18}{row['requests']:>7}{row['rps']:>8.1f}{row['error_rate']:>7.1%}"
+                    + ''.join(f"{row[f'p{p}_ms']:>9.1f}" for p in PERCENTILES) + f"{row['max_ms']:>9.1f}")
+            self.stdout.write(self.style.ERROR(line) if row['errors'] else line)
+            failures = {outcome: count for outcome, count in row['statuses'].items() if outcome not in ('200', '201')}
+            if failures:
+                self.stdout.write(f"{'':<18}failures: " + ', '.join(f'{outcome} x{count}' for outcome, count in failures.items()))
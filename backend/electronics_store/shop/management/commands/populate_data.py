@@ -1,13 +1,38 @@
+import time
+
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.contrib.auth import get_user_model
 # Ensure all necessary models are imported
 from shop.models import ItemCategory, Item, PaymentMethod, ShoppingCart, CartItem, Order, OrderItem, Payment, PaymentHistory, Invoice, Receipt
+from shop.snapshots import SnapshotError, create_snapshot, restore_snapshot, snapshot_exists
 
 class Command(BaseCommand):
     help = 'Populates the database with sample data for ItemCategories, Items, Users, and PaymentMethods.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', metavar='NAME',
+                            help='Restore this database snapshot if it exists; otherwise populate and save it under NAME.')
+        parser.add_argument('--rebuild', action='store_true', help='With --snapshot: populate again and replace the snapshot.')
+
     def handle(self, *args, **options):
+        snapshot = options['snapshot']
+        try:
+            if snapshot and not options['rebuild'] and snapshot_exists(snapshot):
+                started = time.perf_counter()
+                restore_snapshot(snapshot)
+                self.stdout.write(self.style.SUCCESS(
+                    f"Restored snapshot '{snapshot}' in {(time.perf_counter() - started) * 1000:.0f} ms."
+                ))
+                return
+            self.populate()
+            if snapshot:
+                create_snapshot(snapshot)
+                self.stdout.write(self.style.SUCCESS(f"Saved snapshot '{snapshot}'."))
+        except SnapshotError as exc:
+            raise CommandError(str(exc))
+
+    def populate(self):
         self.stdout.write(self.style.SUCCESS('Starting database population...'))
 
         # Ensure we have a User model accessible
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop.pricing import DEFAULT_BATCH_SIZE, reprice_flagged_carts
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the price snapshots of carts flagged after Item price changes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Carts repriced per transaction.')
+
+    def handle(self, *args, **options):
+        repriced = reprice_flagged_carts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Repriced {repriced} carts.'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import SlowQuery
+from shop.slow_queries import suggest_indexes, top_offenders
+
+
+class Command(BaseCommand):
+    help = ('Lists the slowest captured SQL statements (see SLOW_QUERY_MS) with the code that ran them, '
+            'the large shop tables they scan sequentially and the indexes that would avoid it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--order', choices=['total_ms', 'count', 'max_ms'], default='total_ms',
+                            help='Rank by total time (default), executions or worst single run.')
+        parser.add_argument('--plans', action='store_true', help='Print the stored EXPLAIN output.')
+        parser.add_argument('--reset', action='store_true', help='Delete all captured statements afterwards.')
+
+    def handle(self, *args, **options):
+        offenders = list(top_offenders(options['order'], options['limit']))
+        if not offenders:
+            self.stdout.write(self.style.SUCCESS('No slow queries captured.'))
+        for rank, query in enumerate(offenders, 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{rank}. {query.total_ms:.0f} ms total, {query.count} runs, '
+                f'avg {query.total_ms / query.count:.1f} ms, max {query.max_ms:.1f} ms'
+            ))
+            self.stdout.write(f'   at   {query.call_site or "(outside shop code)"} [{query.view}]')
+            self.stdout.write(f'   sql  {query.sql[:400]}{"..." if len(query.sql) > 400 else ""}')
+            if query.seq_scan_tables:
+                self.stdout.write(self.style.WARNING(f'   sequential scan of {", ".join(query.seq_scan_tables)}'))
+            for suggestion in suggest_indexes(query, using=query.database):
+                self.stdout.write(self.style.SUCCESS(f'   try  {suggestion}'))
+            if options['plans'] and query.plan:
+                self.stdout.write('   plan ' + query.plan.replace('\n', '\n        '))
+        if options['reset']:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} captured statements.'))
@@ -0,0 +1,225 @@
+"""
+Incremental analytics rollups for PerformanceMetric.
+
+Each source reads only the rows added since its ProcessingWatermark, aggregates them
+per time bucket inside the database and folds the result into the existing rollup rows.
+Dashboards then read PerformanceMetric only and never aggregate the live order tables.
+
+Primary keys are handed out at INSERT but become visible at COMMIT, so a row can appear
+below a key that was already folded. Sources therefore only read rows older than
+SETTLE_TIME: any transaction that started before then has committed (or rolled back).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DurationField, Exists, ExpressionWrapper, F, Max, OuterRef, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import Item, Order, OrderStatusTransition, PerformanceMetric, ProcessingWatermark, Receipt
+
+SETTLE_TIME = timedelta(minutes=5) # Longer than any checkout or fulfilment transaction
+BUCKET_FUNCTIONS = {
+    'hour': TruncHour,
+    'day': TruncDay,
+}
+
+
+class IncrementalSumSource:
+    """
+    Sums a column of an append-only table into per-bucket rollups.
+    Rows are processed in primary-key ranges of batch_size past the watermark, up to the
+    newest row whose created_field is older than SETTLE_TIME.
+    """
+    metric_type = None
+    model = None
+    date_field = None # Buckets rows by this field
+    created_field = None # When the row was written; defaults to date_field
+    value_field = None
+    average = False # Store the mean per row instead of the sum
+    sign = 1 # -1 takes the rows back out of the rollup
+
+    def bucket_value(self, total):
+        return total or Decimal('0')
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def watermark_name(self, granularity):
+        return f"metrics:{self.metric_type}:{granularity}"
+
+    def settled_rows(self):
+        return self.model.objects.filter(**{f'{self.created_field or self.date_field}__lte': timezone.now() - SETTLE_TIME})
+
+    def run(self, granularity, batch_size):
+        pk_name = self.model._meta.pk.name
+        watermark, _ = ProcessingWatermark.objects.get_or_create(name=self.watermark_name(granularity))
+        upper_bound = self.settled_rows().filter(pk__gt=watermark.last_id).aggregate(upper=Max(pk_name))['upper']
+        if upper_bound is None:
+            return 0
+
+        processed = 0
+        low = watermark.last_id
+        while low < upper_bound:
+            high = min(low + batch_size, upper_bound)
+            buckets = (
+                self.get_queryset()
+                .filter(pk__gt=low, pk__lte=high)
+                .annotate(bucket=BUCKET_FUNCTIONS[granularity](self.date_field))
+                .values('bucket')
+                .annotate(total=Sum(self.value_field), rows=Count(pk_name))
+            )
+            with transaction.atomic():
+                processed += abs(fold_into_rollups(
+                    self.metric_type, granularity,
+                    {row['bucket']: (self.sign * self.bucket_value(row['total']), self.sign * row['rows']) for row in buckets},
+                    average=self.average,
+                ))
+                ProcessingWatermark.objects.filter(pk=watermark.pk).update(last_id=high)
+            low = high
+        return processed
+
+
+class SalesSource(IncrementalSumSource):
+    """
+    Sales volume: order totals by order_date (orders are append-only, keyed by order_id).
+    Cancelled orders are counted here and taken back out by CancelledSalesSource once their
+    cancellation is logged, so the rollup never depends on when an order was read. Orders
+    cancelled before the fulfilment log existed have no such row and are left out here.
+    """
+    metric_type = 'sales'
+    model = Order
+    date_field = 'order_date'
+    value_field = 'total_amount'
+
+    def get_queryset(self):
+        logged_cancellation = OrderStatusTransition.objects.filter(order=OuterRef('pk'), to_status='cancelled')
+        return Order.objects.exclude(Q(status='cancelled') & ~Exists(logged_cancellation))
+
+
+class CancelledSalesSource(IncrementalSumSource):
+    """Subtracts cancelled orders from the sales bucket of their order_date, fed by the cancellation log."""
+    metric_type = 'sales'
+    model = OrderStatusTransition
+    date_field = 'order__order_date'
+    created_field = 'changed_at'
+    value_field = 'order__total_amount'
+    sign = -1
+
+    def watermark_name(self, granularity):
+        return f"metrics:sales_cancelled:{granularity}"
+
+    def get_queryset(self):
+        return OrderStatusTransition.objects.filter(to_status='cancelled')
+
+
+class ProfitabilitySource(IncrementalSumSource):
+    """
+    Realised revenue from completed payments. The catalogue stores no cost price, so this
+    is gross rather than net profit. A Receipt is issued exactly when initiate_payment
+    completes a Payment, which makes receipts an append-only feed of completed payments.
+    """
+    metric_type = 'profitability'
+    model = Receipt
+    date_field = 'receipt_date'
+    value_field = 'total_amount'
+
+
+class FulfilmentTimeSource(IncrementalSumSource):
+    """
+    Mean hours from placing an order to its delivery, bucketed by delivery time. The
+    'delivered' rows of the append-only OrderStatusTransition log are the feed.
+    """
+    metric_type = 'order_fulfillment_time'
+    model = OrderStatusTransition
+    date_field = 'changed_at'
+    value_field = 'fulfilment_time'
+    average = True
+
+    def get_queryset(self):
+        return OrderStatusTransition.objects.filter(to_status='delivered').annotate(
+            fulfilment_time=ExpressionWrapper(F('changed_at') - F('order__order_date'), output_field=DurationField())
+        )
+
+    def bucket_value(self, total):
+        return Decimal(str(round(total.total_seconds() / 3600, 2))) if total else Decimal('0')
+
+
+def fold_into_rollups(metric_type, granularity, bucket_totals, average=False):
+    """
+    Adds {bucket_start: (value, sample_count)} onto the stored rollups with one read and one upsert.
+    With average=True, value is a sum over sample_count rows and the stored value is a running mean.
+    """
+    if not bucket_totals:
+        return 0
+    existing = {
+        metric.bucket_start: metric
+        for metric in PerformanceMetric.objects.select_for_update().filter(
+            metric_type=metric_type, granularity=granularity, bucket_start__in=list(bucket_totals)
+        )
+    }
+    rollups = []
+    for bucket_start, (value, count) in bucket_totals.items():
+        current = existing.get(bucket_start)
+        previous_value = current.value if current else Decimal('0')
+        previous_count = current.sample_count if current else 0
+        if average:
+            value = ((previous_value * previous_count + value) / (previous_count + count)).quantize(Decimal('0.01'))
+        else:
+            value = previous_value + value
+        rollups.append(PerformanceMetric(
+            metric_type=metric_type,
+            granularity=granularity,
+            bucket_start=bucket_start,
+            value=value,
+            sample_count=previous_count + count,
+        ))
+    PerformanceMetric.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=['metric_type', 'granularity', 'bucket_start'],
+        update_fields=['value', 'sample_count', 'updated_at'],
+    )
+    return sum(count for _, count in bucket_totals.values())
+
+
+def snapshot_stock_level(granularity):
+    """
+    Records units in stock across available items for the current bucket.
+    The catalogue is small compared to the order tables, so this is a point-in-time
+    snapshot that overwrites the bucket rather than an incremental fold.
+    """
+    bucket_start = _truncate(timezone.now(), granularity)
+    totals = Item.objects.filter(is_available=True).aggregate(units=Sum('quantity_available'), skus=Count('item_id'))
+    PerformanceMetric.objects.update_or_create(
+        metric_type='stock_level', granularity=granularity, bucket_start=bucket_start,
+        defaults={'value': totals['units'] or 0, 'sample_count': totals['skus']},
+    )
+    return totals['skus']
+
+
+def _truncate(moment, granularity):
+    # Matches TruncHour/TruncDay in the (UTC) current time zone
+    moment = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+# customer_satisfaction has no source table in the schema yet, so it is not computed.
+# CancelledSalesSource runs after SalesSource; a cancellation is always logged after its order.
+INCREMENTAL_SOURCES = [SalesSource(), CancelledSalesSource(), ProfitabilitySource(), FulfilmentTimeSource()]
+
+
+def compute_metrics(granularities=('day',), batch_size=5000):
+    """
+    Runs every metric source for the given granularities.
+    Returns {metric_type: rows_processed}.
+    """
+    processed = {}
+    for granularity in granularities:
+        for source in INCREMENTAL_SOURCES:
+            processed[source.metric_type] = processed.get(source.metric_type, 0) + source.run(granularity, batch_size)
+        processed['stock_level'] = snapshot_stock_level(granularity)
+    return processed
@@ -0,0 +1,162 @@
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+
+from .db_routers import pin_to_primary, reset_pin
+from .profiling import profile_request
+from .slow_queries import SlowQueryRecorder
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaPinningMiddleware:
+    """
+    Keeps a client on the primary database for REPLICA_PIN_SECONDS after it writes,
+    so it reads its own cart/order/payment changes instead of a lagging replica.
+    The pin travels in a short-lived cookie holding the expiry timestamp.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        is_write = request.method not in SAFE_METHODS
+        token = pin_to_primary(is_write or self._cookie_pin_active(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_pin(token)
+
+        if is_write and settings.DATABASE_REPLICAS:
+            window = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE_NAME, str(int(time.time() + window)),
+                max_age=window, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def _cookie_pin_active(self, request):
+        try:
+            return float(request.COOKIES[settings.REPLICA_PIN_COOKIE_NAME]) > time.time()
+        except (KeyError, ValueError):
+            return False
+
+
+class LoadSheddingMiddleware:
+    """
+    Rejects requests with 503 once this worker is saturated, cheapest traffic first.
+    Each request gets a priority from settings.LOAD_SHEDDING_PRIORITIES (first matching
+    path pattern wins, otherwise 'browse'), and a priority is shed once the number of
+    requests in flight reaches its share of LOAD_SHEDDING_MAX_IN_FLIGHT
+    (LOAD_SHEDDING_THRESHOLDS). Checkout keeps the whole capacity; browsing gets
+    turned away first. Set LOAD_SHEDDING_MAX_IN_FLIGHT=0 to disable.
+    """
+
+    def __init__(self, get_response):
+        max_in_flight = settings.LOAD_SHEDDING_MAX_IN_FLIGHT
+        if not max_in_flight:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.priorities = [(re.compile(pattern), priority) for pattern, priority in settings.LOAD_SHEDDING_PRIORITIES]
+        self.limits = {
+            priority: max(1, int(max_in_flight * share))
+            for priority, share in settings.LOAD_SHEDDING_THRESHOLDS.items()
+        }
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def priority_for(self, path):
+        for pattern, priority in self.priorities:
+            if pattern.match(path):
+                return priority
+        return 'browse'
+
+    def __call__(self, request):
+        limit = self.limits[self.priority_for(request.path)]
+        with self.lock:
+            if self.in_flight >= limit:
+                admitted = False
+            else:
+                admitted = True
+                self.in_flight += 1
+        if not admitted:
+            response = JsonResponse({"detail": "Server is busy, please retry shortly."}, status=503)
+            response['Retry-After'] = str(settings.LOAD_SHEDDING_RETRY_AFTER)
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request (see shop/profiling.py) when a staff user sends PROFILING_HEADER or
+    PROFILING_QUERY_PARAM, or when it is picked by PROFILING_SAMPLE_RATE. Place it after
+    AuthenticationMiddleware. Removed at startup unless PROFILING_ENABLED is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILING_HEADER.upper().replace('-', '_')
+
+    def __call__(self, request):
+        trigger = self.trigger_for(request)
+        if trigger is None:
+            return self.get_response(request)
+        return profile_request(self.get_response, request, trigger)
+
+    def trigger_for(self, request):
+        if not request.path.startswith(settings.PROFILING_PATH_PREFIX):
+            return None
+        asked = request.META.get(self.header) or request.GET.get(settings.PROFILING_QUERY_PARAM)
+        if asked and request.user.is_staff:
+            return 'staff'
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return 'sample'
+        return None
+
+
+class SlowQueryMiddleware:
+    """
+    Records statements slower than SLOW_QUERY_MS on every database alias and stores them
+    (see shop/slow_queries.py) before the response is returned. Only requests that already
+    ran a slow statement pay for the upsert, and the EXPLAIN runs for new statements and a
+    SLOW_QUERY_EXPLAIN_RATE sample of repeats. A failure to store them is logged, never
+    raised into the response. Removed at startup when SLOW_QUERY_MS is 0.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_MS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorders = [SlowQueryRecorder(alias) for alias in connections]
+        with ExitStack() as stack:
+            for recorder in recorders:
+                stack.enter_context(connections[recorder.alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        for recorder in recorders:
+            if not recorder.captured:
+                continue
+            recorder.view = (match.view_name if match else request.path)[:255]
+            try:
+                recorder.flush()
+            except Exception:
+                logger.exception('Could not store slow queries captured on %s', recorder.alias)
+        return response
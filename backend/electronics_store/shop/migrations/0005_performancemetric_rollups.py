@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_item_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='performancemetric',
+            name='bucket_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='performancemetric',
+            name='granularity',
+            field=models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], default='day', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='performancemetric',
+            name='sample_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancemetric',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddConstraint(
+            model_name='performancemetric',
+            constraint=models.UniqueConstraint(fields=('metric_type', 'granularity', 'bucket_start'), name='unique_metric_bucket'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_performancemetric_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemCoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_purchases', to='shop.item')),
+                ('related_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', '-order_count'], name='co_purchase_top_k_idx')],
+                'constraints': [models.UniqueConstraint(fields=('item', 'related_item'), name='unique_co_purchase_pair')],
+            },
+        ),
+    ]
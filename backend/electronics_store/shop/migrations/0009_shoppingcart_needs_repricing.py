@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_shoppingcart_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='needs_repricing',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(condition=models.Q(('needs_repricing', True)), fields=['id'], name='cart_needs_repricing_idx'),
+        ),
+    ]
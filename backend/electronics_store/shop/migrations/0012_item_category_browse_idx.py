@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_item_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['item_type', 'is_available', 'item_name', 'item_id'], name='item_category_browse_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_item_category_browse_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='item_type',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='items', to='shop.itemcategory'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['item_name', 'item_id'], name='item_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['item_name', 'item_id'], include=('unit_price', 'quantity_available', 'image_url'), name='item_available_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_available', True), ('is_featured', True)), fields=['item_name', 'item_id'], name='item_featured_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['unit_price', 'item_id'], name='item_available_price_idx'),
+        ),
+    ]
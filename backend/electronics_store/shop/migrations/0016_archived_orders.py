@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:41
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_slow_queries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('order_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('customer_email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('session_key', models.CharField(blank=True, max_length=40, null=True)),
+                ('order_date', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('paid', 'Paid')], max_length=20)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('document', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-order_date'],
+                'indexes': [models.Index(fields=['customer', '-order_date'], name='archived_customer_date_idx'), models.Index(fields=['session_key', '-order_date'], name='archived_session_date_idx')],
+            },
+        ),
+    ]
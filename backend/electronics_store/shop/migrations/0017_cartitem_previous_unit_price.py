@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_archived_orders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='previous_unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
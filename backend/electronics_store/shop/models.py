@@ -1,4 +1,10 @@
-from django.db import models
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser # Import AbstractUser
 
 # --- Custom User Model ---
@@ -48,15 +54,56 @@ class Item(models.Model):
     item_name = models.CharField(max_length=200)
     item_short_description = models.CharField(max_length=500, blank=True, null=True)
     item_long_description = models.TextField(blank=True, null=True)
-    item_type = models.ForeignKey(ItemCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='items')
+    # No separate FK index: item_category_browse_idx leads with item_type
+    item_type = models.ForeignKey(ItemCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='items', db_index=False)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity_available = models.IntegerField(default=0)
     is_available = models.BooleanField(default=True)
     image_url = models.URLField(max_length=500, blank=True, null=True) # URL to product image
+    # Resized local copies of image_url, written by ingest_item_images (see shop/images.py)
+    image_variants = models.JSONField(blank=True, null=True, editable=False)
     is_featured = models.BooleanField(default=False)
+    # Bumped on every write so bulk stockroom updates can detect concurrent edits
+    version = models.PositiveIntegerField(default=1)
 
     class Meta:
         ordering = ['item_name']
+        indexes = [
+            # Category pages: available items of one category in name order (keyset-paginated)
+            models.Index(fields=['item_type', 'is_available', 'item_name', 'item_id'], name='item_category_browse_idx'),
+            # Full catalogue in Meta.ordering
+            models.Index(fields=['item_name', 'item_id'], name='item_name_idx'),
+            # Shop page (?available=true): partial, and covering the card columns for index-only scans
+            models.Index(
+                fields=['item_name', 'item_id'], name='item_available_name_idx',
+                condition=models.Q(is_available=True), include=['unit_price', 'quantity_available', 'image_url'],
+            ),
+            # Home page featured strip: a handful of rows, so a tiny partial index
+            models.Index(
+                fields=['item_name', 'item_id'], name='item_featured_name_idx',
+                condition=models.Q(is_featured=True, is_available=True),
+            ),
+            # ?ordering=price / -price (scanned backwards for descending)
+            models.Index(
+                fields=['unit_price', 'item_id'], name='item_available_price_idx',
+                condition=models.Q(is_available=True),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_unit_price = instance.unit_price if 'unit_price' in field_names else None
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version = (self.version or 0) + 1
+        # Read by the post_save receiver that flags carts holding this item for repricing
+        saved_price = getattr(self, '_saved_unit_price', None)
+        self._price_changed = saved_price is not None and saved_price != self.unit_price
+        super().save(*args, **kwargs)
+        self._saved_unit_price = self.unit_price
 
     def __str__(self):
         return self.item_name
@@ -73,10 +120,49 @@ class ShoppingCart(models.Model):
     session_key = models.CharField(max_length=40, unique=True, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalised from CartItem so badges/summaries never need the join; maintained by CartItem
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    version = models.PositiveIntegerField(default=0) # Bumped on every change to the cart's lines
+    # Set when an Item in the cart changes price; cleared once the line snapshots are repriced
+    needs_repricing = models.BooleanField(default=False)
 
     class Meta:
         verbose_name = "Shopping Cart"
         verbose_name_plural = "Shopping Carts"
+        indexes = [
+            # Lets the repricing job find flagged carts without scanning every cart
+            models.Index(fields=['id'], condition=models.Q(needs_repricing=True), name='cart_needs_repricing_idx'),
+        ]
+
+    @classmethod
+    def apply_line_change(cls, cart_id, quantity_delta, amount_delta):
+        """
+        Folds a CartItem change into the cart totals with a single UPDATE.
+        """
+        cls.objects.filter(pk=cart_id).update(
+            item_count=F('item_count') + quantity_delta,
+            subtotal=F('subtotal') + amount_delta,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def recalculate_totals(cls, cart_ids):
+        """
+        Recomputes the totals of the given carts from their CartItems in one UPDATE.
+        Used for backfills and after set-based changes to CartItem rows.
+        """
+        lines = CartItem.objects.filter(cart=models.OuterRef('pk')).order_by().values('cart')
+        cls.objects.filter(pk__in=cart_ids).update(
+            item_count=Coalesce(models.Subquery(lines.annotate(total=Sum('quantity')).values('total')), 0),
+            subtotal=Coalesce(
+                models.Subquery(lines.annotate(total=Sum(F('quantity') * F('unit_price'))).values('total')),
+                Decimal('0.00'), output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
 
     def __str__(self):
         if self.customer:
@@ -97,15 +183,35 @@ class CartItem(models.Model):
     # Store unit price at the time of adding to cart for historical accuracy
     # Added default=0.00 to allow migrations to proceed for existing data
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # The snapshot before the first repricing, so checkout can still report the change (shop.pricing)
+    previous_unit_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
 
     class Meta:
         unique_together = ('cart', 'item') # An item can only be once in a given cart
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this line contributed to the cart totals when it was loaded
+        instance._saved_line = (instance.quantity, instance.unit_price) if {'quantity', 'unit_price'} <= set(field_names) else None
+        return instance
+
     def save(self, *args, **kwargs):
         # Set unit_price from the Item if not already set (or if it's the default 0.00)
         if (self.unit_price is None or self.unit_price == 0.00) and self.item:
             self.unit_price = self.item.unit_price
-        super().save(*args, **kwargs)
+        previous = (0, Decimal('0.00')) if self._state.adding else getattr(self, '_saved_line', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous is None:
+                ShoppingCart.recalculate_totals([self.cart_id])
+            else:
+                ShoppingCart.apply_line_change(
+                    self.cart_id,
+                    quantity_delta=self.quantity - previous[0],
+                    amount_delta=self.quantity * Decimal(str(self.unit_price)) - previous[0] * Decimal(str(previous[1])),
+                )
+        self._saved_line = (self.quantity, self.unit_price)
 
     def __str__(self):
         return f"{self.quantity} x {self.item.item_name} in Cart {self.cart.id}"
@@ -132,10 +238,15 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     delivery_address = models.TextField(blank=True, null=True) # Final delivery address for the order
-    session_key = models.CharField(max_length=40, blank=True, null=True, db_index=True)
+    session_key = models.CharField(max_length=40, blank=True, null=True)
 
     class Meta:
         ordering = ['-order_date']
+        indexes = [
+            # Order history lookups: WHERE customer/session_key = ? ORDER BY order_date DESC
+            models.Index(fields=['customer', '-order_date'], name='order_customer_date_idx'),
+            models.Index(fields=['session_key', '-order_date'], name='order_session_date_idx'),
+        ]
 
     def __str__(self):
         if self.customer:
@@ -165,6 +276,48 @@ class OrderItem(models.Model):
         return f"{self.quantity} x {self.item.item_name} in Order {self.order.order_id}"
 
 
+class OrderStatusTransition(models.Model):
+    """
+    One step of an order through the fulfilment state machine (shop.fulfilment).
+    Append-only; from_status is null for the row written when the order is placed.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_transitions')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, blank=True, null=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'changed_at'], name='order_transition_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status or '-'} -> {self.to_status}"
+
+
+class ItemCoPurchase(models.Model):
+    """
+    One non-zero cell of the item-item co-purchase matrix: the number of orders
+    that contained both items. Each pair is stored in both directions so an item's
+    top neighbours are a single index range scan on (item, -order_count).
+    """
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='co_purchases')
+    related_item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='+')
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'related_item'], name='unique_co_purchase_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['item', '-order_count'], name='co_purchase_top_k_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id} -> {self.related_item_id} ({self.order_count})"
+
+
 class PaymentMethod(models.Model):
     """
     Represents available payment methods (e.g., Credit Card, PayPal).
@@ -260,9 +413,115 @@ class PerformanceMetric(models.Model):
         ('order_fulfillment_time', 'Order Fulfillment Time'),
     )
 
+    GRANULARITY_CHOICES = (
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    )
+
     metric_type = models.CharField(max_length=50, choices=METRIC_TYPE_CHOICES)
     value = models.DecimalField(max_digits=15, decimal_places=2)
     calculated_at = models.DateTimeField(auto_now_add=True)
+    # Rollup bucket this row summarises (null for legacy, manually entered metrics)
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES, default='day')
+    bucket_start = models.DateTimeField(blank=True, null=True)
+    # Number of source rows folded into value, so averages can be extended incrementally
+    sample_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric_type', 'granularity', 'bucket_start'], name='unique_metric_bucket'),
+        ]
 
     def __str__(self):
         return f"{self.metric_type}: {self.value} at {self.calculated_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a write request sent with an Idempotency-Key header, kept until expires_at
+    so retries get the original response instead of re-running the workflow.
+    """
+    key = models.CharField(max_length=255)
+    owner = models.CharField(max_length=64) # 'user:<id>' or 'session:<session_key>'
+    fingerprint = models.CharField(max_length=64) # SHA-256 of method, path and body
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True) # Null while the first request is in flight
+    response_body = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'key'], name='unique_idempotency_key_per_owner'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} {self.key} ({self.response_status or 'in progress'})"
+
+
+class ProcessingWatermark(models.Model):
+    """
+    Remembers the last source row id an incremental background job has processed,
+    so each run only reads rows added since the previous one.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+
+class SlowQuery(models.Model):
+    """
+    Statements slower than SLOW_QUERY_MS, aggregated per normalised SQL and calling code
+    (see shop/slow_queries.py). plan and seq_scan_tables come from a sampled EXPLAIN.
+    """
+    fingerprint = models.CharField(max_length=40)
+    call_site = models.CharField(max_length=255, blank=True) # 'shop/views.py:239 highest_selling'
+    database = models.CharField(max_length=50, default='default')
+    view = models.CharField(max_length=255, blank=True) # URL name of the last request that ran it
+    sql = models.TextField()
+    count = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    plan = models.TextField(blank=True)
+    seq_scan_tables = models.JSONField(default=list, blank=True)
+    explained_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fingerprint', 'call_site'], name='unique_slow_query_site'),
+        ]
+
+    def __str__(self):
+        return f"{self.call_site or self.fingerprint[:12]}: {self.count} x, {self.total_ms:.0f} ms"
+
+
+class ArchivedOrder(models.Model):
+    """
+    A delivered or cancelled order moved out of the hot tables by shop.archival, with its
+    lines, payment, payment history, invoice, receipt and status history kept in document.
+    The owner columns mirror Order so the same ownership filters apply.
+    """
+    order_id = models.IntegerField(primary_key=True) # The original Order id; ids are never reused
+    customer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    customer_email = models.EmailField(blank=True, null=True)
+    session_key = models.CharField(max_length=40, blank=True, null=True)
+    order_date = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    archived_at = models.DateTimeField(default=timezone.now)
+    document = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        ordering = ['-order_date']
+        indexes = [
+            models.Index(fields=['customer', '-order_date'], name='archived_customer_date_idx'),
+            models.Index(fields=['session_key', '-order_date'], name='archived_session_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.order_id} ({self.status})"
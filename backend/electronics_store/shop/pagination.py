@@ -0,0 +1,25 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OrderHistoryPagination(CursorPagination):
+    """
+    Keyset pagination for order history. Pages are fetched with
+    WHERE order_date < <cursor> ORDER BY order_date DESC LIMIT n, which the
+    (customer, order_date) and (session_key, order_date) indexes answer directly,
+    so deep pages cost the same as the first one.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-order_date', '-order_id')
+
+
+class CategoryItemsPagination(CursorPagination):
+    """
+    Keyset pagination for /api/categories/<id>/items/, walking the
+    (item_type, is_available, item_name, item_id) index in order.
+    """
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('item_name', 'item_id')
@@ -0,0 +1,82 @@
+"""
+Cart price snapshots.
+
+CartItem.unit_price is the price the customer saw when adding the item. When an Item is
+repriced, the carts holding it are flagged through the CartItem.item index (item -> carts)
+and their snapshots are refreshed in set-based batches, never by scanning every cart line.
+Repricing keeps the snapshot it replaced in previous_unit_price, so the change is still
+reported at checkout however early the cart was repriced.
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import CartItem, Item, ShoppingCart
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def flag_carts_for_items(item_ids):
+    """
+    Marks every cart containing one of the items as needing repricing (one UPDATE).
+    """
+    if not item_ids:
+        return 0
+    return ShoppingCart.objects.filter(
+        needs_repricing=False, items__item_id__in=item_ids
+    ).update(needs_repricing=True)
+
+
+def price_changes(cart):
+    """
+    Lines whose price when added (before any repricing) differs from the current Item price,
+    in a single query.
+    """
+    return [
+        {
+            'item_id': line['item_id'],
+            'item_name': line['item__item_name'],
+            'quantity': line['quantity'],
+            'old_unit_price': f"{line['seen_price']:.2f}",
+            'new_unit_price': f"{line['item__unit_price']:.2f}",
+        }
+        for line in CartItem.objects.filter(cart=cart)
+        .annotate(seen_price=Coalesce('previous_unit_price', 'unit_price'))
+        .exclude(seen_price=F('item__unit_price'))
+        .order_by('item_id')
+        .values('item_id', 'item__item_name', 'quantity', 'seen_price', 'item__unit_price')
+    ]
+
+
+def reprice_carts(cart_ids):
+    """
+    Refreshes the line snapshots and totals of the given carts and clears their flag.
+    Three statements regardless of how many carts or lines are involved.
+    """
+    if not cart_ids:
+        return
+    current_price = Item.objects.filter(item_id=OuterRef('item_id')).values('unit_price')[:1]
+    with transaction.atomic():
+        CartItem.objects.filter(cart_id__in=cart_ids).exclude(
+            unit_price=F('item__unit_price')
+        ).update(
+            previous_unit_price=Coalesce(F('previous_unit_price'), F('unit_price')),
+            unit_price=Subquery(current_price),
+        )
+        ShoppingCart.recalculate_totals(cart_ids)
+        ShoppingCart.objects.filter(pk__in=cart_ids).update(needs_repricing=False)
+
+
+def reprice_flagged_carts(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Works through flagged carts in batches. Returns the number of carts repriced.
+    """
+    repriced = 0
+    while True:
+        cart_ids = list(
+            ShoppingCart.objects.filter(needs_repricing=True).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not cart_ids:
+            return repriced
+        reprice_carts(cart_ids)
+        repriced += len(cart_ids)
@@ -0,0 +1,121 @@
+"""
+Cached user profiles for the current_user / me-summary polling endpoints.
+
+Entries are keyed by (user_id, profile version). Saving a user bumps the version
+(see signals.py), so stale entries are never read again and simply age out. With
+the cached_db session engine, a warm request resolves session -> user id -> profile
+without touching the database.
+
+A version bump only reaches the workers that share the cache, so profiles are only cached
+in a shared backend (Redis via REDIS_URL). With the per-process LocMem cache every
+request reads the user row, and `check` warns about it outside DEBUG.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY, get_user, get_user_model
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.crypto import constant_time_compare
+
+from .serializers import UserSerializer
+
+PROFILE_TIMEOUT = 60 * 60
+
+
+def caching_enabled():
+    """False for caches private to one process, where other workers would never see a bump."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.DEBUG or caching_enabled():
+        return []
+    return [checks.Warning(
+        'The default cache is per-process LocMem, so user profiles are not cached '
+        'and category facets are only cached briefly.',
+        hint='Set REDIS_URL so workers share the cache and see profile and facet invalidations.',
+        id='shop.W001',
+    )]
+
+
+def _version_key(user_id):
+    return f'user-profile-version:{user_id}'
+
+
+def profile_version(user_id):
+    """
+    The version only has to change on every save, so a timestamp works; a fresh one is
+    also picked if the version entry itself was evicted, which orphans any older profile.
+    """
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), time.time_ns(), None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def bump_profile_version(user_id):
+    cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def build_profile(user):
+    return {
+        'profile': dict(UserSerializer(user).data),
+        'summary': {
+            'is_authenticated': True,
+            'id': user.pk,
+            'username': user.username,
+            'first_name': user.first_name,
+            'user_type': user.user_type,
+            'is_staff': user.is_staff,
+        },
+        'is_active': user.is_active,
+        'session_hash': user.get_session_auth_hash(),
+    }
+
+
+def cached_profile(user_id, user=None):
+    """
+    Returns the cached profile of a user, building it from `user` (or one SELECT) on a miss.
+    Returns None if the user no longer exists.
+    """
+    if not caching_enabled():
+        if user is None:
+            user = get_user_model().objects.filter(pk=user_id).first()
+        return build_profile(user) if user is not None else None
+    key = f'user-profile:{user_id}:{profile_version(user_id)}'
+    profile = cache.get(key)
+    if profile is None:
+        if user is None:
+            user = get_user_model().objects.filter(pk=user_id).first()
+            if user is None:
+                return None
+        profile = build_profile(user)
+        cache.set(key, profile, PROFILE_TIMEOUT)
+    return profile
+
+
+def profile_for_request(request):
+    """
+    Profile of the user logged into the request's session, or None for anonymous clients.
+    Performs the same checks as django.contrib.auth.get_user (active user, session hash
+    matching the current password) against the cached copy; when they fail, Django's own
+    get_user decides and flushes the session if it is really stale.
+    """
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is None:
+        return None
+    profile = cached_profile(user_id)
+    if profile is not None and profile['is_active'] and constant_time_compare(
+        request.session.get(HASH_SESSION_KEY, ''), profile['session_hash']
+    ):
+        return profile
+
+    user = get_user(request)
+    if not user.is_authenticated:
+        return None
+    bump_profile_version(user.pk)
+    return cached_profile(user.pk, user=user)
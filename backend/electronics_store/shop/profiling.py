@@ -0,0 +1,148 @@
+"""
+On-demand request profiling.
+
+shop.middleware.ProfilingMiddleware profiles a request when a staff user asks for it
+(PROFILING_HEADER header or PROFILING_QUERY_PARAM query flag) or when it is picked by
+PROFILING_SAMPLE_RATE. A profiled request gets a cProfile of the view plus a timeline of every SQL statement it
+ran. Both are written to PROFILING_DIR as <id>.prof (pstats, e.g. for snakeviz) and
+<id>.json (request details, SQL timeline and the top functions), and the id is returned
+in the X-Profile-Id response header.
+
+With PROFILING_ENABLED off the middleware removes itself at startup, so it costs nothing.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+PROFILE_ID = re.compile(r'^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$')
+TOP_FUNCTIONS = 30
+
+# cProfile cannot run two profilers at once, so concurrent requests are not profiled
+_profiler_lock = threading.Lock()
+
+
+class SQLTimeline:
+    """execute_wrapper that records when each statement started and how long it took."""
+
+    def __init__(self, alias, started):
+        self.alias = alias
+        self.started = started
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.queries.append({
+                'alias': self.alias,
+                'start_ms': round((start - self.started) * 1000, 3),
+                'duration_ms': round((end - start) * 1000, 3),
+                'sql': sql,
+                'many': many,
+            })
+
+
+def profile_request(get_response, request, trigger):
+    """
+    Runs the request under cProfile with an SQL timeline on every database alias, stores the
+    result and tags the response with X-Profile-Id. Returns the response unprofiled if another
+    request in this process is already being profiled.
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        return get_response(request)
+    try:
+        started = time.perf_counter()
+        timelines = [SQLTimeline(alias, started) for alias in connections]
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for timeline in timelines:
+                stack.enter_context(connections[timeline.alias].execute_wrapper(timeline))
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - started
+    finally:
+        _profiler_lock.release()
+
+    queries = sorted((query for timeline in timelines for query in timeline.queries), key=lambda q: q['start_ms'])
+    profile_id = save_profile(profiler, {
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'trigger': trigger,
+        'user': request.user.get_username() if request.user.is_authenticated else None,
+        'duration_ms': round(duration * 1000, 3),
+        'sql_count': len(queries),
+        'sql_ms': round(sum(query['duration_ms'] for query in queries), 3),
+        'sql': queries,
+    })
+    response['X-Profile-Id'] = profile_id
+    return response
+
+
+def profile_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def save_profile(profiler, details):
+    """Writes <id>.prof and <id>.json, prunes the oldest beyond PROFILING_MAX_FILES and returns the id."""
+    now = timezone.now()
+    profile_id = f"{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(directory / f'{profile_id}.prof')
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    details = {'id': profile_id, 'created_at': now.isoformat(), **details, 'top_functions': summary.getvalue()}
+    (directory / f'{profile_id}.json').write_text(json.dumps(details, indent=1, default=str))
+    prune(directory)
+    return profile_id
+
+
+def prune(directory):
+    reports = sorted(directory.glob('*.json'))
+    for stale in reports[:max(0, len(reports) - settings.PROFILING_MAX_FILES)]:
+        for path in (stale, stale.with_suffix('.prof')):
+            try:
+                os.remove(path)
+            except FileNotFoundError: # Another worker pruned it first
+                pass
+
+
+def list_profiles():
+    """Newest first, without the SQL timeline and function table."""
+    profiles = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            details = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        details.pop('sql', None)
+        details.pop('top_functions', None)
+        profiles.append(details)
+    return profiles
+
+
+def profile_path(profile_id, kind):
+    """Path of a stored profile file ('json' or 'prof'), or None if it does not exist."""
+    if not PROFILE_ID.match(profile_id) or kind not in ('json', 'prof'):
+        return None
+    path = profile_dir() / f'{profile_id}.{kind}'
+    return path if path.exists() else None
@@ -0,0 +1,135 @@
+"""
+Frequently-bought-together index.
+
+The item-item co-purchase matrix is kept as a sparse table (ItemCoPurchase) and grown
+incrementally from orders placed since the last run, so serving related items is an
+index lookup and never a scan of OrderItem. Like the metric rollups, only orders older than
+SETTLE_TIME are folded, so an order committed after a higher order_id is not skipped.
+
+To keep the table from growing with the square of the catalogue, an order contributes
+pairs for at most MAX_ITEMS_PER_ORDER distinct items, and prune_co_purchases() keeps only
+each item's KEEP_PER_ITEM strongest neighbours. A pruned pair that becomes popular again
+starts counting from zero, so the counts of weak pairs are approximate.
+"""
+from collections import Counter
+from itertools import groupby, permutations
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .metrics import SETTLE_TIME
+from .models import Item, ItemCoPurchase, Order, OrderItem, ProcessingWatermark
+
+WATERMARK_NAME = 'recommendations:co_purchase'
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 50
+MAX_ITEMS_PER_ORDER = 20 # Bulk orders add at most 20 * 19 pairs
+KEEP_PER_ITEM = 2 * MAX_LIMIT # Room for newer pairs to climb past the served top MAX_LIMIT
+
+
+def refresh_co_purchases(batch_size=2000, rebuild=False):
+    """
+    Folds the OrderItem pairs of settled orders newer than the watermark into ItemCoPurchase.
+    Returns the number of orders processed.
+    """
+    with transaction.atomic():
+        watermark, _ = ProcessingWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+        if rebuild:
+            ItemCoPurchase.objects.all().delete()
+            watermark.last_id = 0
+            watermark.save(update_fields=['last_id', 'updated_at'])
+
+    upper_bound = Order.objects.filter(
+        order_id__gt=watermark.last_id, order_date__lte=timezone.now() - SETTLE_TIME,
+    ).aggregate(upper=Max('order_id'))['upper']
+    if upper_bound is None:
+        return 0
+
+    processed = 0
+    low = watermark.last_id
+    while low < upper_bound:
+        high = min(low + batch_size, upper_bound)
+        lines = (
+            OrderItem.objects
+            .filter(order_id__gt=low, order_id__lte=high)
+            .exclude(order__status='cancelled')
+            .order_by('order_id')
+            .values_list('order_id', 'item_id')
+        )
+        pair_counts = Counter()
+        for order_id, order_lines in groupby(lines, key=lambda line: line[0]):
+            processed += 1
+            item_ids = sorted({item_id for _, item_id in order_lines})[:MAX_ITEMS_PER_ORDER]
+            pair_counts.update(permutations(item_ids, 2))
+
+        with transaction.atomic():
+            _increment_pairs(pair_counts)
+            ProcessingWatermark.objects.filter(name=WATERMARK_NAME).update(last_id=high)
+        low = high
+    return processed
+
+
+def _increment_pairs(pair_counts):
+    """
+    Adds the counts onto existing cells in one upsert statement per batch.
+    The ORM's bulk_create(update_conflicts=True) can only overwrite, not increment,
+    so this uses INSERT ... ON CONFLICT directly (PostgreSQL and SQLite share the syntax).
+    """
+    if not pair_counts:
+        return
+    table = connection.ops.quote_name(ItemCoPurchase._meta.db_table)
+    sql = (
+        f"INSERT INTO {table} (item_id, related_item_id, order_count) VALUES (%s, %s, %s) "
+        f"ON CONFLICT (item_id, related_item_id) "
+        f"DO UPDATE SET order_count = {table}.order_count + EXCLUDED.order_count"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(item_id, related_id, count) for (item_id, related_id), count in pair_counts.items()])
+
+
+def prune_co_purchases(keep=KEEP_PER_ITEM):
+    """
+    Deletes every cell outside its item's top `keep` by order_count. Only items with more than
+    `keep` neighbours are ranked. Returns the number of cells deleted.
+    """
+    crowded = (
+        ItemCoPurchase.objects.values('item_id').annotate(cells=Count('id')).filter(cells__gt=keep)
+        .values_list('item_id', flat=True)
+    )
+    pruned = 0
+    for item_id in list(crowded):
+        surplus = list(
+            ItemCoPurchase.objects.filter(item_id=item_id)
+            .annotate(rank=Window(RowNumber(), order_by=[F('order_count').desc(), F('id').asc()]))
+            .filter(rank__gt=keep).values_list('id', flat=True)
+        )
+        pruned += ItemCoPurchase.objects.filter(id__in=surplus).delete()[0]
+    return pruned
+
+
+def related_items(item, limit=DEFAULT_LIMIT, deferred_fields=()):
+    """
+    Returns up to limit (Item, co_purchase_count) tuples: the item's top co-purchased neighbours,
+    topped up with available items from the same category when history is thin.
+    deferred_fields are Item columns left unloaded.
+    """
+    neighbours = [
+        (cell.related_item, cell.order_count)
+        for cell in ItemCoPurchase.objects
+        .filter(item=item, related_item__is_available=True)
+        .select_related('related_item')
+        .defer(*(f'related_item__{name}' for name in deferred_fields))
+        .order_by('-order_count')[:limit]
+    ]
+    if len(neighbours) < limit and item.item_type_id:
+        seen = {related.item_id for related, _ in neighbours} | {item.item_id}
+        neighbours += [
+            (similar, 0)
+            for similar in Item.objects
+            .filter(item_type_id=item.item_type_id, is_available=True)
+            .defer(*deferred_fields)
+            .exclude(item_id__in=seen)[:limit - len(neighbours)]
+        ]
+    return neighbours
@@ -1,22 +1,95 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model # Correct way to get the active user model
-from .models import Item, ShoppingCart, CartItem, Order, OrderItem, Payment, PaymentMethod, Invoice, Receipt, PerformanceMetric, PaymentHistory # PaymentHistory added here
+from .hashing import hash_password
+from .categories import EMPTY_FACETS
+from .images import variant_urls
+from .models import Item, ItemCategory, ShoppingCart, CartItem, Order, OrderItem, Payment, PaymentMethod, Invoice, Receipt, PerformanceMetric, PaymentHistory, OrderStatusTransition # PaymentHistory added here
 
 User = get_user_model()
 
+class OmitFieldsMixin:
+    """
+    Accepts omit=[field names] to leave fields out of the output, e.g. columns a list view
+    deferred (see DeferLargeFieldsMixin in views.py). Applies to each child when many=True.
+    """
+    def __init__(self, *args, omit=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in omit:
+            self.fields.pop(name, None)
+
+
 # --- Catalogue and Items ---
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(OmitFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the Item model (Product Catalogue).
     Handles exposing item details.
     """
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Item
         fields = '__all__' 
+        read_only_fields = ['version'] # Managed by Item.save and the bulk stockroom endpoint
         # Example for specific fields:
         # fields = ['item_id', 'item_name', 'item_short_description', 'item_type',
         #           'unit_price', 'quantity_available', 'is_available', 'image_url']
 
+    def get_image_variants(self, obj):
+        # {'thumb'|'card'|'large': {'width', 'height', 'webp', 'jpeg'}}, or None until ingested
+        return variant_urls(obj)
+
+
+class ItemCategorySerializer(serializers.ModelSerializer):
+    """
+    Category with its facet counts, which the view passes in context['facets'] (see shop/categories.py).
+    """
+    class Meta:
+        model = ItemCategory
+        fields = ['id', 'name', 'description']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(self.context.get('facets', {}).get(instance.pk, EMPTY_FACETS))
+        return data
+
+
+class ItemStockAdjustmentSerializer(serializers.Serializer):
+    """
+    One line of a bulk stockroom update.
+    Stock is changed either by a relative quantity_delta or an absolute quantity,
+    optionally together with a new unit_price.
+    """
+    item_id = serializers.IntegerField()
+    quantity_delta = serializers.IntegerField(required=False)
+    quantity = serializers.IntegerField(required=False, min_value=0)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=0)
+    # Optimistic concurrency: the Item.version the caller last saw (optional)
+    expected_version = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if 'quantity_delta' in attrs and 'quantity' in attrs:
+            raise serializers.ValidationError("Provide either quantity_delta or quantity, not both.")
+        if not any(field in attrs for field in ('quantity_delta', 'quantity', 'unit_price')):
+            raise serializers.ValidationError("Provide quantity_delta, quantity or unit_price.")
+        return attrs
+
+
+class ItemBulkAdjustmentSerializer(serializers.Serializer):
+    """
+    Payload for ItemViewSet.bulk_adjust: {"adjustments": [...]}.
+    """
+    MAX_ADJUSTMENTS = 5000
+
+    adjustments = ItemStockAdjustmentSerializer(many=True, allow_empty=False)
+
+    def validate_adjustments(self, value):
+        if len(value) > self.MAX_ADJUSTMENTS:
+            raise serializers.ValidationError(f"At most {self.MAX_ADJUSTMENTS} adjustments per batch.")
+        item_ids = [adjustment['item_id'] for adjustment in value]
+        if len(item_ids) != len(set(item_ids)):
+            raise serializers.ValidationError("Each item_id may only appear once per batch.")
+        return value
+
 # --- User related (simplified for API, for admin/self-management) ---
 class UserSerializer(serializers.ModelSerializer):
     """
@@ -35,10 +108,10 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        # Custom create method to handle password hashing
+        # Hash first (on the hashing pool), then a single INSERT
         password = validated_data.pop('password')
-        user = User.objects.create(**validated_data)
-        user.set_password(password)
+        user = User(**validated_data)
+        user.password = hash_password(password)
         user.save()
         return user
 
@@ -48,7 +121,7 @@ class UserSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         if password is not None:
-            instance.set_password(password)
+            instance.password = hash_password(password)
         instance.save()
         return instance
 
@@ -83,8 +156,8 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCart
         # Include session_key in fields
-        fields = ['id', 'customer', 'customer_username', 'session_key', 'items', 'created_at', 'updated_at']
-        read_only_fields = ['customer', 'session_key'] # Customer and session_key are set by the view
+        fields = ['id', 'customer', 'customer_username', 'session_key', 'items', 'item_count', 'subtotal', 'version', 'needs_repricing', 'created_at', 'updated_at']
+        read_only_fields = ['customer', 'session_key', 'item_count', 'subtotal', 'version', 'needs_repricing'] # Set by the view / maintained by CartItem
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -131,6 +204,49 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['customer', 'order_date', 'total_amount', 'status', 'items'] # customer can be null, but not directly set by API for creation
 
 
+class OrderStatusTransitionSerializer(serializers.ModelSerializer):
+    changed_by_username = serializers.CharField(source='changed_by.username', read_only=True, default=None)
+
+    class Meta:
+        model = OrderStatusTransition
+        fields = ['from_status', 'to_status', 'changed_at', 'changed_by_username']
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    """
+    Payload for OrderViewSet.transition: {"status": "shipped"}.
+    """
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class OrderBulkTransitionSerializer(serializers.Serializer):
+    """
+    Payload for OrderViewSet.bulk_transition: {"order_ids": [...], "status": "shipped"}.
+    """
+    MAX_ORDERS = 10000
+
+    order_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+    def validate_order_ids(self, value):
+        if len(value) > self.MAX_ORDERS:
+            raise serializers.ValidationError(f"At most {self.MAX_ORDERS} orders per batch.")
+        return list(dict.fromkeys(value)) # Drop duplicates, keep order
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """
+    Lightweight order row for history listings (no nested items).
+    item_count is annotated by the view.
+    """
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['order_id', 'order_date', 'total_amount', 'status', 'item_count']
+        read_only_fields = fields
+
+
 # --- Payments, Invoices, Receipts ---
 class PaymentMethodSerializer(serializers.ModelSerializer):
     """
@@ -141,7 +257,7 @@ class PaymentMethodSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(OmitFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Payment transactions.
     """
@@ -154,7 +270,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         read_only_fields = ['transaction_id', 'transaction_date', 'status', 'payment_details']
 
 
-class PaymentHistorySerializer(serializers.ModelSerializer):
+class PaymentHistorySerializer(OmitFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for PaymentHistory.
     """
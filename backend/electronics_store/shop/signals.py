@@ -0,0 +1,101 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from . import events
+from .categories import invalidate_facets
+from .models import CartItem, Item, ItemCategory, ShoppingCart, User
+from .item_cache import invalidate_items
+from .pricing import flag_carts_for_items
+from .profile_cache import bump_profile_version
+
+# Sent once per committed bulk stockroom batch (QuerySet.update() skips post_save).
+# Receivers get item_ids (every Item touched) and price_changed_ids (subset whose unit_price was set).
+items_bulk_updated = Signal()
+
+
+@receiver(post_delete, sender=CartItem)
+def remove_line_from_cart_totals(sender, instance, **kwargs):
+    """
+    Keeps ShoppingCart.item_count/subtotal in step when a line is deleted,
+    including queryset and cascade deletes that bypass CartItem.delete().
+    """
+    quantity, unit_price = getattr(instance, '_saved_line', None) or (instance.quantity, instance.unit_price)
+    ShoppingCart.apply_line_change(instance.cart_id, -quantity, -(quantity * Decimal(str(unit_price))))
+
+
+@receiver(post_save, sender=Item)
+def flag_carts_after_price_change(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_price_changed', False):
+        flag_carts_for_items([instance.item_id])
+
+
+@receiver(items_bulk_updated, sender=Item)
+def flag_carts_after_bulk_price_change(sender, price_changed_ids, **kwargs):
+    flag_carts_for_items(price_changed_ids)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_cached_item(sender, instance, **kwargs):
+    item_id = instance.pk
+    transaction.on_commit(lambda: invalidate_items([item_id]))
+
+
+@receiver(items_bulk_updated, sender=Item)
+def invalidate_cached_items_after_bulk_update(sender, item_ids, **kwargs):
+    invalidate_items(item_ids) # Already sent after commit
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=ItemCategory)
+@receiver(post_delete, sender=ItemCategory)
+def invalidate_category_facets(sender, **kwargs):
+    transaction.on_commit(invalidate_facets)
+
+
+@receiver(items_bulk_updated, sender=Item)
+def invalidate_category_facets_after_bulk_update(sender, **kwargs):
+    invalidate_facets()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_profile(sender, instance, update_fields=None, **kwargs):
+    """
+    Covers UserSerializer.update, password changes and admin edits. Login only touches
+    last_login, which is not part of the profile. Bumped after commit so a concurrent
+    reader cannot cache the pre-save row under the new version.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    user_id = instance.pk # Cleared on the instance once a delete completes
+    transaction.on_commit(lambda: bump_profile_version(user_id))
+
+
+@receiver(post_save, sender=Item)
+def publish_stock_change(sender, instance, **kwargs):
+    event = events.stock_event(instance.item_id, instance.quantity_available, instance.is_available)
+    transaction.on_commit(lambda: events.publish(events.item_channel(event['item_id']), event))
+
+
+@receiver(items_bulk_updated, sender=Item)
+def publish_bulk_stock_changes(sender, item_ids, **kwargs):
+    events.publish_stock_changes(item_ids)
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def publish_cart_change(sender, instance, **kwargs):
+    cart_id = instance.cart_id
+    transaction.on_commit(lambda: events.publish_cart_change(cart_id))
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def publish_cart_removed(sender, instance, **kwargs):
+    # Captured now: after commit there is no row left to read the owner from
+    cart_id, customer_id, session_key = instance.pk, instance.customer_id, instance.session_key
+    transaction.on_commit(lambda: events.publish_cart_removed(cart_id, customer_id, session_key))
@@ -0,0 +1,228 @@
+"""
+Slow-query capture.
+
+shop.middleware.SlowQueryMiddleware wraps every request's database calls in a
+SlowQueryRecorder (connection.execute_wrapper). Statements slower than SLOW_QUERY_MS are
+grouped by fingerprint (the SQL with literals and IN lists normalised) and by the shop
+code that issued them, then folded into SlowQuery rows once the response has been sent.
+
+A sample of them (SLOW_QUERY_EXPLAIN_RATE) is EXPLAINed with its real parameters. The
+plan is kept, together with the shop tables above SLOW_QUERY_LARGE_TABLE_ROWS that it
+reads with a sequential scan. suggest_indexes() turns those into CREATE INDEX hints; the
+slow_query_report command and /api/instrumentation/slow_queries/ show the top offenders.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import time
+import traceback
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import SlowQuery
+
+SHOP_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+# Request plumbing, not the code that asked for the query
+SKIPPED_FILES = {os.path.join(SHOP_DIR, name) for name in ('slow_queries.py', 'middleware.py', 'profiling.py')}
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """SQL with literals replaced by placeholders and IN (...) lists collapsed, so equivalent statements match."""
+    sql = STRING_LITERAL.sub('%s', sql)
+    sql = NUMBER_LITERAL.sub('%s', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()
+
+
+def call_site():
+    """
+    'shop/views.py:239 highest_selling' for the innermost shop frame, or '' when the query ran
+    outside shop code (e.g. a lazy queryset evaluated by DRF; the view name still identifies it).
+    """
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        if frame.filename.startswith(SHOP_DIR) and frame.filename not in SKIPPED_FILES:
+            return f"shop/{os.path.relpath(frame.filename, SHOP_DIR)}:{frame.lineno} {frame.name}"
+    return ''
+
+
+class SlowQueryRecorder:
+    """execute_wrapper for one request; statements over the threshold are kept until flush()."""
+
+    def __init__(self, alias, view=''):
+        self.alias = alias
+        self.view = view
+        self.threshold = settings.SLOW_QUERY_MS / 1000
+        self.captured = {} # (fingerprint, call_site) -> aggregate
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold:
+                self.capture(sql, params, many, duration * 1000)
+
+    def capture(self, sql, params, many, duration_ms):
+        normalized = normalize(sql)
+        key = (fingerprint(normalized), call_site())
+        entry = self.captured.setdefault(key, {
+            'sql': normalized, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            # The first executed form, kept in memory only, so flush() can EXPLAIN it (SELECTs only)
+            'example': (sql, params if not many and sql.lstrip()[:6].upper() == 'SELECT' else None),
+        })
+        entry['count'] += 1
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+
+    def flush(self):
+        """Folds the captured statements into SlowQuery. Call outside the request's transaction."""
+        if not self.captured:
+            return
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block: # Rows go to the primary, never into the caller's transaction
+            return
+        now = timezone.now()
+        with transaction.atomic():
+            existing = {
+                (row.fingerprint, row.call_site): row
+                for row in SlowQuery.objects.select_for_update().filter(
+                    fingerprint__in={fp for fp, _ in self.captured}
+                )
+            }
+            rows = []
+            for (fp, site), entry in self.captured.items():
+                current = existing.get((fp, site))
+                row = SlowQuery( # Unsaved copy; the upsert below matches it on (fingerprint, call_site)
+                    fingerprint=fp, call_site=site, database=self.alias, sql=entry['sql'], view=self.view,
+                    count=(current.count if current else 0) + entry['count'],
+                    total_ms=(current.total_ms if current else 0) + entry['total_ms'],
+                    max_ms=max(current.max_ms if current else 0, entry['max_ms']),
+                    first_seen=current.first_seen if current else now,
+                    last_seen=now,
+                )
+                if current is None or current.explained_at is None or random.random() < settings.SLOW_QUERY_EXPLAIN_RATE:
+                    self.explain_into(row, *entry['example'])
+                else:
+                    row.plan, row.seq_scan_tables, row.explained_at = current.plan, current.seq_scan_tables, current.explained_at
+                rows.append(row)
+            SlowQuery.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['fingerprint', 'call_site'],
+                update_fields=['sql', 'view', 'count', 'total_ms', 'max_ms', 'last_seen',
+                               'plan', 'seq_scan_tables', 'explained_at'],
+            )
+        self.captured = {}
+
+    def explain_into(self, row, sql, params):
+        if params is None: # executemany() or not a SELECT
+            return
+        connection = connections[self.alias]
+        try:
+            with transaction.atomic(using=self.alias): # Savepoint: a failed EXPLAIN must not break the flush
+                plan, scanned = explain(connection, sql, params)
+        except Exception as exc: # The driver's error classes differ per backend
+            row.plan = f'EXPLAIN failed: {exc}'
+            row.seq_scan_tables = []
+        else:
+            row.plan = plan
+            row.seq_scan_tables = large_tables(connection, scanned)
+        row.explained_at = timezone.now()
+
+
+def explain(connection, sql, params):
+    """Returns (plan text, tables read with a sequential scan) without running the statement."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (ANALYZE off, FORMAT JSON) {sql}', params)
+            document = cursor.fetchone()[0]
+            document = json.loads(document) if isinstance(document, str) else document
+            return json.dumps(document, indent=1), sorted(set(_pg_seq_scans(document[0]['Plan'])))
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+            scanned = {
+                detail.split()[1] for detail in details
+                if detail.startswith('SCAN ') and 'USING' not in detail and len(detail.split()) > 1
+            }
+            return '\n'.join(details), sorted(scanned)
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall()), []
+
+
+def _pg_seq_scans(node):
+    if node.get('Node Type') == 'Seq Scan':
+        yield node['Relation Name']
+    for child in node.get('Plans', ()):
+        yield from _pg_seq_scans(child)
+
+
+def shop_tables():
+    return {model._meta.db_table for model in apps.get_app_config('shop').get_models()}
+
+
+def large_tables(connection, tables):
+    """The shop tables among `tables` with at least SLOW_QUERY_LARGE_TABLE_ROWS rows (estimated on PostgreSQL)."""
+    tables = [table for table in tables if table in shop_tables()]
+    if not tables:
+        return []
+    minimum = settings.SLOW_QUERY_LARGE_TABLE_ROWS
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT relname, reltuples FROM pg_class WHERE relname = ANY(%s)', [tables])
+            sizes = dict(cursor.fetchall())
+        else:
+            sizes = {}
+            for table in tables:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                sizes[table] = cursor.fetchone()[0]
+    return [table for table in tables if sizes.get(table, 0) >= minimum]
+
+
+def suggest_indexes(slow_query, using='default'):
+    """
+    CREATE INDEX hints for each sequentially scanned table of a SlowQuery: the table's columns
+    compared in WHERE/JOIN (equality first, then ranges), then its ORDER BY columns.
+    Tables that already have an index starting with the first of those columns get no hint.
+    """
+    connection = connections[using]
+    sql = slow_query.sql
+    where, _, order_by = sql.partition(' ORDER BY ')
+    suggestions = []
+    for table in slow_query.seq_scan_tables:
+        quoted = re.escape(f'"{table}"')
+        equality, ranges, ordering = [], [], []
+        for column, operator in re.findall(quoted + r'\."(\w+)"\s*(=|IN\b|IS\b|LIKE\b|<=|>=|<|>)', where, re.IGNORECASE):
+            (equality if operator.upper() in ('=', 'IN', 'IS') else ranges).append(column)
+        ordering = re.findall(quoted + r'\."(\w+)"', order_by)
+        columns = list(dict.fromkeys(equality + ranges + ordering))
+        if not columns:
+            continue
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        if any(
+            (constraint['index'] or constraint['unique'] or constraint['primary_key'])
+            and constraint['columns'] and constraint['columns'][0] == columns[0]
+            for constraint in constraints.values()
+        ):
+            continue
+        column_list = ', '.join(connection.ops.quote_name(column) for column in columns[:3])
+        suggestions.append(f'CREATE INDEX ON {connection.ops.quote_name(table)} ({column_list});')
+    return suggestions
+
+
+def top_offenders(order_by='total_ms', limit=20):
+    return SlowQuery.objects.order_by(f'-{order_by}')[:limit]
@@ -0,0 +1,209 @@
+"""
+Whole-database snapshots for fast resets in tests, benchmarks and development.
+
+Seed a database once (populate_data, a benchmark's data set, ...), snapshot it, and restore
+the snapshot whenever a clean copy is needed instead of deleting and re-creating rows:
+
+    PostgreSQL  a snapshot is a template database (<name>_snapshot_<snapshot>); restoring
+                drops the live database and clones the template, a file-level copy.
+    SQLite      a snapshot is a file next to the database (<file>.<snapshot>.snapshot), or an
+                in-process copy for in-memory test databases; both use SQLite's backup API.
+
+Restoring replaces the data under any cached copies, so caches are cleared afterwards.
+PostgreSQL restores need every other session on the database to be closed (or use force=True).
+"""
+import io
+import os
+import re
+import sqlite3
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import TransactionTestCase
+
+from .item_cache import local_items
+
+SNAPSHOT_NAME = re.compile(r'^[a-z0-9_]{1,30}$')
+SUPPORTED_VENDORS = ('postgresql', 'sqlite')
+
+_memory_snapshots = {} # (alias, snapshot) -> sqlite3 in-memory connection
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _check_name(snapshot):
+    if not SNAPSHOT_NAME.match(snapshot):
+        raise SnapshotError('Snapshot names use lowercase letters, digits and underscores (up to 30).')
+
+
+def _connection(using):
+    connection = connections[using]
+    if connection.vendor not in SUPPORTED_VENDORS:
+        raise SnapshotError(f'Snapshots are not supported on {connection.vendor}.')
+    return connection
+
+
+def _release(connection):
+    """Closes this process's connections so the database can be copied or dropped."""
+    connection.close()
+    if connection.vendor == 'postgresql' and connection.settings_dict.get('OPTIONS', {}).get('pool'):
+        connection.close_pool()
+
+
+def _pg_snapshot_db(connection, snapshot):
+    return f"{connection.settings_dict['NAME']}_snapshot_{snapshot}"
+
+
+def _sqlite_snapshot_file(connection, snapshot):
+    return f"{connection.settings_dict['NAME']}.{snapshot}.snapshot"
+
+
+def _pg_execute(connection, *statements):
+    with connection._nodb_cursor() as cursor: # Connected to the maintenance database, as Django's test runner does
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def _pg_error(exc):
+    return SnapshotError(f'{exc} Close other connections (runserver, shells) or pass force=True.')
+
+
+def create_snapshot(snapshot, using='default'):
+    _check_name(snapshot)
+    connection = _connection(using)
+    if connection.vendor == 'postgresql':
+        quote = connection.ops.quote_name
+        _release(connection)
+        try:
+            _pg_execute(
+                connection,
+                f'DROP DATABASE IF EXISTS {quote(_pg_snapshot_db(connection, snapshot))}',
+                f'CREATE DATABASE {quote(_pg_snapshot_db(connection, snapshot))} '
+                f'TEMPLATE {quote(connection.settings_dict["NAME"])}',
+            )
+        except connection.Database.Error as exc:
+            raise _pg_error(exc) from exc
+    elif connection.vendor == 'sqlite':
+        connection.ensure_connection()
+        if connection.is_in_memory_db():
+            target = _memory_snapshots.get((using, snapshot)) or sqlite3.connect(':memory:', check_same_thread=False)
+            _memory_snapshots[(using, snapshot)] = target
+            connection.connection.backup(target)
+        else:
+            with sqlite3.connect(_sqlite_snapshot_file(connection, snapshot)) as target:
+                connection.connection.backup(target)
+            target.close()
+
+
+def restore_snapshot(snapshot, using='default', force=False):
+    _check_name(snapshot)
+    connection = _connection(using)
+    if not snapshot_exists(snapshot, using):
+        raise SnapshotError(f"No snapshot '{snapshot}' for database '{using}'.")
+    if connection.vendor == 'postgresql':
+        quote = connection.ops.quote_name
+        _release(connection)
+        try:
+            _pg_execute(
+                connection,
+                f'DROP DATABASE IF EXISTS {quote(connection.settings_dict["NAME"])}{" WITH (FORCE)" if force else ""}',
+                f'CREATE DATABASE {quote(connection.settings_dict["NAME"])} '
+                f'TEMPLATE {quote(_pg_snapshot_db(connection, snapshot))}',
+            )
+        except connection.Database.Error as exc:
+            raise _pg_error(exc) from exc
+    elif connection.vendor == 'sqlite':
+        connection.ensure_connection()
+        if connection.is_in_memory_db():
+            _memory_snapshots[(using, snapshot)].backup(connection.connection)
+        else:
+            with sqlite3.connect(_sqlite_snapshot_file(connection, snapshot)) as source:
+                source.backup(connection.connection)
+            source.close()
+    cache.clear()
+    local_items.clear()
+
+
+def snapshot_exists(snapshot, using='default'):
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection._nodb_cursor() as cursor:
+            cursor.execute('SELECT 1 FROM pg_database WHERE datname = %s', [_pg_snapshot_db(connection, snapshot)])
+            return cursor.fetchone() is not None
+    if connection.vendor == 'sqlite':
+        if connection.is_in_memory_db():
+            return (using, snapshot) in _memory_snapshots
+        return os.path.exists(_sqlite_snapshot_file(connection, snapshot))
+    return False
+
+
+def list_snapshots(using='default'):
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        prefix = _pg_snapshot_db(connection, '')
+        with connection._nodb_cursor() as cursor:
+            cursor.execute('SELECT datname FROM pg_database WHERE starts_with(datname, %s) ORDER BY datname', [prefix])
+            return [name[len(prefix):] for name, in cursor.fetchall()]
+    if connection.vendor == 'sqlite':
+        if connection.is_in_memory_db():
+            return sorted(snapshot for alias, snapshot in _memory_snapshots if alias == using)
+        database = str(connection.settings_dict['NAME'])
+        directory = os.path.dirname(database) or '.'
+        prefix, suffix = os.path.basename(database) + '.', '.snapshot'
+        return sorted(
+            name[len(prefix):-len(suffix)] for name in os.listdir(directory)
+            if name.startswith(prefix) and name.endswith(suffix)
+        )
+    return []
+
+
+def delete_snapshot(snapshot, using='default'):
+    _check_name(snapshot)
+    connection = _connection(using)
+    if connection.vendor == 'postgresql':
+        _pg_execute(connection, f'DROP DATABASE IF EXISTS {connection.ops.quote_name(_pg_snapshot_db(connection, snapshot))}')
+    elif connection.vendor == 'sqlite':
+        if connection.is_in_memory_db():
+            target = _memory_snapshots.pop((using, snapshot), None)
+            if target is not None:
+                target.close()
+        else:
+            try:
+                os.remove(_sqlite_snapshot_file(connection, snapshot))
+            except FileNotFoundError:
+                pass
+
+
+class SnapshotTestCase(TransactionTestCase):
+    """
+    TransactionTestCase that starts every test from a database snapshot instead of an empty,
+    flushed database. The snapshot is built once per test run by build_snapshot() (by default
+    populate_data), then restored before each test.
+    """
+    snapshot = 'test_seed'
+    _built = set() # (alias, snapshot) built by this test run; older snapshots may predate migrations
+
+    @classmethod
+    def build_snapshot(cls):
+        call_command('populate_data', stdout=io.StringIO())
+
+    @classmethod
+    def setUpClass(cls):
+        # Before super(): the first restore already runs inside TransactionTestCase.setUpClass()
+        for alias in cls._databases_names(include_mirrors=False):
+            if (alias, cls.snapshot) not in SnapshotTestCase._built:
+                cls.build_snapshot()
+                create_snapshot(cls.snapshot, alias)
+                SnapshotTestCase._built.add((alias, cls.snapshot))
+        super().setUpClass()
+
+    @classmethod
+    def _fixture_setup(cls):
+        for alias in cls._databases_names(include_mirrors=False):
+            restore_snapshot(cls.snapshot, alias, force=True)
+
+    def _fixture_teardown(self):
+        pass # The next test restores the snapshot, so there is nothing to flush
@@ -1,3 +1,567 @@
-from django.test import TestCase
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import (
+    archival, categories, db_routers, fulfilment, hashing, metrics, pricing, profile_cache, recommendations, snapshots,
+)
+from .item_cache import local_items
+from .models import (
+    ArchivedOrder, CartItem, IdempotencyKey, Item, ItemCategory, ItemCoPurchase, Order, OrderItem, OrderStatusTransition,
+    PerformanceMetric, ProcessingWatermark, SlowQuery, User,
+)
+from .slow_queries import SlowQueryRecorder
+
+
+def make_item(name='Widget', **fields):
+    fields.setdefault('unit_price', Decimal('10.00'))
+    fields.setdefault('quantity_available', 10)
+    return Item.objects.create(item_name=name, **fields)
+
+
+class ShopTestCase(TestCase):
+    """Fresh caches per test: items, facets and profiles are cached across requests."""
+
+    def setUp(self):
+        cache.clear()
+        local_items.clear()
+        self.client = APIClient()
+
+    def login(self, username='customer', **fields):
+        user = User.objects.create_user(username, password='pass-word-1', **fields)
+        self.client.force_login(user)
+        return user
+
+
+class BulkAdjustTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login('stockroom', is_staff=True)
+        category = ItemCategory.objects.create(name='Audio')
+        self.speaker = make_item('Speaker', item_type=category, quantity_available=5)
+        self.headphones = make_item('Headphones', item_type=category, quantity_available=2)
+
+    def adjust(self, *adjustments):
+        return self.client.post('/api/items/bulk_adjust/', {'adjustments': list(adjustments)}, format='json')
+
+    def test_applies_every_adjustment_and_bumps_versions(self):
+        response = self.adjust(
+            {'item_id': self.speaker.item_id, 'quantity_delta': -2, 'expected_version': self.speaker.version},
+            {'item_id': self.headphones.item_id, 'unit_price': '12.50'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        rows = {row['item_id']: row for row in response.data['items']}
+        self.assertEqual(rows[self.speaker.item_id]['quantity_available'], 3)
+        self.assertEqual(rows[self.speaker.item_id]['version'], self.speaker.version + 1)
+        self.assertEqual(rows[self.headphones.item_id]['unit_price'], '12.50') # Same money format as ItemSerializer
+
+    def test_version_mismatch_rejects_the_whole_batch(self):
+        response = self.adjust(
+            {'item_id': self.speaker.item_id, 'quantity_delta': 1},
+            {'item_id': self.headphones.item_id, 'quantity_delta': 1, 'expected_version': self.headphones.version + 7},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['conflicts'], [{
+            'item_id': self.headphones.item_id, 'reason': 'version_mismatch', 'current_version': self.headphones.version,
+        }])
+        self.speaker.refresh_from_db()
+        self.assertEqual(self.speaker.quantity_available, 5)
+
+    def test_insufficient_stock_and_missing_items_are_reported(self):
+        response = self.adjust(
+            {'item_id': self.headphones.item_id, 'quantity_delta': -3},
+            {'item_id': 999999, 'quantity': 1},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['conflicts'], [
+            {'item_id': self.headphones.item_id, 'reason': 'insufficient_stock', 'quantity_available': 2},
+            {'item_id': 999999, 'reason': 'not_found'},
+        ])
+
+
+class MetricRollupTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.placed_at = timezone.now() - timedelta(hours=2) # Older than metrics.SETTLE_TIME
+
+    def place(self, amount):
+        order = Order.objects.create(total_amount=Decimal(amount))
+        Order.objects.filter(pk=order.pk).update(order_date=self.placed_at)
+        fulfilment.record_placed(Order.objects.get(pk=order.pk))
+        return order
+
+    def sales(self):
+        return list(PerformanceMetric.objects.filter(metric_type='sales', granularity='day').values_list('value', 'sample_count'))
+
+    def test_each_run_folds_only_new_settled_orders(self):
+        self.place('10.00')
+        self.place('20.00')
+        metrics.compute_metrics()
+        self.assertEqual(self.sales(), [(Decimal('30.00'), 2)])
+
+        self.place('5.00')
+        Order.objects.create(total_amount=Decimal('7.00')) # Placed just now: waits for a later run
+        metrics.compute_metrics()
+        self.assertEqual(self.sales(), [(Decimal('35.00'), 3)])
+        metrics.compute_metrics()
+        self.assertEqual(self.sales(), [(Decimal('35.00'), 3)])
+
+    def test_cancelled_orders_are_taken_out_of_sales(self):
+        kept = self.place('10.00')
+        cancelled = self.place('20.00')
+        metrics.compute_metrics()
+        fulfilment.transition(cancelled, 'cancelled')
+        OrderStatusTransition.objects.filter(to_status='cancelled').update(changed_at=self.placed_at)
+        metrics.compute_metrics()
+        self.assertEqual(self.sales(), [(kept.total_amount, 1)])
+
+    def test_orders_cancelled_before_the_log_are_never_counted(self):
+        self.place('10.00')
+        legacy = Order.objects.create(total_amount=Decimal('99.00'), status='cancelled')
+        Order.objects.filter(pk=legacy.pk).update(order_date=self.placed_at)
+        metrics.compute_metrics()
+        self.assertEqual(self.sales(), [(Decimal('10.00'), 1)])
+
+
+class CoPurchaseTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pair = [make_item('Camera'), make_item('Tripod')]
+
+    def place(self, **fields):
+        order = Order.objects.create(total_amount=Decimal('20.00'), **fields)
+        for item in self.pair:
+            OrderItem.objects.create(order=order, item=item, quantity=1, unit_price_at_time_of_order=item.unit_price)
+        return order
+
+    def bought_together(self):
+        return ItemCoPurchase.objects.get(item=self.pair[0], related_item=self.pair[1]).order_count
+
+    def test_orders_committed_out_of_order_are_not_skipped(self):
+        later = self.place(order_id=20) # Commits first, while order 10 is still in flight
+        self.assertEqual(recommendations.refresh_co_purchases(), 0)
+        self.place(order_id=10)
+        Order.objects.update(order_date=timezone.now() - metrics.SETTLE_TIME)
+        self.assertEqual(recommendations.refresh_co_purchases(), 2)
+        self.assertEqual(self.bought_together(), 2)
+        self.assertEqual(ProcessingWatermark.objects.get(name=recommendations.WATERMARK_NAME).last_id, later.pk)
+
+
+REPLICA = 'replica_test'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Routes against a throwaway SQLite replica with a differently-named copy of the categories
+    and no items yet. TransactionTestCase, as reads inside a transaction always go to the primary.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Registered here rather than in settings, so the runner does not build a test database for it
+        replica_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(replica_dir.cleanup)
+        connections.settings[REPLICA] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: {},
+            REPLICA: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': f'{replica_dir.name}/replica.sqlite3'},
+        })[REPLICA]
+        cls.addClassCleanup(connections.settings.pop, REPLICA)
+        cls.addClassCleanup(connections[REPLICA].close)
+        cls.databases = {DEFAULT_DB_ALIAS, REPLICA}
+        super().setUpClass()
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(ItemCategory)
+            editor.create_model(Item)
+
+    def setUp(self):
+        cache.clear()
+        local_items.clear()
+        self.client = APIClient()
+        category = ItemCategory.objects.create(name='Cameras')
+        ItemCategory.objects.using(REPLICA).all().delete()
+        ItemCategory.objects.using(REPLICA).create(pk=category.pk, name='Cameras (replica)')
+        self.item = make_item('Camera', item_type=category)
+        User.objects.create_user('customer', password='pass-word-1')
+
+    def category_names(self):
+        return [category['name'] for category in self.client.get('/api/categories/').data]
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        self.assertEqual(ItemCategory.objects.get().name, 'Cameras (replica)')
+        self.assertFalse(Item.objects.exists()) # Not replicated yet
+        self.assertTrue(User.objects.filter(username='customer').exists()) # Never read from a replica
+        ItemCategory.objects.create(name='Lenses')
+        self.assertEqual(ItemCategory.objects.using(DEFAULT_DB_ALIAS).count(), 2)
+        self.assertEqual(ItemCategory.objects.count(), 1)
+        self.assertEqual(self.category_names(), ['Cameras (replica)'])
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        with db_routers.use_primary():
+            self.assertEqual(ItemCategory.objects.get().name, 'Cameras')
+        self.assertEqual(ItemCategory.objects.get().name, 'Cameras (replica)')
+
+        self.client.login(username='customer', password='pass-word-1')
+        response = self.client.post('/api/cart-items/', {'item': self.item.item_id, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(settings.REPLICA_PIN_COOKIE_NAME, response.cookies)
+        self.assertEqual(self.category_names(), ['Cameras']) # Pinned by the cookie
+
+        # The pin lives in the request's context only: this thread and other clients still use the replica
+        self.assertEqual(ItemCategory.objects.get().name, 'Cameras (replica)')
+        self.assertEqual(APIClient().get('/api/categories/').data[0]['name'], 'Cameras (replica)')
+
+
+class CheckoutPriceChangeTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+        self.item = make_item('Camera', unit_price=Decimal('100.00'))
+        self.client.post('/api/cart-items/', {'item': self.item.item_id, 'quantity': 2}, format='json')
+        self.item.unit_price = Decimal('120.00')
+        self.item.save()
+
+    def checkout(self):
+        return self.client.post('/api/orders/place_order_from_cart/', {'delivery_address': '1 Test Street'}, format='json')
+
+    def assert_change_reported(self, response):
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_amount'], '240.00')
+        self.assertEqual(response.data['price_changes'], [{
+            'item_id': self.item.item_id, 'item_name': 'Camera', 'quantity': 2,
+            'old_unit_price': '100.00', 'new_unit_price': '120.00',
+        }])
+
+    def test_checkout_reports_and_charges_the_new_price(self):
+        self.assert_change_reported(self.checkout())
+
+    def test_summary_does_not_reprice_the_cart(self):
+        summary = self.client.get('/api/carts/summary/').data
+        self.assertTrue(summary['needs_repricing'])
+        self.assertEqual(summary['subtotal'], '200.00')
+        self.assert_change_reported(self.checkout())
+
+    def test_change_is_still_reported_after_batch_repricing(self):
+        self.assertEqual(pricing.reprice_flagged_carts(), 1)
+        summary = self.client.get('/api/carts/summary/').data
+        self.assertEqual((summary['subtotal'], summary['needs_repricing']), ('240.00', False))
+        self.assert_change_reported(self.checkout())
+
+    def test_unchanged_prices_report_nothing(self):
+        self.item.unit_price = Decimal('100.00')
+        self.item.save()
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['price_changes'], [])
+
+
+class IdempotencyKeyTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.login()
+        self.item = make_item('Tablet')
+        self.add_to_cart()
+
+    def add_to_cart(self):
+        self.client.post('/api/cart-items/', {'item': self.item.item_id, 'quantity': 1}, format='json')
+
+    def checkout(self, key='checkout-1', address='1 Test Street'):
+        return self.client.post('/api/orders/place_order_from_cart/', {'delivery_address': address},
+                                format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.checkout()
+        retry = self.checkout()
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.data['order_id'], first.data['order_id'])
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_reusing_a_key_for_another_payload_is_rejected(self):
+        self.checkout()
+        self.assertEqual(self.checkout(address='2 Other Street').status_code, 422)
+
+    def test_retry_while_the_first_attempt_runs_gets_409(self):
+        self.checkout()
+        IdempotencyKey.objects.update(response_status=None, response_body=None) # As if still in flight
+        self.assertEqual(self.checkout().status_code, 409)
+
+    def test_abandoned_reservation_is_taken_over(self):
+        self.checkout()
+        IdempotencyKey.objects.update(
+            response_status=None, response_body=None,
+            created_at=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE + 1),
+        )
+        self.add_to_cart()
+        retry = self.checkout()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().response_body['order_id'], retry.data['order_id'])
+
+    def test_failed_attempt_releases_the_key(self):
+        self.client.delete(f'/api/cart-items/{CartItem.objects.get().pk}/')
+        self.assertEqual(self.checkout().status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.add_to_cart()
+        self.assertEqual(self.checkout().status_code, 201)
+
+
+class PasswordHashingTests(TransactionTestCase):
+    """TransactionTestCase, as the hashing pool's threads read users over their own connections."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User.objects.create_user('customer', password='pass-word-1')
+
+    def log_in(self, password='pass-word-1'):
+        return self.client.post('/api/users/login/', {'username': 'customer', 'password': password}, format='json')
+
+    def sign_up(self, username):
+        return self.client.post('/api/users/', {'username': username, 'password': 'pass-word-2'}, format='json')
+
+    def saturate_pool(self):
+        """Fills every worker and queue slot with a blocked task. Returns a function that frees them."""
+        release = threading.Event()
+        blocked = [
+            hashing.submit(release.wait)
+            for _ in range(settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_MAX_PENDING)
+        ]
+
+        def free():
+            release.set()
+            for future in blocked:
+                future.result()
+        self.addCleanup(free)
+        return free
+
+    def test_login_and_signup_hash_on_the_pool(self):
+        self.assertEqual(self.log_in().status_code, 200)
+        self.assertEqual(self.log_in('wrong-password').status_code, 400)
+        self.assertEqual(self.sign_up('newcomer').status_code, 201)
+        self.assertTrue(User.objects.get(username='newcomer').check_password('pass-word-2'))
+
+    def test_saturated_pool_fails_fast_with_503(self):
+        free = self.saturate_pool()
+        self.assertEqual(self.log_in().status_code, 503)
+        self.assertEqual(self.sign_up('newcomer').status_code, 503)
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+
+        free()
+        self.assertEqual(self.log_in().status_code, 200)
+
+
+class ProfileCacheTests(ShopTestCase):
+    def setUp(self):
+        shared = tempfile.TemporaryDirectory()
+        self.addCleanup(shared.cleanup)
+        # Profiles are only cached in a cache every worker shares
+        overrides = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': shared.name,
+        }})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        super().setUp()
+        self.user = self.login(first_name='Ada')
+
+    def summary(self):
+        return self.client.get('/api/users/me/summary/').data
+
+    def test_profile_is_served_from_the_cache(self):
+        self.assertEqual(self.summary()['first_name'], 'Ada')
+        User.objects.filter(pk=self.user.pk).update(first_name='Grace') # No signal, so no invalidation
+        self.assertEqual(self.summary()['first_name'], 'Ada')
+
+    def test_saving_the_user_invalidates_the_profile(self):
+        self.summary()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Grace'
+            self.user.is_staff = True
+            self.user.save()
+        summary = self.summary()
+        self.assertEqual((summary['first_name'], summary['is_staff']), ('Grace', True))
+
+    def test_deactivated_user_is_logged_out(self):
+        self.summary()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.summary(), {'is_authenticated': False})
+
+    def test_per_process_cache_is_not_used_for_profiles(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertFalse(profile_cache.caching_enabled())
+            self.summary()
+            User.objects.filter(pk=self.user.pk).update(first_name='Grace')
+            self.assertEqual(self.summary()['first_name'], 'Grace')
+
+
+class CategoryFacetTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = ItemCategory.objects.create(name='Cameras')
+        make_item('Camera', item_type=self.category)
+
+    def item_count(self):
+        return self.client.get('/api/categories/').data[0]['item_count']
+
+    def test_facets_are_cached_until_an_item_changes(self):
+        self.assertEqual(self.item_count(), 1)
+        Item.objects.bulk_create([Item(item_name='Tripod', unit_price=Decimal('5.00'), item_type=self.category)]) # No signal
+        self.assertEqual(self.item_count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_item('Lens', item_type=self.category)
+        self.assertEqual(self.item_count(), 3)
+
+    def test_per_process_cache_keeps_facets_briefly(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual(categories.facets_timeout(), categories.FACETS_LOCAL_TIMEOUT)
+        with tempfile.TemporaryDirectory() as shared, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': shared,
+        }}):
+            self.assertEqual(categories.facets_timeout(), categories.FACETS_TIMEOUT)
+
+
+class EventStreamTests(ShopTestCase):
+    def test_stream_is_refused_outside_asgi(self):
+        self.assertEqual(self.client.get('/api/events/').status_code, 501)
+
+    async def test_stream_starts_with_the_current_stock(self):
+        item = await Item.objects.acreate(item_name='Drone', unit_price=Decimal('10.00'), quantity_available=4)
+        response = await AsyncClient().get(f'/api/events/?items={item.item_id}')
+        self.assertEqual(response.status_code, 200)
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        self.assertIn(b'"quantity_available": 4', await anext(chunks))
+        await chunks.aclose()
+
+    async def test_invalid_item_list_is_rejected(self):
+        response = await AsyncClient().get('/api/events/?items=drone')
+        self.assertEqual(response.status_code, 400)
+
+
+class FulfilmentTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.login()
+        self.item = make_item('Router', quantity_available=10)
+        self.client.post('/api/cart-items/', {'item': self.item.item_id, 'quantity': 3}, format='json')
+        response = self.client.post('/api/orders/place_order_from_cart/', {'delivery_address': '1 Test Street'}, format='json')
+        self.order = Order.objects.get(pk=response.data['order_id'])
+
+    def stock(self):
+        self.item.refresh_from_db()
+        return self.item.quantity_available
+
+    def move(self, to_status):
+        return self.client.post(f'/api/orders/{self.order.pk}/transition/', {'status': to_status}, format='json')
+
+    def test_placing_an_order_reserves_stock(self):
+        self.assertEqual(self.stock(), 7)
+
+    def test_staff_walk_an_order_through_to_delivery(self):
+        self.client.force_login(User.objects.create_user('warehouse', password='pass-word-1', is_staff=True))
+        for to_status in ('paid', 'processing', 'shipped', 'delivered'):
+            self.assertEqual(self.move(to_status).status_code, 200)
+        history = self.client.get(f'/api/orders/{self.order.pk}/status_history/').data
+        self.assertEqual([step['to_status'] for step in history], ['pending', 'paid', 'processing', 'shipped', 'delivered'])
+
+    def test_illegal_transitions_are_rejected(self):
+        self.assertEqual(self.move('shipped').status_code, 409) # Customers may only cancel
+        fulfilment.transition(self.order, 'paid')
+        fulfilment.transition(self.order, 'processing')
+        self.assertEqual(self.move('cancelled').status_code, 409) # Too late for the customer
+        with self.assertRaises(fulfilment.InvalidTransition):
+            fulfilment.transition(self.order, 'delivered') # Must be shipped first
+
+    def test_cancelling_restocks_the_items(self):
+        self.assertEqual(self.move('cancelled').status_code, 200)
+        self.assertEqual(self.stock(), 10)
+        self.assertEqual(self.move('cancelled').status_code, 409)
+        self.assertEqual(self.stock(), 10)
+
+    def test_orders_placed_before_reservation_are_not_restocked(self):
+        legacy = Order.objects.create(customer=self.customer, total_amount=Decimal('20.00'))
+        OrderItem.objects.create(order=legacy, item=self.item, quantity=2, unit_price_at_time_of_order=Decimal('10.00'))
+        moved, skipped = fulfilment.bulk_transition([legacy.pk, self.order.pk], 'cancelled')
+        self.assertEqual((sorted(moved), skipped), (sorted([legacy.pk, self.order.pk]), []))
+        self.assertEqual(self.stock(), 10)
+
+
+@override_settings(SLOW_QUERY_MS=0.000001) # Every statement counts as slow
+class SlowQueryTests(TransactionTestCase):
+    """TransactionTestCase, as captured statements are never stored inside a transaction."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        ItemCategory.objects.create(name='Cameras')
+
+    def test_statements_are_stored_with_their_view(self):
+        self.assertEqual(self.client.get('/api/categories/').status_code, 200)
+        stored = SlowQuery.objects.filter(view='itemcategory-list', sql__contains='shop_itemcategory')
+        self.assertTrue(stored.exists())
+        self.assertTrue(all(row.plan for row in stored))
+
+    def test_storage_failure_is_logged_not_raised(self):
+        with mock.patch.object(SlowQueryRecorder, 'flush', side_effect=DatabaseError('disk full')), \
+                self.assertLogs('shop.middleware', 'ERROR') as logs:
+            self.assertEqual(self.client.get('/api/categories/').status_code, 200)
+        self.assertIn('disk full', logs.output[0])
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class SnapshotVendorTests(SimpleTestCase):
+    def test_unsupported_vendors_are_refused(self):
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'vendor', 'mysql'):
+            for operation in (snapshots.create_snapshot, snapshots.restore_snapshot, snapshots.delete_snapshot):
+                with self.subTest(operation.__name__), self.assertRaisesMessage(
+                        snapshots.SnapshotError, 'Snapshots are not supported on mysql.'):
+                    operation('seed')
+
+
+class ArchivalTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.login()
+        self.item = make_item('Monitor')
+        long_ago = timezone.now() - timedelta(days=settings.ARCHIVE_ORDERS_AFTER_DAYS + 1)
+        self.orders = {}
+        for order_status in ('delivered', 'cancelled', 'shipped', 'delivered'):
+            order = Order.objects.create(customer=self.customer, status=order_status, total_amount=Decimal('10.00'))
+            OrderItem.objects.create(order=order, item=self.item, quantity=1, unit_price_at_time_of_order=Decimal('10.00'))
+            OrderStatusTransition.objects.create(order=order, to_status=order_status)
+            self.orders.setdefault(order_status, []).append(order)
+        # order_date is auto_now_add, so age every order except the last delivered one afterwards
+        Order.objects.exclude(pk=self.orders['delivered'][1].pk).update(order_date=long_ago)
+
+    def test_only_old_completed_orders_are_archived(self):
+        self.assertEqual(archival.archive_orders(archival.cutoff_for(), batch_size=1), 2)
+        archived_ids = {self.orders['delivered'][0].pk, self.orders['cancelled'][0].pk}
+        self.assertEqual(set(ArchivedOrder.objects.values_list('order_id', flat=True)), archived_ids)
+        self.assertFalse(Order.objects.filter(pk__in=archived_ids).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id__in=archived_ids).exists())
+        self.assertEqual(Order.objects.count(), 2)
+        document = ArchivedOrder.objects.get(pk=self.orders['delivered'][0].pk).document
+        self.assertEqual(len(document['items']), 1)
+        self.assertEqual(document['status_transitions'][0]['to_status'], 'delivered')
+
+    def test_retrieve_falls_back_to_the_archive(self):
+        order = self.orders['cancelled'][0]
+        archival.archive_orders(archival.cutoff_for())
+        response = self.client.get(f'/api/orders/{order.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['archived'])
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.assertNotIn(order.pk, [row['order_id'] for row in self.client.get('/api/orders/').data])
+        self.login('someone-else')
+        self.assertEqual(self.client.get(f'/api/orders/{order.pk}/').status_code, 404)
@@ -0,0 +1,136 @@
+"""
+Token-bucket request throttling.
+
+Every request to a throttled view draws one token from a bucket per identity it carries:
+the client IP always, plus the session and the user when present. Buckets refill
+continuously at the rate configured for the view's scope in settings.THROTTLE_BUDGETS,
+e.g. {'login': {'ip': '20/min', 'session': '10/min'}}; '20/min' means a burst of 20
+refilled over a minute. Bucket state lives in the cache named by THROTTLE_CACHE_ALIAS.
+
+On Redis the refill-and-spend runs as one Lua script, so concurrent requests from any
+number of workers can never overdraw a bucket. Other backends do a read-compute-write
+under a lock that is only held within one process: exact for the per-process LocMem cache,
+but on a shared Memcached concurrent workers can each spend the same token, so the
+limit is approximate there (overdrawn by at most the number of workers).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+# KEYS: bucket keys. ARGV: capacity and refill per second for each key, in order.
+# Returns '0' when a token was drawn from every bucket, else the seconds to wait (nothing drawn).
+# Numbers go back as strings because Redis truncates Lua numbers to integers.
+SPEND_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tokens, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local capacity, refill = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local available = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    available = math.min(capacity, available + math.max(0, now - updated) * refill)
+    tokens[i] = available
+    if available < 1 then wait = math.max(wait, (1 - available) / refill) end
+end
+if wait > 0 then return tostring(wait) end
+for i, key in ipairs(KEYS) do
+    local capacity, refill = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tostring(tokens[i] - 1), 'updated', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(capacity / refill * 1000) + 1000)
+end
+return '0'
+"""
+
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """'20/min' -> (capacity 20, refill 20/60 tokens per second)."""
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Views opt in with `throttle_scope`, and may override it per action with
+    `throttle_scopes = {'login': 'login', ...}`. Views without a scope are not throttled.
+    A request is admitted only if every one of its buckets has a token; nothing is drawn otherwise.
+    """
+
+    def __init__(self):
+        self.cache = caches[settings.THROTTLE_CACHE_ALIAS]
+        self.retry_after = None
+
+    def get_scope(self, view):
+        action = getattr(view, 'action', None)
+        return getattr(view, 'throttle_scopes', {}).get(action) or getattr(view, 'throttle_scope', None)
+
+    def get_identities(self, request):
+        identities = {'ip': self.get_ident(request)}
+        session = getattr(request, 'session', None)
+        if session is not None and session.session_key:
+            identities['session'] = session.session_key
+        if request.user.is_authenticated:
+            identities['user'] = str(request.user.pk)
+        return identities
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        budgets = settings.THROTTLE_BUDGETS.get(scope)
+        if not budgets:
+            return True
+
+        buckets = {} # cache key -> (capacity, refill per second)
+        for kind, ident in self.get_identities(request).items():
+            if kind in budgets:
+                buckets[f'throttle:{scope}:{kind}:{ident}'] = parse_rate(budgets[kind])
+        if not buckets:
+            return True
+
+        if isinstance(self.cache, RedisCache):
+            wait = self.spend_redis(buckets)
+        else:
+            with _local_lock:
+                wait = self.spend(buckets)
+        if wait:
+            self.retry_after = wait
+            return False
+        return True
+
+    def spend_redis(self, buckets):
+        """Atomic refill-and-spend across all buckets; returns seconds to wait, or 0 if admitted."""
+        client = self.cache._cache.get_client(write=True)
+        keys = [self.cache.make_and_validate_key(key) for key in buckets]
+        rates = [value for capacity, refill in buckets.values() for value in (capacity, refill)]
+        return float(client.register_script(SPEND_SCRIPT)(keys=keys, args=rates))
+
+    def spend(self, buckets):
+        now = time.time()
+        stored = self.cache.get_many(list(buckets))
+        refilled = {}
+        waits = []
+        for key, (capacity, refill) in buckets.items():
+            tokens, updated = stored.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            if tokens < 1:
+                waits.append((1 - tokens) / refill)
+            refilled[key] = (tokens, now)
+
+        if waits:
+            return max(waits)
+
+        # Entries expire once the bucket would be full again, so idle clients cost nothing
+        timeout = max(capacity / refill for capacity, refill in buckets.values())
+        self.cache.set_many({key: (tokens - 1, now) for key, (tokens, _) in refilled.items()}, timeout=int(timeout) + 1)
+        return 0
+
+    def wait(self):
+        return self.retry_after
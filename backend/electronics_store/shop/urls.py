@@ -6,6 +6,7 @@ from . import views # Import your views
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet)
 router.register(r'items', views.ItemViewSet)
+router.register(r'categories', views.ItemCategoryViewSet)
 router.register(r'carts', views.ShoppingCartViewSet)
 router.register(r'cart-items', views.CartItemViewSet)
 router.register(r'orders', views.OrderViewSet)
@@ -14,9 +15,11 @@ router.register(r'payments', views.PaymentViewSet)
 router.register(r'invoices', views.InvoiceViewSet)
 router.register(r'receipts', views.ReceiptViewSet)
 router.register(r'performance-metrics', views.PerformanceMetricViewSet)
+router.register(r'instrumentation', views.InstrumentationViewSet, basename='instrumentation')
 
 
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
+    path('events/', views.events_stream, name='events'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -4,23 +4,94 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 
 from django.db import transaction # For atomic operations
 from django.db.models import Sum # For aggregation in ItemViewSet
+from django.db.models import Case, When, F, Value, DecimalField, IntegerField # For set-based bulk updates
 from django.contrib.auth import get_user_model
-from django.contrib.auth import authenticate, login, logout # IMPORTANT: Import Django's auth functions
+from django.contrib.auth import login, logout # IMPORTANT: Import Django's auth functions
 from django.db.models import Q # For complex lookups in Order and Payment ViewSets
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.static import serve as static_serve
+from django.http import FileResponse, Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from datetime import datetime, time, timedelta
+import asyncio
+from decimal import Decimal
 
 # PaymentHistory added to the import list here
-from .models import Item, ShoppingCart, CartItem, Order, OrderItem, Payment, PaymentMethod, Invoice, Receipt, PerformanceMetric, PaymentHistory
-
-from .serializers import ItemSerializer, UserSerializer, ShoppingCartSerializer, CartItemSerializer, OrderSerializer, \
+from .models import Item, ItemCategory, ShoppingCart, CartItem, Order, OrderItem, Payment, PaymentMethod, Invoice, Receipt, PerformanceMetric, PaymentHistory, OrderStatusTransition, ArchivedOrder
+from .signals import items_bulk_updated
+from . import analytics, archival, categories, events, fulfilment, hashing, item_cache, profiling, recommendations, slow_queries
+from .db_pool import pool_stats
+from .pricing import price_changes, reprice_carts
+from .idempotency import idempotent
+from .profile_cache import profile_for_request
+
+from .serializers import ItemSerializer, ItemCategorySerializer, ItemBulkAdjustmentSerializer, UserSerializer, ShoppingCartSerializer, CartItemSerializer, OrderSerializer, \
                         OrderItemSerializer, PaymentSerializer, PaymentMethodSerializer, InvoiceSerializer, ReceiptSerializer, \
-                        PerformanceMetricSerializer, PaymentHistorySerializer
+                        PerformanceMetricSerializer, PaymentHistorySerializer, OrderSummarySerializer, \
+                        OrderStatusTransitionSerializer, OrderTransitionSerializer, OrderBulkTransitionSerializer
+from .pagination import CategoryItemsPagination, OrderHistoryPagination
 
 # Get the custom User model
 User = get_user_model()
 
+# Cart and order lines with their Item, minus the long description none of the line serializers show
+CART_LINES = Prefetch('items', queryset=CartItem.objects.select_related('item').defer('item__item_long_description'))
+ORDER_LINES = Prefetch('items', queryset=OrderItem.objects.select_related('item').defer('item__item_long_description'))
+
+
+def parse_moment_param(params, name):
+    """
+    Reads an ISO 8601 date or datetime query parameter as an aware datetime (dates mean midnight).
+    """
+    value = params.get(name)
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: "Use an ISO 8601 date or datetime."})
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class DeferLargeFieldsMixin:
+    """
+    For the actions in defer_actions, leaves the deferred_fields columns out of the query and the
+    response unless the client asks for them with ?include=field[,field]. Detail and write actions
+    load every column.
+    """
+    deferred_fields = ()
+    defer_actions = ('list',)
+
+    def get_omitted_fields(self):
+        if self.action not in self.defer_actions:
+            return []
+        include = {name.strip() for name in self.request.query_params.get('include', '').split(',')}
+        return [name for name in self.deferred_fields if name not in include]
+
+    def defer_large_fields(self, queryset):
+        omitted = self.get_omitted_fields()
+        return queryset.defer(*omitted) if omitted else queryset
+
+    def filter_queryset(self, queryset):
+        return self.defer_large_fields(super().filter_queryset(queryset))
+
+    def get_serializer(self, *args, **kwargs):
+        omitted = self.get_omitted_fields()
+        if omitted:
+            kwargs.setdefault('omit', omitted)
+        return super().get_serializer(*args, **kwargs)
+
 # --- User Management (e.g., for Admin/Self-management) ---
 class UserViewSet(viewsets.ModelViewSet):
     """
@@ -31,18 +102,22 @@ class UserViewSet(viewsets.ModelViewSet):
     """
     queryset = User.objects.all().order_by('-date_joined')
     serializer_class = UserSerializer
+    throttle_scope = 'account'
+    throttle_scopes = {'login': 'login', 'create': 'login'} # Login and signup both run a full password hash
 
     def get_permissions(self):
         """
         Instantiates and returns the list of permissions that this view requires.
         - 'create' (signup) and 'login' actions: AllowAny
-        - 'current_user' and 'logout' actions: IsAuthenticated
+        - 'current_user' and 'me_summary': AllowAny, resolved from the session in the view
+        - 'logout' action: IsAuthenticated
         - 'retrieve', 'update', 'partial_update', 'destroy' for specific user: IsAuthenticated (ideally IsOwnerOrAdmin)
         - 'list' (all users): IsAdminUser
         """
-        if self.action == 'create' or self.action == 'login':
+        if self.action in ('create', 'login', 'current_user', 'me_summary'):
+            # current_user and me_summary check the session themselves (see profile_cache)
             permission_classes = [permissions.AllowAny]
-        elif self.action == 'current_user' or self.action == 'logout':
+        elif self.action == 'logout':
             permission_classes = [permissions.IsAuthenticated]
         elif self.action in ['retrieve', 'update', 'partial_update', 'destroy']:
             # For individual user actions, ensure authenticated.
@@ -60,7 +135,7 @@ class UserViewSet(viewsets.ModelViewSet):
         username = request.data.get('username')
         password = request.data.get('password')
 
-        user = authenticate(request, username=username, password=password)
+        user = hashing.authenticate(request, username=username, password=password) # Runs on the bounded hashing pool
 
         if user is not None:
             login(request, user) # This sets the session cookie
@@ -78,23 +153,32 @@ class UserViewSet(viewsets.ModelViewSet):
         logout(request)
         return Response({'detail': 'Successfully logged out.'}, status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=['get']) # permission_classes handled by get_permissions
+    @action(detail=False, methods=['get'], authentication_classes=[]) # permission_classes handled by get_permissions
     def current_user(self, request):
         """
         Returns the currently authenticated user's details.
-        Requires authentication (handled by get_permissions).
+        The session is resolved against the cached profile instead of loading the user row,
+        so this heavily polled endpoint needs no query once warm.
         """
-        if request.user.is_authenticated:
-            serializer = self.get_serializer(request.user)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        else:
-            # This branch should ideally not be reached if get_permissions works correctly,
-            # but it's a good fallback for explicit clarity.
+        profile = profile_for_request(request)
+        if profile is None:
             return Response({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(profile['profile'], status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='me/summary', authentication_classes=[])
+    def me_summary(self, request):
+        """
+        Minimal auth status for the navigation bar: {"is_authenticated": false} for anonymous clients,
+        otherwise id, username, first_name, user_type and is_staff. Served from the profile cache.
+        """
+        profile = profile_for_request(request)
+        if profile is None:
+            return Response({'is_authenticated': False}, status=status.HTTP_200_OK)
+        return Response(profile['summary'], status=status.HTTP_200_OK)
 
 
 # --- Catalogue and Items ---
-class ItemViewSet(viewsets.ModelViewSet):
+class ItemViewSet(DeferLargeFieldsMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows items (products) to be viewed or edited.
     Scenario 1: Customer Browses Catalogue.
@@ -102,14 +186,50 @@ class ItemViewSet(viewsets.ModelViewSet):
     """
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
+    throttle_scope = 'catalogue'
+    deferred_fields = ('item_long_description',) # Only the product detail page shows it
+    defer_actions = ('list', 'highest_selling', 'featured', 'related')
+    # ?ordering= values for the list, each with a unique tie-breaker matching the catalogue indexes
+    list_orderings = {
+        'name': ('item_name', 'item_id'),
+        'price': ('unit_price', 'item_id'),
+        '-price': ('-unit_price', '-item_id'),
+    }
+
+    def get_queryset(self):
+        """
+        The list accepts ?available=true (only purchasable items) and ?ordering=name|price|-price.
+        """
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        params = self.request.query_params
+        if params.get('available') in ('1', 'true'):
+            queryset = queryset.filter(is_available=True)
+        ordering = params.get('ordering')
+        if ordering:
+            if ordering not in self.list_orderings:
+                raise ValidationError({"ordering": f"Use one of: {', '.join(self.list_orderings)}."})
+            queryset = queryset.order_by(*self.list_orderings[ordering])
+        return queryset
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'highest_selling', 'featured']:
+        if self.action in ['list', 'retrieve', 'highest_selling', 'featured', 'related']:
             permission_classes = [permissions.AllowAny] # Publicly accessible for browsing
         else:
             permission_classes = [permissions.IsAdminUser] # Only admins can create/update/delete items
         return [permission() for permission in permission_classes]
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Product detail, served from the item cache (hot SKUs rarely reach the database).
+        """
+        item = item_cache.get_item(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if item is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        serializer = self.get_serializer(item)
+        return Response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def highest_selling(self, request):
         """
@@ -118,7 +238,7 @@ class ItemViewSet(viewsets.ModelViewSet):
         """
         # This aggregates quantities from all historical OrderItems for each item
         # and orders them by total quantity sold.
-        highest_selling_items = Item.objects.annotate(
+        highest_selling_items = self.defer_large_fields(Item.objects).annotate(
             total_sold=Sum('orderitem__quantity')
         ).order_by('-total_sold').exclude(total_sold__isnull=True)[:10] # Get top 10, exclude items never sold
         serializer = self.get_serializer(highest_selling_items, many=True)
@@ -126,10 +246,148 @@ class ItemViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        featured_qs = Item.objects.filter(is_featured=True, is_available=True)
+        featured_qs = self.defer_large_fields(Item.objects.filter(is_featured=True, is_available=True))
         serializer = self.get_serializer(featured_qs, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        Frequently-bought-together items, served from the precomputed co-purchase index
+        (refreshed by the build_recommendations command). ?limit= defaults to 8.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', recommendations.DEFAULT_LIMIT)), recommendations.MAX_LIMIT)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        item = self.get_object()
+        results = []
+        neighbours = recommendations.related_items(item, limit=max(limit, 1), deferred_fields=self.get_omitted_fields())
+        for related_item, co_purchase_count in neighbours:
+            data = self.get_serializer(related_item).data
+            data['co_purchase_count'] = co_purchase_count
+            results.append(data)
+        return Response(results)
+
+    @action(detail=False, methods=['post'])
+    def bulk_adjust(self, request):
+        """
+        Applies many stock/price adjustments as one set-based UPDATE (Scenario 2, bulk).
+        Body: {"adjustments": [{"item_id", "quantity_delta" | "quantity", "unit_price", "expected_version"}, ...]}
+        The batch is all-or-nothing: if any row fails its version or stock check,
+        nothing is written and the conflicting rows are returned with 409.
+        """
+        serializer = ItemBulkAdjustmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        adjustments = serializer.validated_data['adjustments']
+        item_ids = [adjustment['item_id'] for adjustment in adjustments]
+
+        quantity_whens, price_whens, version_whens, min_stock_whens = [], [], [], []
+        for adjustment in adjustments:
+            item_id = adjustment['item_id']
+            if 'quantity_delta' in adjustment:
+                delta = adjustment['quantity_delta']
+                quantity_whens.append(When(item_id=item_id, then=F('quantity_available') + delta))
+                if delta < 0:
+                    # Stock must not go negative: require quantity_available >= -delta
+                    min_stock_whens.append(When(item_id=item_id, then=Value(-delta)))
+            elif 'quantity' in adjustment:
+                quantity_whens.append(When(item_id=item_id, then=Value(adjustment['quantity'])))
+            if 'unit_price' in adjustment:
+                price_whens.append(When(item_id=item_id, then=Value(adjustment['unit_price'])))
+            if 'expected_version' in adjustment:
+                version_whens.append(When(item_id=item_id, then=Value(adjustment['expected_version'])))
+
+        updates = {'version': F('version') + 1}
+        if quantity_whens:
+            updates['quantity_available'] = Case(*quantity_whens, default=F('quantity_available'))
+        if price_whens:
+            updates['unit_price'] = Case(
+                *price_whens, default=F('unit_price'),
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            )
+
+        # Row guards are folded into the WHERE clause so one statement does the compare-and-set
+        guarded_qs = Item.objects.filter(item_id__in=item_ids)
+        if version_whens:
+            guarded_qs = guarded_qs.filter(version=Case(*version_whens, default=F('version'), output_field=IntegerField()))
+        if min_stock_whens:
+            guarded_qs = guarded_qs.filter(quantity_available__gte=Case(*min_stock_whens, default=Value(0)))
+
+        with transaction.atomic():
+            updated_count = guarded_qs.update(**updates)
+            if updated_count != len(adjustments):
+                transaction.set_rollback(True)
+            else:
+                updated_rows = list(
+                    Item.objects.filter(item_id__in=item_ids)
+                    .order_by('item_id')
+                    .values('item_id', 'item_name', 'quantity_available', 'unit_price', 'version')
+                )
+                for row in updated_rows:
+                    row['unit_price'] = str(row['unit_price']) # Decimal strings, as ItemSerializer returns prices
+                price_changed_ids = [adjustment['item_id'] for adjustment in adjustments if 'unit_price' in adjustment]
+                # One invalidation per batch, after the data is visible to other connections
+                transaction.on_commit(lambda: items_bulk_updated.send(
+                    sender=Item, item_ids=item_ids, price_changed_ids=price_changed_ids
+                ))
+
+        if updated_count != len(adjustments):
+            return Response(
+                {"detail": "Bulk adjustment rejected; no items were changed.",
+                 "conflicts": self._bulk_adjust_conflicts(adjustments)},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({"updated": updated_count, "items": updated_rows}, status=status.HTTP_200_OK)
+
+    def _bulk_adjust_conflicts(self, adjustments):
+        """
+        Explains which adjustments failed their guards, using a single SELECT of the current rows.
+        """
+        current = {
+            row['item_id']: row
+            for row in Item.objects.filter(item_id__in=[a['item_id'] for a in adjustments])
+            .values('item_id', 'quantity_available', 'version')
+        }
+        conflicts = []
+        for adjustment in adjustments:
+            row = current.get(adjustment['item_id'])
+            if row is None:
+                conflicts.append({'item_id': adjustment['item_id'], 'reason': 'not_found'})
+            elif 'expected_version' in adjustment and adjustment['expected_version'] != row['version']:
+                conflicts.append({'item_id': row['item_id'], 'reason': 'version_mismatch', 'current_version': row['version']})
+            elif row['quantity_available'] + adjustment.get('quantity_delta', 0) < 0:
+                conflicts.append({'item_id': row['item_id'], 'reason': 'insufficient_stock', 'quantity_available': row['quantity_available']})
+        return conflicts
+
+# --- Categories ---
+class ItemCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Category browsing. Each category carries item_count, available_count, in_stock_count and
+    min/max price of its available items, served from the facet cache.
+    """
+    queryset = ItemCategory.objects.all().order_by('name')
+    serializer_class = ItemCategorySerializer
+    permission_classes = [permissions.AllowAny]
+    throttle_scope = 'catalogue'
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['facets'] = categories.category_facets()
+        return context
+
+    @action(detail=True, methods=['get'], pagination_class=CategoryItemsPagination)
+    def items(self, request, pk=None):
+        """
+        Available items in the category, by name, keyset-paginated (?cursor=, ?page_size=).
+        """
+        category = self.get_object()
+        queryset = Item.objects.filter(item_type=category, is_available=True).defer('item_long_description')
+        page = self.paginate_queryset(queryset)
+        serializer = ItemSerializer(page, many=True, omit=['item_long_description'], context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+
 # --- Shopping Cart ---
 class ShoppingCartViewSet(viewsets.ModelViewSet):
     """
@@ -140,6 +398,7 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
     queryset = ShoppingCart.objects.all()
     serializer_class = ShoppingCartSerializer
     permission_classes = [permissions.AllowAny] # Allow unauthenticated users to create/retrieve their own cart based on session
+    throttle_scope = 'cart'
 
     def get_queryset(self):
         """
@@ -148,17 +407,37 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
         Admins can see all carts.
         """
         if self.request.user.is_staff or self.request.user.is_superuser:
-            return ShoppingCart.objects.all()
+            return ShoppingCart.objects.all().prefetch_related(CART_LINES)
         
         if self.request.user.is_authenticated:
-            return ShoppingCart.objects.filter(customer=self.request.user)
+            return ShoppingCart.objects.filter(customer=self.request.user).prefetch_related(CART_LINES)
         else:
             # For anonymous users, try to find cart by session key
             session_key = self.request.session.session_key
             if session_key:
-                return ShoppingCart.objects.filter(session_key=session_key, customer__isnull=True)
+                return ShoppingCart.objects.filter(session_key=session_key, customer__isnull=True).prefetch_related(CART_LINES)
             return ShoppingCart.objects.none() # No session key, no cart
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Badge-sized view of the requester's cart: just the denormalised totals, no items join.
+        Read-only: needs_repricing tells the client the subtotal predates a price change
+        (reprice_carts or checkout brings it up to date).
+        """
+        # The requester's own cart, even for staff (whose get_queryset() spans every cart)
+        if request.user.is_authenticated:
+            carts = ShoppingCart.objects.filter(customer=request.user)
+        elif request.session.session_key:
+            carts = ShoppingCart.objects.filter(session_key=request.session.session_key, customer__isnull=True)
+        else:
+            carts = ShoppingCart.objects.none()
+        summary = carts.values('id', 'item_count', 'subtotal', 'version', 'needs_repricing').first()
+        if summary is None:
+            summary = {'id': None, 'item_count': 0, 'subtotal': Decimal('0.00'), 'version': 0, 'needs_repricing': False}
+        summary['subtotal'] = f"{summary['subtotal']:.2f}" # Match DRF's decimal-as-string output
+        return Response(summary)
+
     def perform_create(self, serializer):
         """
         When creating a new cart, associate it with the current authenticated user
@@ -182,6 +461,7 @@ class CartItemViewSet(viewsets.ModelViewSet):
     queryset = CartItem.objects.all()
     serializer_class = CartItemSerializer
     permission_classes = [permissions.AllowAny] # Allow unauthenticated users to modify cart items
+    throttle_scope = 'cart'
 
     def get_queryset(self):
         """
@@ -213,9 +493,9 @@ class CartItemViewSet(viewsets.ModelViewSet):
         if quantity <= 0:
             return Response({"quantity": "Quantity must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            item = Item.objects.get(item_id=item_id, is_available=True)
-        except Item.DoesNotExist:
+        # Cached copy: this stock check is advisory, checkout re-validates against the database
+        item = item_cache.get_item(item_id)
+        if item is None or not item.is_available:
             return Response({"detail": "Item not found or not available."}, status=status.HTTP_404_NOT_FOUND)
 
         if item.quantity_available < quantity:
@@ -295,30 +575,72 @@ class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all().order_by('-order_date')
     serializer_class = OrderSerializer
     permission_classes = [permissions.AllowAny] # Allow unauthenticated users to place orders via place_order_from_cart
+    throttle_scope = 'orders'
+    throttle_scopes = {'place_order_from_cart': 'checkout'}
 
     def get_queryset(self):
+        return self.get_owned_orders().select_related('customer').prefetch_related(ORDER_LINES)
+
+    def get_owned_orders(self, model=Order):
+        """
+        Orders visible to the requester, without any joins or prefetches.
+        Pass model=ArchivedOrder for the archived ones; it has the same owner columns.
+        """
         if self.request.user.is_staff or self.request.user.is_superuser:
-            return Order.objects.all().order_by('-order_date')
+            return model.objects.all().order_by('-order_date')
         
         if self.request.user.is_authenticated:
-            return Order.objects.filter(customer=self.request.user).order_by('-order_date')
+            return model.objects.filter(customer=self.request.user).order_by('-order_date')
         else:
             # For anonymous users, filter orders by session_key or customer_email
             session_key = self.request.session.session_key
             customer_email = self.request.query_params.get('customer_email') # Allow filtering by email
-            # Use Q objects for OR conditions
-            if session_key or customer_email:
-                return Order.objects.filter(
-                    Q(customer__isnull=True, customer_email=customer_email) | 
-                    Q(customer__isnull=True, shoppingcart__session_key=session_key)
-                ).distinct().order_by('-order_date')
-            return Order.objects.none()
+            # Both are columns on Order, so no join (or DISTINCT) is needed
+            owner_filter = Q()
+            if customer_email:
+                owner_filter |= Q(customer_email=customer_email)
+            if session_key:
+                owner_filter |= Q(session_key=session_key)
+            if owner_filter:
+                return model.objects.filter(owner_filter, customer__isnull=True).order_by('-order_date')
+            return model.objects.none()
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # Completed orders may have been moved to cold storage by archive_orders
+            archived = get_object_or_404(self.get_owned_orders(ArchivedOrder), pk=kwargs[self.lookup_url_kwarg or self.lookup_field])
+            return Response(archival.archived_order_data(archived))
+
+    @action(detail=False, methods=['get'], pagination_class=OrderHistoryPagination)
+    def history(self, request):
+        """
+        Keyset-paginated order history (newest first), for customers with long histories.
+        ?mode=summary returns order rows with an item count instead of nested items.
+        Follow the 'next' link to page; ?page_size= up to 100.
+        """
+        orders = self.get_owned_orders()
+        if request.query_params.get('mode') == 'summary':
+            item_count = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+                count=Sum('quantity')
+            ).values('count')
+            orders = orders.annotate(item_count=Coalesce(Subquery(item_count), 0))
+            serializer_class = OrderSummarySerializer
+        else:
+            orders = orders.select_related('customer').prefetch_related('items__item')
+            serializer_class = OrderSerializer
+
+        page = self.paginate_queryset(orders)
+        serializer = serializer_class(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
 
     def create(self, request, *args, **kwargs):
         return Response({"detail": "Use /api/orders/place_order_from_cart/ to create an order."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
     @action(detail=False, methods=['post'])
+    @idempotent # Retries with the same Idempotency-Key replay the first order instead of placing another
     @transaction.atomic
     def place_order_from_cart(self, request):
         customer_email = request.data.get('customer_email') # Get email for anonymous checkout
@@ -341,22 +663,34 @@ class OrderViewSet(viewsets.ModelViewSet):
         if not user_cart or not user_cart.items.exists():
             return Response({"detail": "Shopping cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Bring the cart's price snapshots up to date and report which ones moved
+        changes = price_changes(user_cart)
+        if changes or user_cart.needs_repricing:
+            reprice_carts([user_cart.id])
+
         total_amount = 0
         order_items_to_create = []
 
-        for cart_item in user_cart.items.all():
+        for cart_item in user_cart.items.select_related('item'): # Stock must be current here, so no item_cache
             item = cart_item.item
             if item.quantity_available < cart_item.quantity:
                 raise ValidationError(
                     f"Not enough stock for {item.item_name}. Available: {item.quantity_available}, Requested: {cart_item.quantity}"
                 )
-            total_amount += item.unit_price * cart_item.quantity
+            total_amount += cart_item.unit_price * cart_item.quantity
             order_items_to_create.append({
                 'item': item,
                 'quantity': cart_item.quantity,
-                'unit_price_at_time_of_order': item.unit_price
+                'unit_price_at_time_of_order': cart_item.unit_price
             })
 
+        # One guarded UPDATE takes the stock; it fails if another checkout got there first
+        reserved = {}
+        for item_data in order_items_to_create:
+            reserved[item_data['item'].item_id] = reserved.get(item_data['item'].item_id, 0) + item_data['quantity']
+        if not fulfilment.reserve_stock(reserved):
+            raise ValidationError("Stock changed while placing the order. Please review your cart and try again.")
+
         order = Order.objects.create(
             customer=customer_instance, # Will be None for anonymous
             customer_email=customer_email, # Set email for anonymous
@@ -369,13 +703,48 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         for item_data in order_items_to_create:
             OrderItem.objects.create(order=order, **item_data)
+        fulfilment.record_placed(order, request.user)
 
         # Clear the shopping cart
         user_cart.items.all().delete()
         user_cart.delete() # Delete the anonymous cart after order is placed
 
         serializer = self.get_serializer(order)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        data = serializer.data
+        data['price_changes'] = changes # Lines charged at a different price than when they were added
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def transition(self, request, pk=None):
+        """
+        Moves the order to {"status": ...} if the state machine allows it (409 otherwise).
+        Customers may only cancel their own pending or paid orders; cancelling restocks the items.
+        """
+        payload = OrderTransitionSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        order = self.get_object()
+        fulfilment.transition(order, payload.validated_data['status'], request.user, staff=request.user.is_staff)
+        return Response(self.get_serializer(order).data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def bulk_transition(self, request):
+        """
+        Moves up to 10000 orders to one status: {"order_ids": [...], "status": "shipped"}.
+        Orders that are missing or cannot make the move are skipped and listed in the response.
+        """
+        payload = OrderBulkTransitionSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        to_status = payload.validated_data['status']
+        if not fulfilment.allowed_sources(to_status):
+            raise ValidationError({"status": f"No order can be moved to '{to_status}'."})
+        moved, skipped = fulfilment.bulk_transition(payload.validated_data['order_ids'], to_status, request.user)
+        return Response({"status": to_status, "updated": len(moved), "skipped": skipped}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def status_history(self, request, pk=None):
+        order = self.get_object()
+        transitions = OrderStatusTransition.objects.filter(order=order).select_related('changed_by').order_by('changed_at', 'id')
+        return Response(OrderStatusTransitionSerializer(transitions, many=True).data)
 
 
 # --- Payments, Invoices, Receipts ---
@@ -384,10 +753,13 @@ class PaymentMethodViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = PaymentMethodSerializer
     permission_classes = [permissions.AllowAny]
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(DeferLargeFieldsMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [permissions.AllowAny] # Allow unauthenticated users to initiate payments for their anonymous orders
+    throttle_scope = 'orders'
+    throttle_scopes = {'initiate_payment': 'checkout'}
+    deferred_fields = ('payment_details',) # Gateway payloads; ?include=payment_details on lists
 
     def get_queryset(self):
         if self.request.user.is_staff or self.request.user.is_superuser:
@@ -408,6 +780,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
 
     @action(detail=True, methods=['post'])
+    @idempotent
     @transaction.atomic
     def initiate_payment(self, request, pk=None):
         try:
@@ -440,12 +813,13 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
 
 
+        if order.status != 'paid':
+            fulfilment.transition(order, 'paid', request.user) # 409 for cancelled orders; rolls the payment back
+
         payment_instance.status = 'completed'
         payment_instance.transaction_id = f"TXN-{order.order_id}-{request.user.id if request.user.is_authenticated else 'anon'}-{payment_instance.id}"
         payment_instance.amount_paid = order.total_amount
         payment_instance.save()
-        order.status = 'paid'
-        order.save()
 
         receipt, created_receipt = Receipt.objects.get_or_create(order=order, defaults={
             'receipt_number': f"REC-{order.order_id}",
@@ -455,7 +829,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
         invoice, created_invoice = Invoice.objects.get_or_create(order=order, defaults={
             'invoice_number': f"INV-{order.order_id}",
             'total_amount': order.total_amount,
-            'status': 'paid',
+            'status': order.status,
             'pdf_url': f"/media/invoices/{order.order_id}.pdf"
         })
 
@@ -463,10 +837,11 @@ class PaymentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class PaymentHistoryViewSet(viewsets.ReadOnlyModelViewSet):
+class PaymentHistoryViewSet(DeferLargeFieldsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = PaymentHistory.objects.all().order_by('-transaction_date')
     serializer_class = PaymentHistorySerializer
     permission_classes = [permissions.AllowAny] # Allow anonymous to view their history if identifiable
+    deferred_fields = ('payment_details',)
 
     def get_queryset(self):
         if self.request.user.is_staff or self.request.user.is_superuser:
@@ -529,8 +904,209 @@ class PerformanceMetricViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = PerformanceMetricSerializer
     permission_classes = [permissions.IsAdminUser]
 
+    def get_queryset(self):
+        """
+        Optional filters: ?metric_type=, ?granularity=, ?since= (ISO date/datetime of bucket_start).
+        Rollups are produced by the compute_metrics command; nothing here touches the order tables.
+        """
+        queryset = PerformanceMetric.objects.all().order_by('-calculated_at')
+        params = self.request.query_params
+        if params.get('metric_type'):
+            queryset = queryset.filter(metric_type=params['metric_type'])
+        if params.get('granularity'):
+            queryset = queryset.filter(granularity=params['granularity'])
+        if params.get('since'):
+            queryset = queryset.filter(bucket_start__gte=parse_moment_param(params, 'since'))
+        return queryset
+
     @action(detail=False, methods=['get'])
     def profitability(self, request):
-        profitability_metrics = PerformanceMetric.objects.filter(metric_type='profitability')
+        profitability_metrics = self.get_queryset().filter(metric_type='profitability')
         serializer = self.get_serializer(profitability_metrics, many=True)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        """
+        Time series per metric type for admin dashboards, read from the precomputed buckets.
+        ?granularity=day|hour (default day), ?days=N (default 30).
+        """
+        granularity = request.query_params.get('granularity', 'day')
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            raise ValidationError({"days": "Must be an integer."})
+        start = timezone.now() - timedelta(days=days)
+
+        rollups = PerformanceMetric.objects.filter(
+            granularity=granularity, bucket_start__gte=start
+        ).order_by('bucket_start').values('metric_type', 'bucket_start', 'value', 'sample_count')
+        series = {metric_type: [] for metric_type, _ in PerformanceMetric.METRIC_TYPE_CHOICES}
+        for rollup in rollups:
+            series[rollup.pop('metric_type')].append(rollup)
+        return Response({'granularity': granularity, 'since': start, 'series': series})
+
+    @action(detail=False, methods=['get'])
+    def reports(self, request):
+        """
+        Vectorised order analytics, cached per date range.
+        ?report=revenue_by_category|basket_size|cohort_retention, ?start=, ?end= (default: last 30 days).
+        """
+        report = request.query_params.get('report')
+        if report not in analytics.REPORTS:
+            raise ValidationError({"report": f"Choose one of: {', '.join(sorted(analytics.REPORTS))}."})
+        params = request.query_params
+        if params.get('end'):
+            end = parse_moment_param(params, 'end')
+        else:
+            # Default to the next midnight so repeated dashboard loads share one cache entry
+            end = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), time.min))
+        start = parse_moment_param(params, 'start') if params.get('start') else end - timedelta(days=30)
+        if start >= end:
+            raise ValidationError({"start": "Must be before end."})
+        return Response(analytics.build_report(report, start, end))
+
+
+# --- Instrumentation (Admin-only) ---
+class InstrumentationViewSet(viewsets.ViewSet):
+    """
+    Runtime diagnostics for the worker process that serves the request.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        return Response({'db_pool': pool_stats()})
+
+    @action(detail=False, methods=['get'])
+    def db_pool(self, request):
+        """
+        Connection pool usage per database alias: size, in-use count, queued requests and average wait.
+        """
+        return Response(pool_stats())
+
+    @action(detail=False, methods=['get'])
+    def slow_queries(self, request):
+        """
+        Captured slow statements, worst first, with their sequential scans and suggested indexes.
+        ?order=total_ms|count|max_ms (default total_ms), ?limit= up to 100.
+        """
+        order = request.query_params.get('order', 'total_ms')
+        if order not in ('total_ms', 'count', 'max_ms'):
+            raise ValidationError({"order": "Use total_ms, count or max_ms."})
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        return Response([
+            {
+                'fingerprint': query.fingerprint,
+                'call_site': query.call_site,
+                'view': query.view,
+                'sql': query.sql,
+                'count': query.count,
+                'total_ms': round(query.total_ms, 3),
+                'avg_ms': round(query.total_ms / query.count, 3) if query.count else 0,
+                'max_ms': round(query.max_ms, 3),
+                'last_seen': query.last_seen,
+                'seq_scan_tables': query.seq_scan_tables,
+                'suggested_indexes': slow_queries.suggest_indexes(query, using=query.database),
+            }
+            for query in slow_queries.top_offenders(order, limit)
+        ])
+
+    @action(detail=False, methods=['get'])
+    def profiles(self, request):
+        """
+        Stored request profiles, newest first (see PROFILING_ENABLED in settings).
+        """
+        return Response(profiling.list_profiles())
+
+    @action(detail=False, methods=['get'], url_path=r'profiles/(?P<profile_id>[^/.]+)')
+    def profile(self, request, profile_id=None):
+        """
+        One profile: ?file=json (default) has the SQL timeline and top functions,
+        ?file=prof downloads the raw cProfile data for pstats or snakeviz.
+        """
+        kind = request.query_params.get('file', 'json')
+        path = profiling.profile_path(profile_id, kind)
+        if path is None:
+            return Response({"detail": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=kind == 'prof', filename=path.name)
+
+
+def serve_media(request, path):
+    """
+    Development media server. Files under MEDIA_ROOT are content-addressed (see shop/images.py),
+    so a URL's bytes never change and browsers may cache them for MEDIA_CACHE_MAX_AGE.
+    """
+    response = static_serve(request, path, document_root=settings.MEDIA_ROOT)
+    if response.status_code == 200:
+        response['Cache-Control'] = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+    return response
+
+
+def _ensure_session_key(request):
+    if not request.session.session_key:
+        request.session.save()
+        request.session.modified = True # SessionMiddleware then sends the cookie
+    return request.session.session_key
+
+
+async def _event_stream(channels, owner, item_ids):
+    """
+    Subscribes first and snapshots second, so no change between the two is lost.
+    The subscription ends when the client disconnects and Django cancels the iterator.
+    """
+    subscription = events.get_broker().subscribe(channels)
+    if subscription is None:
+        yield 'event: error\ndata: {"detail": "Too many open event streams."}\n\n'
+        return
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        for event in await events.snapshot(item_ids, **owner):
+            yield events.format_sse(event)
+        while True:
+            try:
+                event = await subscription.get(timeout=settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n' # Keeps proxies from closing an idle stream
+                continue
+            yield events.format_sse(event)
+    finally:
+        subscription.close()
+
+
+async def events_stream(request):
+    """
+    Server-sent events (GET /api/events/?items=1,2,3): 'stock' events for the listed items and
+    'cart' events for the requester's cart, starting with their current state.
+    Only served through ASGI, where an idle stream costs a suspended coroutine. Under WSGI
+    Django would buffer the whole (endless) stream in a worker thread, so it answers 501 and
+    clients keep polling instead.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "Live events need the ASGI server (see README)."}, status=501)
+    try:
+        item_ids = sorted({int(value) for value in request.GET.get('items', '').split(',') if value.strip()})
+    except ValueError:
+        return JsonResponse({"items": "Use comma-separated item ids."}, status=400)
+    if len(item_ids) > settings.EVENTS_MAX_WATCHED_ITEMS:
+        return JsonResponse({"items": f"Watch at most {settings.EVENTS_MAX_WATCHED_ITEMS} items."}, status=400)
+    if events.get_broker().stats()['subscribers'] >= settings.EVENTS_MAX_SUBSCRIBERS:
+        response = JsonResponse({"detail": "Too many open event streams."}, status=503)
+        response['Retry-After'] = str(settings.EVENTS_RETRY_MS // 1000)
+        return response
+
+    user = await request.auser()
+    if user.is_authenticated:
+        owner = {'customer_id': user.pk}
+    else:
+        owner = {'session_key': await sync_to_async(_ensure_session_key)(request)}
+    channels = [events.item_channel(item_id) for item_id in item_ids] + [events.cart_channel(**owner)]
+
+    response = StreamingHttpResponse(_event_stream(channels, owner, item_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache, no-transform' # no-transform: dev proxies must not gzip-buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -2,6 +2,7 @@ import React, { Component } from 'react';
 import { BsStarFill } from 'react-icons/bs';
 import './Home.css';
 import AddToCartButton from './Buttons/AddToCartButton.js';
+import ProductImage from './ProductImage.js';
 
 // Helper function to get a cookie by name (needed for CSRF token)
 function getCookie(name) {
@@ -150,12 +151,7 @@ export class Home extends Component {
                 <section className="featured-products container grid-template">
                     {products.map(product => (
                         <div className="card-item" key={product.item_id}>
-                            <img
-                                src={product.image_url || 'https://placehold.co/200x200/cccccc/ffffff?text=No+Image'}
-                                alt={product.item_name}
-                                className="card__img"
-                                onError={(e) => { e.target.onerror = null; e.target.src = 'https://placehold.co/200x200/cccccc/ffffff?text=No+Image'; }}
-                            />
+                            <ProductImage item={product} className="card__img" />
                             <h3 className="card__item-title">{product.item_name}</h3>
                             <div className="card__item-rating">
                                 <BsStarFill />
@@ -21,6 +21,8 @@ function getCookie(name) {
     return cookieValue;
 }
 
+const CART_POLL_INTERVAL_MS = 30000; // Cart count refresh when live events are unavailable
+
 export class NavMenu extends Component {
     static displayName = NavMenu.name;
 
@@ -39,28 +41,80 @@ export class NavMenu extends Component {
     componentDidMount() {
         this.checkAuthStatus(); // Check authentication status on component mount
         this.fetchCartItemCount(); // Fetch cart count
+        this.openEventStream(); // Live updates on top, where the server supports them
         document.addEventListener('cart-updated', this.fetchCartItemCount);
     }
 
     componentWillUnmount() {
       document.removeEventListener('cart-updated', this.fetchCartItemCount);
+      this.closeEventStream();
+      this.stopPolling();
     }
     
-    componentDidUpdate(prevProps) {
+    componentDidUpdate(prevProps, prevState) {
       if (this.props.location.pathname !== prevProps.location.pathname) {
         this.checkAuthStatus();
+      }
+      // Logging in or out switches to another cart, so subscribe to that one instead
+      if (this.state.isAuthenticated !== prevState.isAuthenticated) {
         this.fetchCartItemCount();
+        this.openEventStream();
       }
     }
+
+    /**
+     * Subscribes to server-sent cart events. The browser reconnects on its own if the
+     * connection drops. Without EventSource support, or when the server refuses the stream
+     * (501 unless it runs under ASGI), the cart count is polled instead.
+     */
+    openEventStream = () => {
+        this.closeEventStream();
+        this.stopPolling();
+        if (typeof EventSource === 'undefined') {
+            this.startPolling();
+            return;
+        }
+        this.eventSource = new EventSource('/api/events/', { withCredentials: true });
+        this.eventSource.addEventListener('cart', (e) => {
+            const cart = JSON.parse(e.data);
+            this.setState({ cartItemCount: cart.item_count });
+        });
+        this.eventSource.addEventListener('error', () => {
+            // CLOSED means the browser gave up (an error response, not a dropped connection)
+            if (this.eventSource && this.eventSource.readyState === EventSource.CLOSED) {
+                this.closeEventStream();
+                this.startPolling();
+            }
+        });
+    };
+
+    closeEventStream = () => {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+    };
+
+    startPolling = () => {
+        if (!this.pollTimer) {
+            this.pollTimer = setInterval(this.fetchCartItemCount, CART_POLL_INTERVAL_MS);
+        }
+    };
+
+    stopPolling = () => {
+        clearInterval(this.pollTimer);
+        this.pollTimer = null;
+    };
+
     /**
      * Checks the user's authentication status by calling a backend endpoint.
      */
     checkAuthStatus = async () => {
         try {
             // Use the proxy for the API call
-            const response = await fetch('/api/users/current_user/', { credentials: 'include' }); 
-            if (response.ok) {
-                const userData = await response.json();
+            const response = await fetch('/api/users/me/summary/', { credentials: 'include' }); 
+            const userData = response.ok ? await response.json() : null;
+            if (userData && userData.is_authenticated) {
                 this.setState({ isAuthenticated: true, username: userData.username });
             } else {
                 this.setState({ isAuthenticated: false, username: '' });
@@ -117,16 +171,11 @@ export class NavMenu extends Component {
      */
     fetchCartItemCount = async () => {
         try {
-            // Use the proxy for the API call
-            const response = await fetch('/api/carts/', {credentials: 'include'});
+            // The summary endpoint returns only the cart's stored totals (no nested items)
+            const response = await fetch('/api/carts/summary/', {credentials: 'include'});
             if (response.ok) {
                 const data = await response.json();
-                if (data.length > 0 && data[0].items) {
-                    const count = data[0].items.reduce((sum, item) => sum + item.quantity, 0);
-                    this.setState({ cartItemCount: count });
-                } else {
-                    this.setState({ cartItemCount: 0 });
-                }
+                this.setState({ cartItemCount: data.item_count });
             } else {
                 // If cart fetch fails (e.g., no session, or permission issue), default to 0
                 this.setState({ cartItemCount: 0 });
@@ -0,0 +1,43 @@
+import React from 'react'
+
+const FALLBACK = 'https://placehold.co/200x200/cccccc/ffffff?text=No+Image';
+
+/*
+ * Product card image. Uses the locally ingested, right-sized variants (item.image_variants)
+ * when the backend has them, letting the browser pick WebP and the smallest adequate width;
+ * otherwise falls back to item.image_url.
+ */
+const ProductImage = ({ item, className, sizes = '(max-width: 600px) 50vw, 400px' }) => {
+  const handleError = (e) => {
+    e.currentTarget.onerror = null;
+    e.currentTarget.src = FALLBACK;
+  };
+
+  const variants = item.image_variants;
+  if (!variants) {
+    return <img src={item.image_url || FALLBACK} alt={item.item_name} className={className} onError={handleError} />;
+  }
+
+  const ordered = Object.values(variants).sort((a, b) => a.width - b.width);
+  const srcSet = (format) => ordered.map(v => `${v[format]} ${v.width}w`).join(', ');
+  const card = variants.card || ordered[0];
+
+  return (
+    <picture>
+      <source type="image/webp" srcSet={srcSet('webp')} sizes={sizes} />
+      <img
+        src={card.jpeg}
+        srcSet={srcSet('jpeg')}
+        sizes={sizes}
+        width={card.width}
+        height={card.height}
+        loading="lazy"
+        alt={item.item_name}
+        className={className}
+        onError={handleError}
+      />
+    </picture>
+  );
+}
+
+export default ProductImage
@@ -57,7 +57,7 @@ export class Checkout extends Component {
       const data = await res.json();
       const cart = data.length ? data[0] : null;
       this.setState({ cart, loading: false });
-      this.calculateTotals(cart ? cart.items : []);
+      this.calculateTotals(cart);
       document.dispatchEvent(new Event('cart-updated'));
     } catch (err) {
       console.error(err);
@@ -65,11 +65,9 @@ export class Checkout extends Component {
     }
   };
 
-  calculateTotals = items => {
-    const sub = items.reduce(
-      (s, it) => s + it.quantity * parseFloat(it.unit_price),
-      0
-    );
+  calculateTotals = cart => {
+    /* subtotal is maintained server-side on the cart */
+    const sub = cart ? parseFloat(cart.subtotal) : 0;
     const gst = sub * 0.1;
     this.setState({ subtotal: sub, gst, total: sub + gst });
   };
@@ -19,6 +19,7 @@ function getCookie(name) {
 export default function Dashboard() {
   const [user, setUser]     = useState(null);
   const [orders, setOrders] = useState([]);
+  const [nextOrdersUrl, setNextOrdersUrl] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError]     = useState(null);
 
@@ -32,14 +33,8 @@ export default function Dashboard() {
         const uData = await uRes.json();
         setUser(uData);
 
-        /* 2. their orders */
-        const oRes = await fetch('/api/orders/', { credentials: 'include' });
-        if (oRes.ok) {
-          const oData = await oRes.json();
-          setOrders(oData);
-        } else {
-          console.warn('Orders fetch failed:', oRes.status);
-        }
+        /* 2. their orders – first page of the summary history */
+        await fetchOrders('/api/orders/history/?mode=summary');
       } catch (err) {
         console.error(err);
         setError(err.message);
@@ -52,6 +47,19 @@ export default function Dashboard() {
   }, []);
 
   /* ────────────────── helpers ────────────────── */
+  /* history pages are keyset-paginated; `next` is the absolute URL of the following page */
+  async function fetchOrders(url) {
+    const oRes = await fetch(url, { credentials: 'include' });
+    if (!oRes.ok) {
+      console.warn('Orders fetch failed:', oRes.status);
+      return;
+    }
+    const oData = await oRes.json();
+    setOrders(prev => [...prev, ...oData.results]);
+    /* keep requests relative so they go through the dev proxy with our cookies */
+    setNextOrdersUrl(oData.next ? new URL(oData.next).pathname + new URL(oData.next).search : null);
+  }
+
   const handleDownload = async (orderId, kind /* 'receipt' | 'invoice' */) => {
     const base = kind === 'invoice' ? '/api/invoices/' : '/api/receipts/';
     const csrftoken = getCookie('csrftoken');
@@ -122,6 +130,9 @@ export default function Dashboard() {
             ))}
           </ul>
         )}
+        {nextOrdersUrl && (
+          <button onClick={() => fetchOrders(nextOrdersUrl)}>Load more orders</button>
+        )}
       </section>
     </div>
   );
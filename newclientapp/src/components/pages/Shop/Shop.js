@@ -3,6 +3,7 @@ import React, { Component } from 'react';
 import { BsStarFill } from 'react-icons/bs';
 import './Shop.css';
 import AddToCartButton from '../../Buttons/AddToCartButton.js';
+import ProductImage from '../../ProductImage.js';
 
 /* ─── helper – read csrftoken cookie ────────────────────────────────────── */
 function getCookie(name) {
@@ -42,7 +43,7 @@ export default class Shop extends Component {
       if (!csrfRes.ok) throw new Error(`CSRF init failed (${csrfRes.status})`);
 
       /* Step 2 – fetch the full product list */
-      const prodRes = await fetch('/api/items/', { credentials: 'include' });
+      const prodRes = await fetch('/api/items/?available=true', { credentials: 'include' });
       if (!prodRes.ok) {
         const err = await prodRes.json();
         throw new Error(`GET /api/items/ → ${prodRes.status}: ${JSON.stringify(err)}`);
@@ -124,15 +125,7 @@ export default class Shop extends Component {
         <section className="featured-products container grid-template">
           {products.map(p => (
             <div className="card-item" key={p.item_id}>
-              <img
-                src={p.image_url || 'https://placehold.co/200x200/cccccc/ffffff?text=No+Image'}
-                alt={p.item_name}
-                className="card__img"
-                onError={e => {
-                  e.currentTarget.onerror = null;
-                  e.currentTarget.src = 'https://placehold.co/200x200/cccccc/ffffff?text=No+Image';
-                }}
-              />
+              <ProductImage item={p} className="card__img" />
 
               <h3 className="card__item-title">{p.item_name}</h3>
 